@@ -1,5 +1,6 @@
 import os
-from typing import Dict, Set, List, Generator, Tuple
+import sys
+from typing import Dict, Set, List, Generator, Tuple, Optional
 import clang.cindex
 from dataclasses import dataclass
 from pathlib import Path
@@ -9,6 +10,10 @@ import subprocess
 import re
 
 from calculateInclusions import *
+from fileModel import shared_file_models
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / 'scripts'))
+from declaration_registry import DeclarationRegistry, generated_header_id, include_directive, project_registry_path
 
 @dataclass
 class TypeInfo:
@@ -97,12 +102,11 @@ class EnhancedHeaderDependencyAnalyzer(HeaderDependencyAnalyzer):
 
     def _load_header_content(self, header_path: str) -> str:
         """Carica il contenuto di un header file."""
-        try:
-            with open(header_path, 'r', encoding='utf-8') as f:
-                return f.read()
-        except Exception as e:
-            print(f"Errore nel caricamento del header {header_path}: {e}")
+        model = shared_file_models.get(str(header_path))
+        if model is None:
+            print(f"Errore nel caricamento del header {header_path}")
             return ""
+        return model.content
 
     def _create_backup(self, file_path: str) -> bool:
         """Crea un backup del file prima di modificarlo."""
@@ -217,6 +221,9 @@ class EnhancedHeaderDependencyAnalyzer(HeaderDependencyAnalyzer):
         super().__init__(project_path)
         self.type_dependencies: Dict[str, Set[str]] = {}
         self.generated_headers: Set[str] = set()
+        # Registro di progetto: ogni tipo finisce in un solo header generato
+        self.declaration_registry: Optional[DeclarationRegistry] = None
+        self.output_path: Optional[Path] = None
         
     def analyze_type_dependencies(self, cursor: clang.cindex.Cursor, current_type: str = None):
         """Analizza le dipendenze tra i tipi definiti."""
@@ -272,7 +279,7 @@ class EnhancedHeaderDependencyAnalyzer(HeaderDependencyAnalyzer):
             
             # Genera il contenuto del nuovo header
             try:
-                header_content = self._generate_header_content(ordered_types, cycle)
+                header_content = self._generate_header_content(ordered_types, cycle, header_name)
                 new_headers[header_name] = header_content
             except Exception as e:
                 print(f"Errore nella generazione del contenuto per {header_name}: {e}")
@@ -280,8 +287,12 @@ class EnhancedHeaderDependencyAnalyzer(HeaderDependencyAnalyzer):
                 
         return new_headers
 
-    def write_optimized_headers(self, output_dir: str = None) -> List[str]:
-        """Scrive i nuovi header file ottimizzati."""
+    def write_optimized_headers(self, output_dir: str = None,
+                                registry: Optional[DeclarationRegistry] = None) -> List[str]:
+        """
+        Scrive i nuovi header file ottimizzati. Il registro di progetto (di default
+        quello nella radice git) evita che lo stesso tipo finisca in più types_*.h.
+        """
         if output_dir is None:
             output_dir = self.project_path / 'generated_headers'
         
@@ -296,11 +307,16 @@ class EnhancedHeaderDependencyAnalyzer(HeaderDependencyAnalyzer):
             output_path.mkdir(parents=True, exist_ok=True)
         
         written_files = []
+        self.output_path = output_path
+        self.declaration_registry = registry or DeclarationRegistry(project_registry_path(self.project_path))
         new_headers = self.create_optimized_headers()
         
         for header_name, content in new_headers.items():
             try:
                 file_path = output_path / header_name
+                if self.declaration_registry.in_cycle(file_path):
+                    print(f"Errore: {file_path} è in un ciclo di include tra header generati, non scritto")
+                    continue
                 print(f"Scrittura del file: {file_path}")
                 with open(file_path, 'w', encoding='utf-8') as f:
                     f.write(content.content)
@@ -309,7 +325,10 @@ class EnhancedHeaderDependencyAnalyzer(HeaderDependencyAnalyzer):
             except Exception as e:
                 print(f"Errore nella scrittura del file {header_name}: {e}")
                 continue
-            
+
+        for message in self.declaration_registry.warnings():
+            print(f"Attenzione: {message}")
+        self.declaration_registry.save()
         return written_files
 
     def _extract_type_definition(self, type_info: TypeInfo) -> List[str]:
@@ -379,10 +398,42 @@ class EnhancedHeaderDependencyAnalyzer(HeaderDependencyAnalyzer):
             # Se c'è un ciclo, usa un ordine basato sul nome
             return sorted(types)
 
-    def _generate_header_content(self, ordered_types: List[str], cycle: List[str]) -> HeaderContent:
+    def _claim_type_definitions(self, ordered_types: List[str], header_name: Optional[str],
+                                includes: Set[str]) -> Dict[str, List[str]]:
+        """
+        Definizioni dei tipi che appartengono a questo header. Quelle già
+        assegnate a un altro header generato vengono sostituite dal suo include.
+        """
+        registry = self.declaration_registry
+        if header_name and self.output_path:
+            header_path = str(self.output_path / header_name)
+        else:
+            # Senza directory di output l'header ha solo un nome: identità esplicita nel registro
+            header_path = generated_header_id(header_name) if header_name else None
+        if registry is not None and header_path:
+            registry.release(header_path)
+
+        definitions = {}
+        for type_name in ordered_types:
+            if type_name not in self.type_declarations:
+                continue
+            lines = self._extract_type_definition(self.type_declarations[type_name])
+            if registry is None or not header_path:
+                definitions[type_name] = lines
+                continue
+            owner = registry.claim("\n".join(lines), header_path, type_name)
+            if owner == registry._header_id(header_path):
+                definitions[type_name] = lines
+            else:
+                includes.add(include_directive(owner, os.path.abspath(header_path))[len('#include '):])
+        return definitions
+
+    def _generate_header_content(self, ordered_types: List[str], cycle: List[str],
+                                 header_name: Optional[str] = None) -> HeaderContent:
         """Genera il contenuto del nuovo header file."""
         includes = set()
         forward_declarations = set()
+        definitions = self._claim_type_definitions(ordered_types, header_name, includes)
         content_lines = [
             "#pragma once",
             "",
@@ -419,13 +470,12 @@ class EnhancedHeaderDependencyAnalyzer(HeaderDependencyAnalyzer):
         
         # Aggiungi le definizioni dei tipi
         for type_name in ordered_types:
-            if type_name in self.type_declarations:
-                type_info = self.type_declarations[type_name]
-                content_lines.extend(self._extract_type_definition(type_info))
+            if type_name in definitions:
+                content_lines.extend(definitions[type_name])
                 content_lines.append("")
         
         return HeaderContent(
-            types=set(ordered_types),
+            types=set(definitions),
             includes=includes,
             forward_declarations=forward_declarations,
             content="\n".join(content_lines)
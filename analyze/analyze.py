@@ -4,6 +4,11 @@ import re
 import os
 from pathlib import Path
 
+from fileModel import FileModelCache, shared_file_models
+
+UNDEFINED_TYPE_MARKER = 'error: invalid use of undefined type'
+UNDEFINED_TYPE_RE = re.compile(r'([^:]+):(\d+):\d+: error: invalid use of undefined type.*struct (\w+)')
+
 @dataclass
 class StructInfo:
     defined_in: Optional[str]        # File dove è definita completamente
@@ -18,100 +23,102 @@ class IncludeState:
     struct_info: Dict[str, StructInfo]  # Info su tutte le struct trovate
 
 class IncludeStackAnalyzer:
-    def __init__(self):
+    def __init__(self, file_models: Optional[FileModelCache] = None):
         self.include_states: Dict[str, IncludeState] = {}  # Stato per ogni file processato
-        self.file_contents: Dict[str, str] = {}
+        self.file_models = file_models or shared_file_models
+        self.struct_index: Dict[str, List[str]] = {}  # struct -> file che la definiscono/dichiarano
         self.base_path = ""
 
-    def parse_build_log(self, content: str) -> List[Tuple[str, str, int, List[str]]]:
+    @property
+    def file_contents(self) -> Dict[str, str]:
+        """Contenuto dei file analizzati (letto dai FileModel condivisi)"""
+        contents = {}
+        for filepath in self.include_states:
+            model = self.file_models.get(filepath)
+            if model:
+                contents[filepath] = model.content
+        return contents
+
+    def parse_build_log(self, content) -> List[Tuple[str, str, int, List[str]]]:
         """
-        Analizza il log di build per trovare errori e loro contesto
+        Analizza il log di build per trovare errori e loro contesto.
+        `content` può essere il testo del log o un iterabile di righe (es. un file aperto).
         Restituisce: [(file_con_errore, struct_name, line_num, include_stack)]
         """
         errors = []
         current_stack = []
+        lines = content.splitlines() if isinstance(content, str) else content
         
-        for line in content.splitlines():
+        for line in lines:
             # Traccia lo stack delle inclusioni
             if line.startswith('.'):
-                depth = line.count('.')
-                filename = line.strip('. ')
+                depth = len(line) - len(line.lstrip('.'))
+                filename = line.strip('. \r\n')
                 
-                # Aggiorna lo stack corrente
-                while len(current_stack) > depth:
-                    current_stack.pop()
-                if depth == len(current_stack):
-                    if current_stack:
-                        current_stack.pop()
+                # Aggiorna lo stack corrente: il file a profondità N sta in posizione N-1
+                del current_stack[depth - 1:]
                 current_stack.append(filename)
                 
                 # Analizza il file per le definizioni di struct
                 self.analyze_file(filename)
             
             # Trova errori di struct non definita
-            elif 'error: invalid use of undefined type' in line:
-                match = re.search(r'([^:]+):(\d+):\d+: error: invalid use of undefined type.*struct (\w+)', line)
+            elif UNDEFINED_TYPE_MARKER in line:
+                match = UNDEFINED_TYPE_RE.search(line)
                 if match:
                     file, line_num, struct_name = match.groups()
                     errors.append((file, struct_name, int(line_num), current_stack.copy()))
         
         return errors
 
+    def parse_build_log_file(self, log_path: str) -> List[Tuple[str, str, int, List[str]]]:
+        """Come parse_build_log, leggendo il log riga per riga."""
+        with open(log_path, 'r', errors='replace') as f:
+            return self.parse_build_log(f)
+
     def analyze_file(self, filepath: str) -> None:
         """Analizza un file per trovare definizioni e dipendenze di struct"""
         if filepath in self.include_states:
             return
             
-        try:
-            with open(filepath, 'r') as f:
-                content = f.read()
-                self.file_contents[filepath] = content
-            
-            state = IncludeState(
-                current_stack=[],
-                processed_guards=set(),
-                struct_info={}
+        model = self.file_models.get(filepath)
+        if model is None:
+            print(f"Warning: Could not analyze {filepath}")
+            return
+        
+        state = IncludeState(
+            current_stack=[],
+            processed_guards=set(),
+            struct_info={}
+        )
+        
+        # Ifdef guard e struct vengono dagli indici già costruiti nel FileModel
+        if model.guard:
+            state.processed_guards.add(model.guard)
+        
+        for struct_name, definition in model.structs.items():
+            state.struct_info[struct_name] = StructInfo(
+                defined_in=filepath,
+                declared_in=set(),
+                dependencies=set(definition.dependencies),
+                definition_line=definition.line
             )
-            
-            # Trova ifdef guards
-            guard_match = re.search(r'#ifndef\s+(\w+)', content)
-            if guard_match:
-                state.processed_guards.add(guard_match.group(1))
-            
-            # Trova definizioni complete di struct
-            struct_defs = re.finditer(r'struct\s+(\w+)\s*{([^}]+)}', content)
-            for match in struct_defs:
-                struct_name = match.group(1)
-                definition = match.group(2)
-                
-                # Trova dipendenze (altre struct usate nella definizione)
-                deps = set(re.findall(r'struct\s+(\w+)', definition))
-                
+        
+        # Forward declarations
+        for struct_name in model.forward_declarations:
+            if struct_name not in state.struct_info:
                 state.struct_info[struct_name] = StructInfo(
-                    defined_in=filepath,
-                    declared_in=set(),
-                    dependencies=deps,
-                    definition_line=content[:match.start()].count('\n') + 1
+                    defined_in=None,
+                    declared_in={filepath},
+                    dependencies=set(),
+                    definition_line=None
                 )
-            
-            # Trova forward declarations
-            struct_decls = re.finditer(r'struct\s+(\w+)\s*;', content)
-            for match in struct_decls:
-                struct_name = match.group(1)
-                if struct_name not in state.struct_info:
-                    state.struct_info[struct_name] = StructInfo(
-                        defined_in=None,
-                        declared_in={filepath},
-                        dependencies=set(),
-                        definition_line=None
-                    )
-                else:
-                    state.struct_info[struct_name].declared_in.add(filepath)
-            
-            self.include_states[filepath] = state
-            
-        except (FileNotFoundError, IOError) as e:
-            print(f"Warning: Could not analyze {filepath}: {e}")
+            else:
+                state.struct_info[struct_name].declared_in.add(filepath)
+        
+        for struct_name in state.struct_info:
+            self.struct_index.setdefault(struct_name, []).append(filepath)
+        self.include_states[filepath] = state
 
     def find_struct_definition_chain(self, struct_name: str, include_stack: List[str]) -> Dict:
         """
@@ -126,8 +133,9 @@ class IncludeStackAnalyzer:
             "suggestions": []
         }
         
-        # Cerca la definizione della struct
-        for file, state in self.include_states.items():
+        # Cerca la definizione della struct (solo nei file che la nominano)
+        for file in self.struct_index.get(struct_name, []):
+            state = self.include_states[file]
             if struct_name in state.struct_info:
                 info = state.struct_info[struct_name]
                 if info.defined_in:
@@ -190,10 +198,7 @@ def main():
     analyzer = IncludeStackAnalyzer()
     
     try:
-        with open('../hello-idf/build_output.txt', 'r') as f:
-            content = f.read()
-            
-        errors = analyzer.parse_build_log(content)
+        errors = analyzer.parse_build_log_file('../hello-idf/build_output.txt')
         
         for error_file, struct_name, line_num, include_stack in errors:
             analyzer.print_analysis(error_file, struct_name, line_num, include_stack)
@@ -1,71 +1,145 @@
+import os
 import sys
 import re
+import json
 from pathlib import Path
 
-def analyze_includes(cmake_log_path, target_file):
-    # Read the CMake log file
-    with open(cmake_log_path, 'r') as f:
-        log_content = f.read()
-
-    # Pattern to match compiler commands for our target file
-    # This handles both gcc and clang style compiler outputs
-    target_compile_pattern = rf'[gc]\+\+|\w+cc.*\s{re.escape(target_file)}(?:\s|$)'
-    
-    # Find all compiler commands for our target file
-    compile_commands = []
-    for line in log_content.split('\n'):
-        if re.search(target_compile_pattern, line, re.IGNORECASE):
-            compile_commands.append(line)
-
-    if not compile_commands:
+from cmakeLogs import COMPILE_SOURCE_RE, iter_log_lines, iter_include_trees
+
+INDEX_SUFFIX = '.idx.json'
+
+def index_path_for(cmake_log_path):
+    return cmake_log_path + INDEX_SUFFIX
+
+def build_log_index(cmake_log_path, index_path=None):
+    """
+    Scansione unica del log: per ogni comando di compilazione salva il byte
+    offset di inizio e di fine della sua sezione (comando + albero -H) in un
+    file indice accanto al log.
+    """
+    index_path = index_path or index_path_for(cmake_log_path)
+    stat = os.stat(cmake_log_path)
+
+    units = []
+    for offset, line in iter_log_lines(cmake_log_path):
+        match = COMPILE_SOURCE_RE.search(line)
+        if match:
+            if units:
+                units[-1]['end'] = offset
+            units.append({'source': match.group(1), 'start': offset, 'end': None})
+    if units:
+        units[-1]['end'] = stat.st_size
+
+    index = {
+        'log_size': stat.st_size,
+        'log_mtime': stat.st_mtime,
+        'units': units
+    }
+    with open(index_path, 'w') as f:
+        json.dump(index, f)
+    return index
+
+def load_log_index(cmake_log_path, index_path=None):
+    """Carica l'indice, ricostruendolo se il log è cambiato da quando è stato creato."""
+    index_path = index_path or index_path_for(cmake_log_path)
+    stat = os.stat(cmake_log_path)
+    try:
+        with open(index_path, 'r') as f:
+            index = json.load(f)
+        if index.get('log_size') == stat.st_size and index.get('log_mtime') == stat.st_mtime:
+            return index
+    except (OSError, ValueError):
+        pass
+    return build_log_index(cmake_log_path, index_path)
+
+def find_units(index, target_file):
+    """Sezioni dei TU che compilano target_file (nome o percorso finale)."""
+    target = target_file.replace('\\', '/')
+    return [unit for unit in index['units']
+            if unit['source'] == target or unit['source'].endswith('/' + target.lstrip('/'))]
+
+def read_unit_lines(cmake_log_path, unit):
+    """Legge solo la sezione del TU, con seek diretto all'offset indicizzato."""
+    with open(cmake_log_path, 'rb') as f:
+        f.seek(unit['start'])
+        data = f.read(unit['end'] - unit['start'])
+
+    offset = unit['start']
+    for raw in data.splitlines(keepends=True):
+        yield offset, raw.decode('utf-8', errors='replace').rstrip('\r\n')
+        offset += len(raw)
+
+def include_chain(tree, header):
+    """Catena di inclusioni che porta dal sorgente al primo header che termina con `header`."""
+    stack = [tree.source]
+    for entry in tree.entries:
+        del stack[entry.depth:]
+        stack.append(entry.path)
+        if entry.path == header or entry.path.endswith('/' + header.lstrip('/')):
+            return list(stack)
+    return []
+
+def analyze_includes(cmake_log_path, target_file, header=None, index=None):
+    index = index or load_log_index(cmake_log_path)
+    units = find_units(index, target_file)
+
+    if not units:
         print(f"No compilation commands found for {target_file}")
         return
 
     # Pattern to match include paths (-I flags)
     include_pattern = r'-I\s*(\S+)'
-    
-    # Pattern to match included files
-    included_files_pattern = r'(?:\.\.\.)\s*(.*?\.h)'
 
     print(f"\nAnalysis for {target_file}:")
     print("\nCompiler commands found:")
-    for cmd in compile_commands:
-        print(f"\nCommand: {cmd[:200]}...")  # Truncate long commands
-        
-        # Extract include paths
-        include_paths = re.findall(include_pattern, cmd)
-        print("\nInclude paths (-I):")
-        for path in include_paths:
-            print(f"  {path}")
-
-    # Find all included files mentioned in the log
-    included_files = re.findall(included_files_pattern, log_content)
-    
-    if included_files:
-        print("\nInclude order (from log):")
-        seen_files = set()
-        for file in included_files:
-            if file not in seen_files:
-                print(f"  {file}")
-                seen_files.add(file)
+    for unit in units:
+        for tree in iter_include_trees(read_unit_lines(cmake_log_path, unit)):
+            cmd = tree.command
+            print(f"\nCommand: {cmd[:200]}...")  # Truncate long commands
+
+            # Extract include paths
+            include_paths = re.findall(include_pattern, cmd)
+            print("\nInclude paths (-I):")
+            for path in include_paths:
+                print(f"  {path}")
+
+            if tree.entries:
+                print("\nInclude order (from log):")
+                seen_files = set()
+                for entry in tree.entries:
+                    if entry.path not in seen_files:
+                        print(f"  {'  ' * (entry.depth - 1)}{entry.path}")
+                        seen_files.add(entry.path)
+
+            if header:
+                chain = include_chain(tree, header)
+                if chain:
+                    print(f"\nWhy {tree.source} sees {header}:")
+                    for depth, path in enumerate(chain):
+                        print(f"  {'  ' * depth}{path}")
+                else:
+                    print(f"\n{header} is not included by {tree.source}")
 
 def main():
     cmake_log_path = "../hello-idf/build_output.txt"
     target_file = "m3_exec.c"
+    header = None
 
     if len(sys.argv) < 3:
-        #print("Usage: python script.py <cmake_log_path> <target_file>")
+        #print("Usage: python script.py <cmake_log_path> <target_file> [header]")
         #sys.exit(1)
         pass
     else:
         cmake_log_path = sys.argv[1]
         target_file = sys.argv[2]
+        if len(sys.argv) >= 4:
+            header = sys.argv[3]
 
     if not Path(cmake_log_path).exists():
         print(f"Error: CMake log file '{cmake_log_path}' not found")
         sys.exit(1)
 
-    analyze_includes(cmake_log_path, target_file)
+    analyze_includes(cmake_log_path, target_file, header)
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    main()
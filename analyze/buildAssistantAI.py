@@ -1,13 +1,22 @@
 import os
+import sys
+import shlex
+import signal
 import subprocess
 import json
 import re
 import time
 import logging
 from pathlib import Path
-from typing import Dict, Set, List, Optional, Tuple
-from dataclasses import dataclass
-import requests
+from typing import Dict, Set, List, Optional, Tuple, Callable
+from collections.abc import Mapping
+from dataclasses import dataclass, field
+from concurrent.futures import ThreadPoolExecutor, Future
+
+from symbolIndex import SymbolIndex
+from contextRetrieval import ContextRetriever, RetrievalStats, estimate_tokens
+from rebuildTargets import NinjaTargetMapper, source_changes
+from llmClient import get_shared_client, response_text, LLMRequestError
 
 @dataclass
 class SourceDefinition:
@@ -24,8 +33,82 @@ class SourceFile:
     includes: List[Path]
     raw_content: Optional[str] = None
 
+@dataclass
+class BuildResult:
+    output: str
+    success: bool
+    errors: List[Dict] = field(default_factory=list)
+    cancelled: bool = False
+    elapsed: float = 0.0
+    first_error_at: Optional[float] = None      # seconds from build start
+    advice: Optional[Future] = None             # get_solution() started while building
+    advice_errors: int = 0                      # how many errors the advice covers
+
+class ErrorMatcher:
+    """Incremental matcher: error_patterns compiled once, fed one line at a time."""
+
+    def __init__(self, error_patterns: Dict[str, str]):
+        self.patterns = [(error_type, re.compile(pattern)) for error_type, pattern in error_patterns.items()]
+        self.errors: List[Dict] = []
+
+    def feed(self, line: str) -> List[Dict]:
+        found = []
+        for error_type, pattern in self.patterns:
+            if match := pattern.search(line):
+                found.append({
+                    'type': error_type,
+                    'message': match.group(1),
+                    'context': line.strip()
+                })
+        self.errors.extend(found)
+        return found
+
+class DefinitionsView(Mapping):
+    """name -> [SourceDefinition], read on demand from the SymbolIndex."""
+
+    def __init__(self, index: SymbolIndex):
+        self.index = index
+
+    def __getitem__(self, name: str) -> List[SourceDefinition]:
+        definitions = [SourceDefinition(*row) for row in self.index.lookup(name)]
+        if not definitions:
+            raise KeyError(name)
+        return definitions
+
+    def __contains__(self, name) -> bool:
+        return isinstance(name, str) and self.index.has(name)
+
+    def __iter__(self):
+        return iter(self.index.names())
+
+    def __len__(self) -> int:
+        return self.index.count_names()
+
+class SourceFilesView(Mapping):
+    """path -> SourceFile without raw_content, read on demand from the SymbolIndex."""
+
+    def __init__(self, index: SymbolIndex):
+        self.index = index
+
+    def __getitem__(self, path) -> SourceFile:
+        includes = self.index.includes_of(path)
+        if includes is None:
+            raise KeyError(path)
+        definitions = [SourceDefinition(*row) for row in self.index.definitions_in(path)]
+        return SourceFile(path=Path(path), definitions=definitions, includes=includes)
+
+    def __contains__(self, path) -> bool:
+        return self.index.has_file(path)
+
+    def __iter__(self):
+        return iter(self.index.files())
+
+    def __len__(self) -> int:
+        return len(self.index.files())
+
 class BuildAssistant:
-    def __init__(self, esp_idf_path: str, gemini_api_key: str):
+    def __init__(self, esp_idf_path: str, gemini_api_key: str, index_db_path: Optional[str] = None,
+                 context_token_budget: int = 3000):
         # Setup logging
         self.logger = logging.getLogger('BuildAssistant')
         self.logger.setLevel(logging.DEBUG)
@@ -39,10 +122,19 @@ class BuildAssistant:
         self.esp_idf_path = Path(esp_idf_path)
         self.gemini_api_key = gemini_api_key
         self.gemini_url = "https://generativelanguage.googleapis.com/v1beta/models/gemini-pro:generateContent"
+        # Shared with every other caller using the same key and model: one connection pool and one rate limit
+        self.llm_client = get_shared_client(gemini_api_key, 'gemini-pro')
         
-        # Source analysis
-        self.source_files: Dict[Path, SourceFile] = {}
-        self.definitions_map: Dict[str, List[SourceDefinition]] = {}
+        # Source analysis (persistent index, see _scan_source_files)
+        self.index_db_path = index_db_path
+        self.symbol_index: Optional[SymbolIndex] = None
+        self.source_files: Mapping = {}
+        self.definitions_map: Mapping = {}
+        self.context_token_budget = context_token_budget
+        self.context_retriever: Optional[ContextRetriever] = None
+        self.last_context_stats: List[RetrievalStats] = []
+        self.last_changed_files: List[Path] = []
+        self.build_path = (self.esp_idf_path / 'build').resolve()
         
         # Error patterns
         self.error_patterns = {
@@ -66,11 +158,7 @@ class BuildAssistant:
         self._scan_source_files()
 
     def _call_gemini_api(self, prompt: str) -> dict:
-        """Makes a direct API call to Gemini."""
-        headers = {
-            "Content-Type": "application/json",
-        }
-        
+        """Makes an API call to Gemini through the shared rate-limited client."""
         data = {
             "contents": [{
                 "parts": [{
@@ -79,107 +167,51 @@ class BuildAssistant:
             }]
         }
         
-        url = f"{self.gemini_url}?key={self.gemini_api_key}"
-        
         try:
-            response = requests.post(url, headers=headers, json=data)
-            response.raise_for_status()
-            
-            result = response.json()
-            if 'candidates' in result and result['candidates']:
-                return result['candidates'][0]['content']['parts'][0]['text']
-            else:
-                raise ValueError("No valid response from Gemini API")
+            result = self.llm_client.generate_sync(self.gemini_url, data)
+            return response_text(result)
                 
-        except requests.exceptions.RequestException as e:
+        except LLMRequestError as e:
             self.logger.error(f"API request failed: {e}")
             return {"error": str(e)}
     
     def _scan_source_files(self):
-        """Scans project source files and analyzes their content."""
+        """Updates the persistent symbol index (only files whose mtime or size changed)."""
         self.logger.info("Scanning source files...")
         
-        extensions = {'.c', '.cpp', '.h', '.hpp'}
-        for ext in extensions:
-            for file_path in self.esp_idf_path.rglob(f'*{ext}'):
-                try:
-                    with open(file_path, 'r', encoding='utf-8') as f:
-                        content = f.read()
-                        
-                    definitions = []
-                    includes = []
-                    
-                    # Analyze includes
-                    for match in re.finditer(r'#include\s*[<"]([^>"]+)[>"]', content):
-                        inc_path = match.group(1)
-                        full_path = self.esp_idf_path / inc_path
-                        if full_path.exists():
-                            includes.append(full_path)
-                    
-                    # Analyze definitions
-                    for pattern_type, pattern in self.code_patterns.items():
-                        for match in re.finditer(pattern, content):
-                            name = match.group(1)
-                            line = content[:match.start()].count('\n') + 1
-                            def_content = content[match.start():match.end()]
-                            
-                            definition = SourceDefinition(
-                                name=name,
-                                type=pattern_type,
-                                line=line,
-                                content=def_content,
-                                file=file_path
-                            )
-                            definitions.append(definition)
-                            
-                            if name not in self.definitions_map:
-                                self.definitions_map[name] = []
-                            self.definitions_map[name].append(definition)
-                    
-                    self.source_files[file_path] = SourceFile(
-                        path=file_path,
-                        definitions=definitions,
-                        includes=includes,
-                        raw_content=content
-                    )
-                    
-                except Exception as e:
-                    self.logger.error(f"Error analyzing {file_path}: {e}")
-
-    def get_context_for_error(self, error_info: Dict) -> Dict:
-        """Finds context information related to the error."""
+        if self.symbol_index is None:
+            self.symbol_index = SymbolIndex(self.esp_idf_path, self.code_patterns, db_path=self.index_db_path)
+            self.source_files = SourceFilesView(self.symbol_index)
+            self.definitions_map = DefinitionsView(self.symbol_index)
+        
+        stats = self.symbol_index.update()
+        self.last_changed_files = stats['changed_files']
+        # New retriever: its IDF and include-distance caches refer to the previous index state
+        self.context_retriever = ContextRetriever(self.symbol_index, token_budget=self.context_token_budget)
+        self.context_retriever.check_include_graph()
+        self.logger.info(
+            f"Symbol index: {stats['files']} files, {stats['updated']} updated, "
+            f"{stats['removed']} removed, {stats['errors']} unreadable in {stats['elapsed']:.2f}s"
+        )
+
+    def get_context_for_error(self, error_info: Dict, token_budget: Optional[int] = None) -> Dict:
+        """
+        Finds context information related to the error: definitions ranked by
+        identifier rarity and include-graph distance from the failing file,
+        within a fixed token budget.
+        """
         context = {"relevant_definitions": [], "related_files": [], "includes": []}
         
         try:
-            # Look for related definitions
-            for error in error_info['errors']:
-                message = error['message']
-                
-                # Extract possible identifiers from error
-                identifiers = re.findall(r'\b\w+\b', message)
-                
-                for identifier in identifiers:
-                    if identifier in self.definitions_map:
-                        for definition in self.definitions_map[identifier]:
-                            context['relevant_definitions'].append({
-                                'name': definition.name,
-                                'type': definition.type,
-                                'file': str(definition.file.relative_to(self.esp_idf_path)),
-                                'line': definition.line,
-                                'content': definition.content
-                            })
-                            
-                            # Add related files
-                            source_file = self.source_files[definition.file]
-                            context['related_files'].append(str(definition.file.relative_to(self.esp_idf_path)))
-                            context['includes'].extend([
-                                str(inc.relative_to(self.esp_idf_path)) 
-                                for inc in source_file.includes
-                            ])
+            retrieved = self.context_retriever.retrieve(error_info['errors'], token_budget)
+            context = retrieved.to_prompt_dict()
+            self.last_context_stats = retrieved.stats
             
-            # Remove duplicates
-            context['related_files'] = list(set(context['related_files']))
-            context['includes'] = list(set(context['includes']))
+            for stats in retrieved.stats:
+                self.logger.info(
+                    f"Context for '{stats.message[:60]}': {stats.selected}/{stats.candidates} definitions, "
+                    f"{stats.tokens} tokens, {stats.latency_ms:.1f} ms"
+                )
             
         except Exception as e:
             self.logger.error(f"Error in context analysis: {e}")
@@ -225,6 +257,7 @@ class BuildAssistant:
             ]
         }}
         """
+        self.logger.info(f"Prompt size: {len(prompt)} chars (~{estimate_tokens(prompt)} tokens)")
         
         try:
             response = self._call_gemini_api(prompt)
@@ -256,45 +289,200 @@ class BuildAssistant:
             self.logger.error(f"Error during build: {e}")
             return str(e), False
     
+    def execute_build_streaming(self, build_script: str, error_budget: Optional[int] = None,
+                                prefetch_errors: int = 0, echo: bool = True,
+                                on_error: Optional[Callable[[Dict], None]] = None) -> BuildResult:
+        """
+        Executes the build script reading its output line by line.
+
+        Every line goes through the error matcher as soon as it is printed.
+        With prefetch_errors > 0, get_solution() for the first errors starts in
+        a background thread while compilation continues. With error_budget, the
+        build is stopped once that many errors have been seen.
+        """
+        self.logger.info(f"Executing build script (streaming): {build_script}")
+        matcher = ErrorMatcher(self.error_patterns)
+        result = BuildResult(output='', success=False)
+        output_lines = []
+        executor = ThreadPoolExecutor(max_workers=1) if prefetch_errors > 0 else None
+        start = time.time()
+
+        try:
+            process = subprocess.Popen(
+                build_script,
+                shell=True,
+                stdout=subprocess.PIPE,
+                stderr=subprocess.STDOUT,
+                text=True,
+                bufsize=1,
+                errors='replace',
+                cwd=self.esp_idf_path,
+                start_new_session=True
+            )
+        except Exception as e:
+            self.logger.error(f"Error during build: {e}")
+            result.output = str(e)
+            return result
+
+        try:
+            for line in process.stdout:
+                output_lines.append(line)
+                if echo:
+                    sys.stdout.write(line)
+
+                found = matcher.feed(line)
+                if not found:
+                    continue
+
+                if result.first_error_at is None:
+                    result.first_error_at = time.time() - start
+                for error in found:
+                    self.logger.debug(f"Found error: {error['type']} - {error['message']}")
+                    if on_error:
+                        on_error(error)
+
+                if executor and result.advice is None and len(matcher.errors) >= prefetch_errors:
+                    result.advice_errors = len(matcher.errors)
+                    result.advice = executor.submit(self.get_solution, list(matcher.errors))
+
+                if error_budget is not None and len(matcher.errors) >= error_budget:
+                    self.logger.warning(f"Error budget ({error_budget}) reached, stopping the build")
+                    result.cancelled = True
+                    self._terminate_build(process)
+                    break
+
+            process.wait()
+        finally:
+            if process.poll() is None:
+                self._terminate_build(process)
+            process.stdout.close()
+            if executor:
+                # Advice requested late: the build ended with fewer errors than prefetch_errors
+                if result.advice is None and matcher.errors:
+                    result.advice_errors = len(matcher.errors)
+                    result.advice = executor.submit(self.get_solution, list(matcher.errors))
+                executor.shutdown(wait=False)
+
+        result.output = ''.join(output_lines)
+        result.errors = matcher.errors
+        result.success = not result.cancelled and process.returncode == 0
+        result.elapsed = time.time() - start
+        return result
+
+    def _terminate_build(self, process: subprocess.Popen):
+        """Stops the whole build process group (shell, ninja and compilers)."""
+        try:
+            os.killpg(process.pid, signal.SIGTERM)
+            process.wait(timeout=10)
+        except subprocess.TimeoutExpired:
+            os.killpg(process.pid, signal.SIGKILL)
+            process.wait()
+        except ProcessLookupError:
+            pass
+    
     def parse_errors(self, output: str):
         """Analyzes output for errors"""
         self.logger.info("Analyzing errors")
-        errors = []
+        matcher = ErrorMatcher(self.error_patterns)
         
         for line in output.split('\n'):
-            for error_type, pattern in self.error_patterns.items():
-                if match := re.search(pattern, line):
-                    errors.append({
-                        'type': error_type,
-                        'message': match.group(1),
-                        'context': line.strip()
-                    })
-                    self.logger.debug(f"Found error: {error_type} - {match.group(1)}")
+            for error in matcher.feed(line):
+                self.logger.debug(f"Found error: {error['type']} - {error['message']}")
         
-        return errors
+        return matcher.errors
+
+    def _print_solution(self, build: BuildResult):
+        # Get and show solution (already requested during the build if prefetching)
+        if build.advice is not None:
+            solution = build.advice.result()
+        else:
+            solution = self.get_solution(build.errors)
+        if solution:
+            print("\nError analysis:")
+            print(json.dumps(solution, indent=2, ensure_ascii=False))
+        return solution
+
+    def _wait_for_fix(self, solution, errors) -> List[Path]:
+        """
+        Default fix step: the user applies the suggestion, changed files are found by the index.
+        Only sources and headers outside the build directory count as part of the fix.
+        """
+        input("\nApply the fix, then press Enter to verify it...")
+        self._scan_source_files()
+        return source_changes(self.last_changed_files, self.build_path)
 
-    def run(self, build_script: str):
-        """Executes the entire process"""
+    def run(self, build_script: str, error_budget: Optional[int] = None, prefetch_errors: int = 0,
+            max_iterations: int = 1, apply_fix: Optional[Callable] = None, build_dir: str = 'build'):
+        """
+        Executes the entire process.
+
+        With max_iterations > 1 it becomes a fix loop: after each suggested fix
+        (apply_fix(solution, errors) -> changed files, interactive by default)
+        only the Ninja objects that depend on the changed files are rebuilt.
+        The full build script runs again only once those compile.
+        """
         self.logger.info("Starting build analysis")
+        apply_fix = apply_fix or self._wait_for_fix
+        self.build_path = (self.esp_idf_path / build_dir).resolve()
+        mapper = NinjaTargetMapper(self.build_path, symbol_index=self.symbol_index)
         
-        # Execute build
-        output, success = self.execute_build(build_script)
-        
-        if success:
-            print("Build completed successfully!")
-            return
+        # Execute build, matching errors while it runs
+        build = self.execute_build_streaming(
+            build_script,
+            error_budget=error_budget,
+            prefetch_errors=prefetch_errors
+        )
+        full_build = True
+        fixes = 0
         
-        # Find errors
-        errors = self.parse_errors(output)
-        if not errors:
-            print("Build failed but no recognized errors")
-            return
+        while True:
+            if build.success:
+                if full_build:
+                    print("Build completed successfully!")
+                    return
+                # The affected objects compile: confirm with the full build
+                self.logger.info("Targeted rebuild succeeded, running the full build")
+                build = self.execute_build_streaming(build_script, error_budget=error_budget)
+                full_build = True
+                continue
             
-        # Get and show solution
-        solution = self.get_solution(errors)
-        if solution:
-            print("\nError analysis:")
-            print(json.dumps(solution, indent=2, ensure_ascii=False))
+            if not build.errors:
+                print("Build failed but no recognized errors")
+                return
+            
+            if build.first_error_at is not None:
+                self.logger.info(
+                    f"First error after {build.first_error_at:.1f}s, build "
+                    f"{'cancelled' if build.cancelled else 'finished'} after {build.elapsed:.1f}s"
+                )
+            
+            solution = self._print_solution(build)
+            if fixes >= max_iterations - 1:
+                return
+            fixes += 1
+            
+            changed = apply_fix(solution, build.errors)
+            if not changed:
+                self.logger.info("No files changed, stopping")
+                return
+            
+            mapper.invalidate()
+            targets = mapper.targets_for(changed)
+            if targets:
+                self.logger.info(f"Rebuilding {len(targets)} objects affected by {len(changed)} changed files")
+                build = self.execute_build_streaming(
+                    shlex.join(mapper.rebuild_command(targets)),
+                    error_budget=error_budget,
+                    prefetch_errors=prefetch_errors
+                )
+                full_build = False
+            else:
+                build = self.execute_build_streaming(
+                    build_script,
+                    error_budget=error_budget,
+                    prefetch_errors=prefetch_errors
+                )
+                full_build = True
 
 
 def load_gemini_key(file_path):
@@ -317,7 +505,7 @@ def main():
         gemini_api_key=gemini_key
     )
     
-    assistant.run("./build.sh")
+    assistant.run("./build.sh", max_iterations=5)
 
 if __name__ == "__main__":
     main()
\ No newline at end of file
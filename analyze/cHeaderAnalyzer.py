@@ -1,12 +1,16 @@
 import re
 from pathlib import Path
-from collections import defaultdict
+from collections import defaultdict, deque
 from typing import Dict, Set, List, Tuple, NamedTuple, Optional
-from dataclasses import dataclass
+from dataclasses import dataclass, field
+from concurrent.futures import ThreadPoolExecutor
 import sys
 from enum import Enum, auto
 import os
 
+from fileModel import FileModelCache, LineIndex, shared_file_models
+from graphCycles import strongly_connected_components
+
 class TypeKind(Enum):
     STRUCT = auto()
     CLASS = auto()
@@ -55,11 +59,24 @@ class CompilationIssue(NamedTuple):
     message: str
     symbol: str = None
 
+@dataclass
+class TypeIssueReport:
+    """Risultato dell'analisi di tutti gli errori con lo stesso (file, simbolo)"""
+    file: Path
+    symbol: str
+    issues: List[CompilationIssue]
+    file_known: bool = False
+    includes: List[Include] = field(default_factory=list)
+    definitions: List[Tuple[HeaderFile, TypeDefinition]] = field(default_factory=list)
+    included_by: Dict[Path, List[Tuple[Path, int]]] = field(default_factory=dict)
+    cycles: Dict[Path, List[List[Path]]] = field(default_factory=dict)
+    paths: Dict[Path, List[Path]] = field(default_factory=dict)
+
 class HeaderAnalyzer:
     MAX_RECURSION_DEPTH = 100
     HEADER_EXTENSIONS = {'.h', '.hpp', '.hxx', '.h++'}
     
-    def __init__(self, project_paths: List[str]):
+    def __init__(self, project_paths: List[str], file_models: Optional[FileModelCache] = None):
         if isinstance(project_paths, str):
             project_paths = [project_paths]
             
@@ -68,12 +85,18 @@ class HeaderAnalyzer:
         for path in self.project_paths:
             print(f"  - {path}")
             
+        self.file_models = file_models or shared_file_models
         self.files: Dict[Path, HeaderFile] = {}
         self.include_graph = defaultdict(set)
         self.reverse_graph = defaultdict(set)
         self.includes_order = defaultdict(list)
         self.type_definitions = defaultdict(list)
         self.type_usages = defaultdict(list)
+        self._project_file_cache: Dict[Path, bool] = {}
+        self._type_index: Optional[Dict[str, List[HeaderFile]]] = None
+        self._bfs_cache: Dict[Path, Dict[Path, Optional[Path]]] = {}
+        # Indice della componente fortemente connessa di ogni file (None: da ricalcolare)
+        self._component_index: Optional[Dict[Path, int]] = None
         self._initialize_files()
     
     def _get_include_path(self, included_path: str, current_file: Path) -> Optional[Path]:
@@ -104,12 +127,11 @@ class HeaderAnalyzer:
             if not self.is_project_file(file_path) or not file_path.is_file():
                 return None
             
-            try:
-                with open(file_path, 'r', encoding='utf-8') as f:
-                    content = f.read()
-            except UnicodeDecodeError:
-                print(f"Errore di codifica in {file_path.name}")
+            model = self.file_models.get(str(file_path))
+            if model is None:
+                print(f"Impossibile leggere {file_path.name}")
                 return None
+            content = model.content
             
             header = HeaderFile(
                 path=file_path,
@@ -118,23 +140,22 @@ class HeaderAnalyzer:
                 included_by=set(),
                 raw_content=content
             )
+            lines = model.lines
             
-            # Analizza le inclusioni
-            include_pattern = re.compile(r'#include\s*[<"]([^>"]+)[>"]')
-            for match in include_pattern.finditer(content):
-                included_path = match.group(1)
-                is_system = match.group(0).strip().endswith('>')
-                line_num = content[:match.start()].count('\n') + 1
-                
-                resolved_path = self._get_include_path(included_path, file_path)
+            # Le inclusioni sono già indicizzate nel modello condiviso
+            for directive in model.include_directives:
+                resolved_path = self._get_include_path(directive.name, file_path)
                 if resolved_path:
-                    include = Include(resolved_path, line_num, is_system)
+                    include = Include(resolved_path, directive.line, directive.system)
                     header.add_include(include)
                     self.include_graph[file_path].add(resolved_path)
                     self.reverse_graph[resolved_path].add(file_path)
             
-            self._parse_type_definitions(header, content)
+            self._parse_type_definitions(header, content, lines)
             self.files[file_path] = header
+            self._type_index = None
+            self._bfs_cache.clear()
+            self._component_index = None
             return header
             
         except Exception as e:
@@ -145,6 +166,14 @@ class HeaderAnalyzer:
         return file_path.suffix.lower() in self.HEADER_EXTENSIONS
 
     def is_project_file(self, file_path: Path) -> bool:
+        if not file_path:
+            return False
+        cached = self._project_file_cache.get(file_path)
+        if cached is None:
+            cached = self._project_file_cache[file_path] = self._check_project_file(file_path)
+        return cached
+
+    def _check_project_file(self, file_path: Path) -> bool:
         try:
             if not file_path or not self.is_header_file(file_path):
                 return False
@@ -197,32 +226,33 @@ class HeaderAnalyzer:
             except Exception as e:
                 print(f"Errore nel parsing di {file_path}: {e}")
 
-    def _parse_type_definitions(self, header: HeaderFile, content: str):
+    def _parse_type_definitions(self, header: HeaderFile, content: str, lines: Optional[LineIndex] = None):
         """Analizza il contenuto per trovare definizioni di tipi."""
+        lines = lines or LineIndex(content)
         # Struct e Class
         for match in re.finditer(r'(struct|class)\s+(\w+)\s*\{', content):
             kind = TypeKind.STRUCT if match.group(1) == 'struct' else TypeKind.CLASS
             name = match.group(2)
-            line = content[:match.start()].count('\n') + 1
+            line = lines.line_of(match.start())
             header.add_type(TypeDefinition(name, kind, line, match.group(0)))
             
         # Typedef
         for match in re.finditer(r'typedef\s+.*?\s+(\w+)\s*;', content):
             name = match.group(1)
-            line = content[:match.start()].count('\n') + 1
+            line = lines.line_of(match.start())
 
             header.add_type(TypeDefinition(name, TypeKind.TYPEDEF, line, match.group(0)))
             
         # Enum
         for match in re.finditer(r'enum\s+(\w+)\s*\{', content):
             name = match.group(1)
-            line = content[:match.start()].count('\n') + 1
+            line = lines.line_of(match.start())
             header.add_type(TypeDefinition(name, TypeKind.ENUM, line, match.group(0)))
             
         # Define
         for match in re.finditer(r'#define\s+(\w+)\s+', content):
             name = match.group(1)
-            line = content[:match.start()].count('\n') + 1
+            line = lines.line_of(match.start())
             header.add_type(TypeDefinition(name, TypeKind.DEFINE, line, match.group(0)))
 
     def parse_build_log(self, log_content: str) -> List[CompilationIssue]:
@@ -278,6 +308,9 @@ class HeaderAnalyzer:
                     issues.append(issue)
                     self.type_usages[type_name].append((file_path, line_num))
         
+        # Il grafo può essere cambiato: le BFS e le componenti in cache non sono più valide
+        self._bfs_cache.clear()
+        self._component_index = None
         return issues
 
     def analyze_type_issue(self, issue: CompilationIssue):
@@ -294,10 +327,7 @@ class HeaderAnalyzer:
             print(f"ATTENZIONE: File con l'errore {issue.file.name} non trovato nel progetto")
         
         # Trova i file che definiscono il tipo
-        defining_files = []
-        for header in self.files.values():
-            if any(t.name == issue.symbol for t in header.types):
-                defining_files.append(header)
+        defining_files = list(self._get_type_index().get(issue.symbol, []))
         
         if defining_files:
             print(f"\nIl tipo '{issue.symbol}' è definito in:")
@@ -338,28 +368,75 @@ class HeaderAnalyzer:
         else:
             print(f"\nIl tipo '{issue.symbol}' non è definito in nessun header del progetto")
 
+    def _components(self) -> Dict[Path, int]:
+        """Componente fortemente connessa di ogni file del grafo delle inclusioni (graphCycles)."""
+        if self._component_index is None:
+            self._component_index = {}
+            for number, component in enumerate(strongly_connected_components(self.include_graph)):
+                for member in component:
+                    self._component_index[member] = number
+        return self._component_index
+
     def _find_cycles_between_files(self, file1: Path, file2: Path, max_depth=10) -> List[List[Path]]:
-        """Trova tutti i cicli di inclusione tra due file."""
-        cycles = []
-        visited = set()
-        
-        def dfs(current: Path, target: Path, path: List[Path], depth: int = 0):
-            if depth > max_depth:
-                return
-                
-            if current == target and len(path) > 1:
-                cycles.append(path + [current])
-                return
-                
-            if current in path:
-                return
-                
-            for next_file in self.include_graph[current]:
-                if next_file not in visited:
-                    visited.add(next_file)
-                    dfs(next_file, target, path + [current], depth + 1)
-                    visited.remove(next_file)
-        
+        """
+        Trova il ciclo di inclusione più corto che passa per entrambi i file.
+        Esiste solo se stanno nella stessa componente fortemente connessa: per
+        tutti gli altri file bastano due lookup, senza BFS.
+        """
+        components = self._components()
+        if file1 == file2 or file1 not in components or components.get(file1) != components.get(file2):
+            return []
+        forward = self.shortest_include_path(file1, file2)
+        backward = self.shortest_include_path(file2, file1)
+        if not forward or not backward or file1 == file2:
+            return []
+        cycle = forward + backward[1:]
+        if len(cycle) - 1 > max_depth:
+            return []
+        return [cycle]
+
+    def _bfs_parents(self, start: Path) -> Dict[Path, Optional[Path]]:
+        """
+        BFS sul grafo delle inclusioni da `start`: mappa ogni file raggiungibile
+        al suo predecessore sul percorso più corto. Calcolata una volta per file.
+        """
+        parents = self._bfs_cache.get(start)
+        if parents is not None:
+            return parents
+
+        parents = {start: None}
+        queue = deque([start])
+        while queue:
+            current = queue.popleft()
+            for next_file in self.include_graph.get(current, ()):
+                if next_file not in parents:
+                    parents[next_file] = current
+                    queue.append(next_file)
+
+        self._bfs_cache[start] = parents
+        return parents
+
+    def shortest_include_path(self, from_file: Path, to_file: Path) -> List[Path]:
+        """Percorso di inclusione più corto tra due file ([] se non raggiungibile)."""
+        parents = self._bfs_parents(from_file)
+        if to_file not in parents:
+            return []
+        path = [to_file]
+        while parents[path[-1]] is not None:
+            path.append(parents[path[-1]])
+        path.reverse()
+        return path
+
+    def _get_type_index(self) -> Dict[str, List[HeaderFile]]:
+        """Indice simbolo -> header che lo definiscono, costruito una volta."""
+        if self._type_index is None:
+            index = defaultdict(list)
+            for header in self.files.values():
+                for name in {t.name for t in header.types}:
+                    index[name].append(header)
+            self._type_index = index
+        return self._type_index
+
     def find_type_definition_paths(self, from_file: Path, type_name: str, depth=0) -> List[List[Path]]:
         """Trova tutti i percorsi possibili alla definizione di un tipo."""
         if depth > self.MAX_RECURSION_DEPTH:
@@ -389,13 +466,103 @@ class HeaderAnalyzer:
             
         return dfs(from_file, set(), [], 0)
 
+    def _build_type_issue_report(self, file: Path, symbol: str, issues: List[CompilationIssue]) -> TypeIssueReport:
+        """Lavoro per (file, simbolo): usa solo indici e BFS già calcolati."""
+        report = TypeIssueReport(file=file, symbol=symbol, issues=issues)
+
+        if file in self.files:
+            report.file_known = True
+            report.includes = list(self.files[file].includes)
+
+        for header in self._get_type_index().get(symbol, []):
+            report.definitions.append((header, header.find_type(symbol)))
+
+            including = []
+            for including_file in self.reverse_graph.get(header.path, ()):
+                if including_file in self.files:
+                    for inc in self.files[including_file].includes:
+                        if inc.path == header.path:
+                            including.append((including_file, inc.line))
+            report.included_by[header.path] = including
+
+            report.cycles[header.path] = self._find_cycles_between_files(file, header.path)
+            report.paths[header.path] = self.shortest_include_path(file, header.path)
+
+        return report
+
+    def analyze_type_issues_batch(self, issues: List[CompilationIssue], max_workers: Optional[int] = None) -> List[TypeIssueReport]:
+        """
+        Analizza tutti i problemi di tipo insieme: raggruppa per (file, simbolo),
+        calcola una volta sola le BFS dai file coinvolti e poi costruisce i
+        report in un thread pool.
+        """
+        groups: Dict[Tuple[Path, str], List[CompilationIssue]] = defaultdict(list)
+        for issue in issues:
+            if issue.symbol:
+                groups[(issue.file, issue.symbol)].append(issue)
+
+        type_index = self._get_type_index()
+        sources = {file for file, _ in groups}
+        sources.update(header.path for _, symbol in groups for header in type_index.get(symbol, []))
+        for source in sources:
+            self._bfs_parents(source)
+
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            futures = [executor.submit(self._build_type_issue_report, file, symbol, group)
+                       for (file, symbol), group in groups.items()]
+            return [future.result() for future in futures]
+
+    def print_type_issue_report(self, report: TypeIssueReport):
+        """Stampa un report nello stesso formato di analyze_type_issue."""
+        lines = ", ".join(str(issue.line) for issue in report.issues)
+        print(f"\n=== Analisi del tipo '{report.symbol}' non trovato in {report.file.name}:{lines} ===\n")
+
+        if report.file_known:
+            print(f"File con l'errore ({report.file.name}) include:")
+            for inc in report.includes:
+                print(f"  - {inc.path.name} (linea {inc.line})")
+        else:
+            print(f"ATTENZIONE: File con l'errore {report.file.name} non trovato nel progetto")
+
+        if not report.definitions:
+            print(f"\nIl tipo '{report.symbol}' non è definito in nessun header del progetto")
+            return
+
+        print(f"\nIl tipo '{report.symbol}' è definito in:")
+        for header, type_def in report.definitions:
+            print(f"  {header.path.name}:{type_def.line} -> {type_def.content}")
+            including = report.included_by.get(header.path)
+            if including:
+                print(f"  {header.path.name} è incluso da:")
+                for including_file, line in including:
+                    print(f"    - {including_file.name} (linea {line})")
+            else:
+                print(f"  {header.path.name} non è incluso da nessun file nel progetto")
+
+            cycles = report.cycles.get(header.path)
+            if cycles:
+                print(f"\nATTENZIONE: Trovati cicli di inclusione tra {report.file.name} e {header.path.name}:")
+                for cycle in cycles:
+                    print("  " + " -> ".join(p.name for p in cycle))
+
+        print("\nAnalisi dei percorsi di inclusione:")
+        for header, _ in report.definitions:
+            path = report.paths.get(header.path)
+            if path:
+                print(f"\nPercorso più corto da {report.file.name} a {header.path.name}:")
+                print("  " + " -> ".join(p.name for p in path))
+            else:
+                print(f"\nNessun percorso di inclusione trovato verso {header.path.name}")
+
 def main():
     if len(sys.argv) < 2:
-        print("Uso: python cHeaderAnalyzer.py <log_file> [project_path]")
+        print("Uso: python cHeaderAnalyzer.py <log_file> [project_path] [--batch]")
         sys.exit(1)
 
-    log_path = sys.argv[1]
-    project_path = sys.argv[2] if len(sys.argv) > 2 else os.path.dirname(log_path)
+    batch = '--batch' in sys.argv
+    args = [arg for arg in sys.argv[1:] if arg != '--batch']
+    log_path = args[0]
+    project_path = args[1] if len(args) > 1 else os.path.dirname(log_path)
 
     try:
         with open(log_path, 'r') as f:
@@ -408,6 +575,11 @@ def main():
         if not type_issues:
             print("Nessun problema di tipo non trovato nel log.")
             return
+
+        if batch:
+            for report in analyzer.analyze_type_issues_batch(type_issues):
+                analyzer.print_type_issue_report(report)
+            return
             
         for issue in type_issues:
             analyzer.analyze_type_issue(issue)
@@ -420,4 +592,5 @@ def main():
 if __name__ == "__main__":
     main()
 
-# python3 cHeaderAnalyzer.py ../hello-idf/build_output.txt
\ No newline at end of file
+# python3 cHeaderAnalyzer.py ../hello-idf/build_output.txt
+# python3 cHeaderAnalyzer.py ../hello-idf/build_output.txt <project_path> --batch
@@ -7,6 +7,8 @@ import networkx as nx
 import platform
 import subprocess
 
+from fileModel import shared_file_models
+
 @dataclass
 class TypeInfo:
     name: str
@@ -155,13 +157,8 @@ class HeaderDependencyAnalyzer:
         return dependencies
 
     def analyze_includes(self, file_path: Path):
-        includes = set()
-        
-        with open(file_path, 'r', encoding='utf-8') as f:
-            for line in f:
-                if line.strip().startswith('#include'):
-                    include_path = line.split('"')[1] if '"' in line else line.split('<')[1].split('>')[0]
-                    includes.add(include_path)
+        model = shared_file_models.get(str(file_path))
+        includes = set(model.includes) if model else set()
                     
         self.includes[str(file_path)] = includes
         
@@ -7,12 +7,17 @@ import logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
-def check_gemini_quota(api_key):
+# Limiti noti del piano gratuito (richieste/token al minuto): l'API non li
+# restituisce; la tabella sta in llmClient.py, che li usa per il rate limit
+from llmClient import KNOWN_LIMITS
+
+def check_gemini_quota(api_key, model_name='gemini-pro'):
     """
     Controlla la quota disponibile per le API di Google Gemini.
     
     Args:
         api_key (str): La chiave API di Google Cloud/Gemini
+        model_name (str): Il modello da provare
         
     Returns:
         dict: Informazioni sulla quota e stato della richiesta
@@ -22,7 +27,7 @@ def check_gemini_quota(api_key):
         genai.configure(api_key=api_key)
         
         # Inizializza il modello
-        model = genai.GenerativeModel('gemini-pro')
+        model = genai.GenerativeModel(model_name)
         
         # Esegui una richiesta di prova
         response = model.generate_content(
@@ -44,8 +49,9 @@ def check_gemini_quota(api_key):
             'response_type': str(type(response)),
             'available_attributes': dir(response),
             'checked_at': datetime.now().isoformat(),
-            'model': 'gemini-pro'
+            'model': model_name
         }
+        quota_info.update(KNOWN_LIMITS.get(model_name, {}))
         
         # Se disponibili, aggiungi ulteriori dettagli sulla risposta
         if hasattr(response, 'prompt_feedback'):
@@ -58,10 +64,14 @@ def check_gemini_quota(api_key):
         
     except Exception as e:
         logger.error(f"Errore durante il controllo della quota: {str(e)}")
+        message = str(e)
+        exhausted = '429' in message or 'quota' in message.lower() or 'exhausted' in message.lower()
         return {
-            'status': 'error',
-            'error': str(e),
-            'checked_at': datetime.now().isoformat()
+            'status': 'quota_exceeded' if exhausted else 'error',
+            'error': message,
+            'checked_at': datetime.now().isoformat(),
+            'model': model_name,
+            **KNOWN_LIMITS.get(model_name, {})
         }
 
 
@@ -1,6 +1,142 @@
 import re
-from collections import defaultdict
+import os
 import sys
+import io
+import mmap
+from collections import defaultdict, Counter
+from dataclasses import dataclass, field
+from typing import Dict, Iterator, List, Optional, Tuple
+
+from graphCycles import find_cycles
+
+# Riga dell'albero di gcc -H: ". /path/header.h", ".. /path/altro.h", ...
+INCLUDE_TREE_RE = re.compile(r'^(\.+) (\S.*)$')
+# Comando di compilazione (ninja -v): "... -c /path/file.c ..."
+COMPILE_SOURCE_RE = re.compile(r'(?:^|\s)-c\s+(\S+\.(?:c|cc|cpp|cxx|S|s))(?=\s|$)')
+GUARDS_HEADER = 'Multiple include guards may be useful for:'
+UNKNOWN_SOURCE = '<unknown>'
+
+@dataclass
+class IncludeEntry:
+    """Una riga dell'albero -H: ordine di apparizione, profondità e file padre"""
+    order: int
+    depth: int
+    path: str
+    parent: str
+
+@dataclass
+class TranslationUnitTree:
+    """Albero delle inclusioni prodotto da un singolo comando di compilazione"""
+    source: str
+    command: str
+    offset: int                                  # byte offset del comando nel log
+    entries: List[IncludeEntry] = field(default_factory=list)
+    counts: Counter = field(default_factory=Counter)
+    edges: Dict[str, set] = field(default_factory=lambda: defaultdict(set))
+    max_depth: int = 0
+    guard_suggestions: List[str] = field(default_factory=list)
+
+    @property
+    def repeated(self) -> Dict[str, int]:
+        """Header letti più di una volta nello stesso TU"""
+        return {path: n for path, n in self.counts.items() if n > 1}
+
+def iter_log_lines(log_path: str) -> Iterator[Tuple[int, str]]:
+    """
+    Itera sulle righe del log (mappato in memoria) restituendo (byte offset, riga).
+    Nessuna copia dell'intero file viene mai creata.
+    """
+    with open(log_path, 'rb') as f:
+        if os.fstat(f.fileno()).st_size == 0:
+            return
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+            offset = 0
+            for raw in iter(mm.readline, b''):
+                yield offset, raw.decode('utf-8', errors='replace').rstrip('\r\n')
+                offset += len(raw)
+
+def iter_include_trees(lines, keep_entries: bool = True) -> Iterator[TranslationUnitTree]:
+    """
+    Separa l'output di -H per comando di compilazione.
+
+    `lines` è un iterabile di (offset, riga), ad esempio iter_log_lines().
+    Ogni TU viene restituito appena inizia il comando successivo, quindi la
+    memoria usata dipende dal TU più grande e non dalla dimensione del log.
+    Con keep_entries=False si conservano solo archi e conteggi.
+    """
+    current: Optional[TranslationUnitTree] = None
+    stack: List[str] = []
+    order = 0
+    in_guards = False
+
+    for offset, line in lines:
+        match = INCLUDE_TREE_RE.match(line)
+        if match:
+            if current is None:
+                # Albero senza comando di compilazione (log parziale)
+                current = TranslationUnitTree(source=UNKNOWN_SOURCE, command='', offset=offset)
+                stack = [current.source]
+            in_guards = False
+            depth = len(match.group(1))
+            path = match.group(2).strip()
+
+            # stack[0] è il sorgente, stack[d - 1] il padre di un header a profondità d
+            del stack[depth:]
+            parent = stack[-1] if stack else current.source
+            if len(stack) < depth:
+                # Albero troncato (righe perse): si aggancia all'ultimo livello noto
+                stack.extend([parent] * (depth - len(stack)))
+            stack.append(path)
+
+            current.edges[parent].add(path)
+            current.counts[path] += 1
+            current.max_depth = max(current.max_depth, depth)
+            if keep_entries:
+                current.entries.append(IncludeEntry(order, depth, path, parent))
+            order += 1
+            continue
+
+        stripped = line.strip()
+        if not stripped or stripped.startswith('In file included from'):
+            continue
+
+        if stripped == GUARDS_HEADER:
+            in_guards = current is not None
+            continue
+
+        compile_match = COMPILE_SOURCE_RE.search(line)
+        if compile_match:
+            if current is not None:
+                yield current
+            current = TranslationUnitTree(
+                source=compile_match.group(1),
+                command=stripped,
+                offset=offset
+            )
+            stack = [current.source]
+            order = 0
+            in_guards = False
+            continue
+
+        if in_guards and current is not None and ' ' not in stripped:
+            current.guard_suggestions.append(stripped)
+        else:
+            in_guards = False
+
+    if current is not None:
+        yield current
+
+def parse_cmake_log_file(log_path: str, keep_entries: bool = True) -> Iterator[TranslationUnitTree]:
+    """Alberi -H per TU da un file di log, in streaming."""
+    return iter_include_trees(iter_log_lines(log_path), keep_entries=keep_entries)
+
+def merge_dependencies(trees) -> Dict[str, set]:
+    """Unisce gli archi di tutti i TU in un unico grafo delle dipendenze."""
+    dependencies = defaultdict(set)
+    for tree in trees:
+        for parent, children in tree.edges.items():
+            dependencies[parent].update(children)
+    return dependencies
 
 def count_dots(line):
     """Conta il numero di punti all'inizio della riga per determinare il livello di indentazione"""
@@ -9,71 +145,19 @@ def count_dots(line):
 def parse_cmake_log(log_content):
     """
     Analizza il contenuto del log cmake per estrarre le dipendenze ricorsive.
+    Tutti i TU vengono uniti in un unico dizionario; per i singoli alberi
+    usare parse_cmake_log_file().
     """
-    # Dizionario per memorizzare le dipendenze per ogni file
-    dependencies = defaultdict(set)
-    
-    # Stack per tenere traccia del percorso di inclusione corrente
-    inclusion_stack = []
-    
-    # Converte il log in liste di righe e rimuove le righe vuote
-    lines = [line.strip() for line in log_content.split('\n') if line.strip()]
-    
-    current_level = 0
-    for line in lines:
-        # Salta le righe che non contengono informazioni sui file
-        if line.startswith('In file included from'):
-            continue
-            
-        # Se la riga inizia con punti, è una dipendenza
-        if line.startswith('.'):
-            level = count_dots(line)
-            file_path = line[level:].strip()
-            
-            # Aggiorna lo stack delle inclusioni in base al livello
-            while len(inclusion_stack) > level:
-                inclusion_stack.pop()
-                
-            if inclusion_stack:
-                # Aggiungi la dipendenza al file corrente
-                dependencies[inclusion_stack[-1]].add(file_path)
-                
-            inclusion_stack.append(file_path)
-            current_level = level
-
-    return dependencies
+    lines = ((0, line.rstrip('\n')) for line in io.StringIO(log_content))
+    return merge_dependencies(iter_include_trees(lines, keep_entries=False))
 
 def detect_circular_dependencies(dependencies):
     """
     Identifica le dipendenze circolari nel grafo delle dipendenze.
+    Restituisce una CycleReport per ogni componente fortemente connessa
+    (tutti i file coinvolti + il ciclo più corto di esempio), in tempo lineare.
     """
-    def find_cycle(node, visited, path):
-        if node in path:
-            cycle_start = path.index(node)
-            return path[cycle_start:]
-        if node in visited:
-            return []
-            
-        visited.add(node)
-        path.append(node)
-        
-        for neighbor in dependencies.get(node, []):
-            cycle = find_cycle(neighbor, visited, path.copy())
-            if cycle:
-                return cycle
-                
-        return []
-
-    circular_deps = []
-    visited = set()
-    
-    for node in dependencies:
-        if node not in visited:
-            cycle = find_cycle(node, visited, [])
-            if cycle:
-                circular_deps.append(cycle)
-                
-    return circular_deps
+    return find_cycles(dependencies)
 
 def print_dependencies(dependencies):
     """
@@ -91,31 +175,49 @@ def print_dependencies(dependencies):
     circular = detect_circular_dependencies(dependencies)
     if circular:
         print("\nDipendenze circolari trovate:")
-        for cycle in circular:
-            print(" → ".join(cycle))
+        for report in circular:
+            print(f"[{len(report.component)} file] " + " → ".join(report.witness))
     else:
         print("\nNessuna dipendenza circolare trovata.")
 
+def print_translation_units(trees):
+    """
+    Stampa un riepilogo per ogni TU: numero di header, profondità massima
+    e header letti più volte.
+    """
+    for tree in trees:
+        print(f"\nTU: {tree.source}")
+        print(f"  Header inclusi: {sum(tree.counts.values())} ({len(tree.counts)} distinti), profondità massima: {tree.max_depth}")
+        for path, count in sorted(tree.repeated.items(), key=lambda item: -item[1]):
+            print(f"  ↻ {count}x {path}")
+        for path in tree.guard_suggestions:
+            print(f"  ! include guard mancante: {path}")
+
 def main():
     """
     Funzione principale che legge il file di log e analizza le dipendenze.
+    Con --tu stampa gli alberi separati per unità di compilazione.
     """
-    if len(sys.argv) != 2:
-        print("Uso: python script.py <cmake_log_file>")
+    args = [arg for arg in sys.argv[1:] if arg != '--tu']
+    per_tu = len(args) != len(sys.argv) - 1
+
+    if len(args) != 1:
+        print("Uso: python script.py <cmake_log_file> [--tu]")
         sys.exit(1)
-        
-    try:
-        with open(sys.argv[1], 'r') as f:
-            log_content = f.read()
-    except FileNotFoundError:
-        print(f"Errore: File {sys.argv[1]} non trovato")
+
+    if not os.path.exists(args[0]):
+        print(f"Errore: File {args[0]} non trovato")
         sys.exit(1)
+
+    try:
+        if per_tu:
+            print_translation_units(parse_cmake_log_file(args[0], keep_entries=False))
+        else:
+            dependencies = merge_dependencies(parse_cmake_log_file(args[0], keep_entries=False))
+            print_dependencies(dependencies)
     except Exception as e:
         print(f"Errore durante la lettura del file: {e}")
         sys.exit(1)
-        
-    dependencies = parse_cmake_log(log_content)
-    print_dependencies(dependencies)
 
 if __name__ == "__main__":
     main()
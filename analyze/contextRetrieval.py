@@ -0,0 +1,247 @@
+import re
+import sys
+import math
+import time
+import heapq
+import logging
+from collections import deque
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Dict, List, Optional, Set
+
+from symbolIndex import SymbolIndex, IndexedDefinition
+
+IDENTIFIER_RE = re.compile(r'[A-Za-z_]\w+')
+QUOTED_RE = re.compile(r"[‘'`\"]([^’'`\"]+)[’'`\"]")
+ERROR_LOCATION_RE = re.compile(r'([^\s:]+\.(?:c|h|cpp|hpp|cc)):\d+')
+
+# Parole chiave C e parole dei messaggi di gcc: non portano informazione sul simbolo
+STOP_WORDS = {
+    'auto', 'break', 'case', 'char', 'const', 'continue', 'default', 'do', 'double', 'else',
+    'enum', 'extern', 'float', 'for', 'goto', 'if', 'inline', 'int', 'long', 'register',
+    'restrict', 'return', 'short', 'signed', 'sizeof', 'static', 'struct', 'switch', 'typedef',
+    'union', 'unsigned', 'void', 'volatile', 'while', 'bool', 'true', 'false', 'NULL',
+    'error', 'warning', 'note', 'in', 'of', 'to', 'the', 'is', 'not', 'was', 'this', 'function',
+    'declared', 'undeclared', 'first', 'use', 'type', 'unknown', 'name', 'incomplete',
+    'implicit', 'declaration', 'undefined', 'reference', 'invalid', 'expected', 'before',
+    'token', 'member', 'has', 'no', 'named', 'did', 'you', 'mean', 'fatal', 'file',
+    'directory', 'such', 'or', 'and', 'each', 'identifier', 'reported', 'only', 'once',
+}
+
+TYPE_WEIGHTS = {'struct': 1.2, 'typedef': 1.2, 'function': 1.0, 'define': 0.9, 'variable': 0.6}
+
+CHARS_PER_TOKEN = 4
+
+def estimate_tokens(text: str) -> int:
+    return max(1, len(text) // CHARS_PER_TOKEN)
+
+@dataclass
+class ScoredDefinition:
+    definition: IndexedDefinition
+    score: float
+    distance: Optional[int]
+
+@dataclass
+class RetrievalStats:
+    message: str
+    query_tokens: int = 0
+    candidates: int = 0
+    selected: int = 0
+    tokens: int = 0
+    latency_ms: float = 0.0
+
+@dataclass
+class RetrievedContext:
+    relevant_definitions: List[Dict] = field(default_factory=list)
+    related_files: List[str] = field(default_factory=list)
+    includes: List[str] = field(default_factory=list)
+    stats: List[RetrievalStats] = field(default_factory=list)
+    tokens: int = 0
+
+    def to_prompt_dict(self) -> Dict:
+        return {
+            'relevant_definitions': self.relevant_definitions,
+            'related_files': self.related_files,
+            'includes': self.includes
+        }
+
+class ContextRetriever:
+    """
+    Sceglie le definizioni da mettere nel prompt per un errore di build.
+
+    I token dell'errore sono pesati con un IDF calcolato sull'indice dei
+    simboli (un nome definito in molti file vale poco), le definizioni
+    candidate sono pesate per distanza nel grafo degli include dal file che
+    fallisce, e si riempie un budget fisso di token in ordine di punteggio.
+    """
+
+    def __init__(self, index: SymbolIndex, token_budget: int = 3000,
+                 max_distance: int = 6, max_candidates_per_token: int = 50):
+        self.index = index
+        self.token_budget = token_budget
+        self.max_distance = max_distance
+        self.max_candidates_per_token = max_candidates_per_token
+        self._idf_cache: Dict[str, float] = {}
+        self._distance_cache: Dict[Path, Dict[Path, int]] = {}
+        self._file_count: Optional[int] = None
+        self.logger = logging.getLogger('ContextRetriever')
+
+    def check_include_graph(self) -> Dict[str, int]:
+        """
+        Il punteggio di prossimità dipende dagli archi di includes_of: senza
+        archi ogni candidato ha lo stesso peso e il ranking degrada al solo IDF.
+        """
+        stats = self.index.include_graph_stats()
+        if stats['files'] and not stats['edges']:
+            self.logger.warning(f"Include graph has no edges ({stats['unresolved']} unresolved includes): "
+                                "proximity ranking is disabled")
+        return stats
+
+    def _idf(self, token: str) -> float:
+        idf = self._idf_cache.get(token)
+        if idf is None:
+            if self._file_count is None:
+                self._file_count = max(1, self.index.file_count())
+            df = self.index.document_frequency(token)
+            idf = 0.0 if df == 0 else math.log(1 + self._file_count / df)
+            self._idf_cache[token] = idf
+        return idf
+
+    def query_tokens(self, message: str) -> Dict[str, float]:
+        """Identificatori dell'errore con peso; quelli tra apici (il simbolo citato da gcc) contano doppio."""
+        weights: Dict[str, float] = {}
+        quoted = {tok for q in QUOTED_RE.findall(message) for tok in IDENTIFIER_RE.findall(q)}
+        for token in IDENTIFIER_RE.findall(message):
+            if token in STOP_WORDS or token.lower() in STOP_WORDS:
+                continue
+            weights[token] = 2.0 if token in quoted else 1.0
+        return weights
+
+    def _index_path(self, file_path: str) -> Optional[Path]:
+        path = Path(file_path)
+        root = self.index.root
+        if path.is_absolute():
+            try:
+                path = root / path.resolve().relative_to(root.resolve())
+            except ValueError:
+                return None
+        elif not str(path).startswith(str(root)):
+            path = root / path
+        return path if self.index.has_file(path) else None
+
+    def _distances(self, start: Path) -> Dict[Path, int]:
+        """BFS sugli include a partire dal file che fallisce, fino a max_distance."""
+        distances = self._distance_cache.get(start)
+        if distances is not None:
+            return distances
+        distances = {start: 0}
+        queue = deque([start])
+        while queue:
+            current = queue.popleft()
+            if distances[current] >= self.max_distance:
+                continue
+            for inc in self.index.includes_of(current) or []:
+                if inc not in distances:
+                    distances[inc] = distances[current] + 1
+                    queue.append(inc)
+        self._distance_cache[start] = distances
+        return distances
+
+    def rank(self, error: Dict) -> List[ScoredDefinition]:
+        message = error.get('message', '')
+        location = ERROR_LOCATION_RE.search(error.get('context', ''))
+        failing = self._index_path(location.group(1)) if location else None
+        distances = self._distances(failing) if failing else {}
+
+        scored = []
+        for token, weight in self.query_tokens(message).items():
+            idf = self._idf(token)
+            if idf == 0.0:
+                continue
+            candidates = []
+            for definition in self.index.lookup(token):
+                distance = distances.get(definition.file)
+                proximity = 1.0 / (1 + distance) if distance is not None else (0.25 if distances else 0.5)
+                score = weight * idf * proximity * TYPE_WEIGHTS.get(definition.type, 1.0)
+                candidates.append(ScoredDefinition(definition, score, distance))
+            # Il limite per token si applica dopo il punteggio: tagliare nell'ordine
+            # dell'indice scarterebbe a caso le definizioni vicine al file che fallisce
+            scored.extend(heapq.nlargest(self.max_candidates_per_token, candidates, key=lambda s: s.score))
+
+        scored.sort(key=lambda s: s.score, reverse=True)
+        return scored
+
+    def retrieve(self, errors: List[Dict], token_budget: Optional[int] = None) -> RetrievedContext:
+        """
+        Contesto per una lista di errori entro il budget di token. Il budget è
+        diviso tra gli errori distinti; quello non usato passa ai successivi.
+        """
+        budget = token_budget or self.token_budget
+        context = RetrievedContext()
+        seen: Set[tuple] = set()
+        related_files: List[str] = []
+        includes: List[str] = []
+
+        unique_errors = list({error.get('message', ''): error for error in errors}.values())
+        remaining = budget
+        for i, error in enumerate(unique_errors):
+            start = time.perf_counter()
+            share = remaining // (len(unique_errors) - i)
+            stats = RetrievalStats(message=error.get('message', ''))
+            ranked = self.rank(error)
+            stats.query_tokens = len(self.query_tokens(stats.message))
+            stats.candidates = len(ranked)
+
+            used = 0
+            for item in ranked:
+                definition = item.definition
+                key = (definition.file, definition.line, definition.name)
+                if key in seen:
+                    continue
+                rel_file = str(definition.file.relative_to(self.index.root))
+                entry = {
+                    'name': definition.name,
+                    'type': definition.type,
+                    'file': rel_file,
+                    'line': definition.line,
+                    'content': definition.content
+                }
+                cost = estimate_tokens(str(entry))
+                if used + cost > share:
+                    continue
+                seen.add(key)
+                used += cost
+                context.relevant_definitions.append(entry)
+                stats.selected += 1
+                if rel_file not in related_files:
+                    related_files.append(rel_file)
+                    for inc in self.index.includes_of(definition.file) or []:
+                        rel_inc = str(inc.relative_to(self.index.root))
+                        if rel_inc not in includes:
+                            includes.append(rel_inc)
+
+            remaining -= used
+            stats.tokens = used
+            stats.latency_ms = (time.perf_counter() - start) * 1000
+            context.stats.append(stats)
+
+        context.related_files = related_files
+        # Gli include sono l'ultima cosa che entra nel budget
+        for inc in includes:
+            cost = estimate_tokens(inc) + 1
+            if cost > remaining:
+                break
+            context.includes.append(inc)
+            remaining -= cost
+
+        context.tokens = budget - remaining
+        return context
+
+if __name__ == "__main__":
+    # Verifica del grafo degli include su un albero: python contextRetrieval.py <radice>
+    root = sys.argv[1] if len(sys.argv) > 1 else '.'
+    index = SymbolIndex(root, {}, db_path=':memory:')
+    index.update()
+    stats = ContextRetriever(index).check_include_graph()
+    print(f"Files: {stats['files']}, include edges: {stats['edges']}, unresolved includes: {stats['unresolved']}")
+    sys.exit(0 if stats['edges'] or not stats['files'] else 1)
@@ -6,6 +6,8 @@ import re
 import networkx as nx
 from collections import defaultdict
 
+from fileModel import shared_file_models
+
 def check_directory(directory_path: str):
     """Verifica dettagliatamente una directory e mostra il suo contenuto"""
     # Converti in percorso assoluto
@@ -177,11 +179,13 @@ class HeaderAnalyzer:
         )
         
         try:
-            with open(file_path, 'r', encoding='utf-8') as f:
-                content = f.read()
+            model = shared_file_models.get(str(file_path))
+            if model is None:
+                raise OSError("file non leggibile")
+            content = model.content
             
-            # Trova gli #include
-            header.includes = self._find_includes(content)
+            # Gli #include sono già indicizzati nel modello condiviso
+            header.includes = list(model.includes)
             print(f"Include trovati: {header.includes}")
             
             # Trova le definizioni di tipo
@@ -201,13 +205,6 @@ class HeaderAnalyzer:
         
         return header
 
-    def _find_includes(self, content: str) -> List[str]:
-        """Trova tutti gli #include nel file"""
-        includes = []
-        for match in re.finditer(r'#include\s*[<"]([^>"]+)[>"]', content):
-            includes.append(match.group(1))
-        return includes    
-
     def _find_forward_declarations(self, content: str) -> Set[str]:
         """Trova tutte le forward declarations nel file"""
         declarations = set()
@@ -1,71 +1,97 @@
-import requests
 import json
-import sqlite3
-import hashlib
 from typing import Optional, Dict, Any, Union
 from datetime import datetime
 import os
+import sys
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from llmClient import get_shared_client, LLMRequestError
+
+from responseCache import ResponseCache
+from promptCanonicalizer import PromptCanonicalizer, raw_cache_key, canonical_cache_key
 
 class GeminiClient:
     """
     A client for interacting with the Google Gemini API with built-in caching capabilities.
     """
     
-    def __init__(self, api_key: str, cache_db_path: str = "gemini_cache.db"):
+    def __init__(self, api_key: str, cache_db_path: str = "gemini_cache.db",
+                 cache_ttl: Optional[float] = None,
+                 cache_max_bytes: Optional[int] = 256 * 1024 * 1024,
+                 cache_memory_entries: int = 256,
+                 project_root: Optional[str] = None,
+                 canonicalize_prompts: bool = True,
+                 prompt_log_path: Optional[str] = None,
+                 max_concurrency: int = 4):
         """
         Initialize the Gemini client.
         
         Args:
             api_key: Your Gemini API key
             cache_db_path: Path to the SQLite cache database
+            cache_ttl: Seconds after which a cached response expires (None: never)
+            cache_max_bytes: Size limit of the cache database contents (None: unbounded)
+            cache_memory_entries: Number of responses kept in the in-memory LRU
+            project_root: Root used to make paths in prompts relative for cache keys
+                (default: the enclosing git repository of the working directory)
+            canonicalize_prompts: Whether cache keys use the canonical form of the prompt
+            prompt_log_path: Optional JSON-lines file where every request is appended,
+                to replay it later with promptCanonicalizer.py
+            max_concurrency: Requests in flight at once on the shared HTTP client
         """
         self.api_key = api_key
         self.base_url = "https://generativelanguage.googleapis.com/v1/models"
         self.cache_db_path = cache_db_path
+        self.cache_ttl = cache_ttl
+        self.cache_max_bytes = cache_max_bytes
+        self.cache_memory_entries = cache_memory_entries
+        self.canonicalizer = PromptCanonicalizer(project_root) if canonicalize_prompts else None
+        self.prompt_log_path = prompt_log_path
+        self.max_concurrency = max_concurrency
         self._init_cache()
         
     def _init_cache(self):
-        """Initialize the SQLite cache database."""
-        with sqlite3.connect(self.cache_db_path) as conn:
-            conn.execute("""
-                CREATE TABLE IF NOT EXISTS prompt_cache (
-                    prompt_hash TEXT PRIMARY KEY,
-                    prompt TEXT,
-                    response TEXT,
-                    model TEXT,
-                    timestamp DATETIME,
-                    parameters TEXT
-                )
-            """)
+        """Open the response cache (creates or migrates the SQLite database)."""
+        self.cache = ResponseCache(
+            self.cache_db_path,
+            memory_entries=self.cache_memory_entries,
+            ttl_seconds=self.cache_ttl,
+            max_size_bytes=self.cache_max_bytes
+        )
     
-    def _generate_cache_key(self, prompt: str, model: str, parameters: Dict) -> str:
-        """Generate a unique hash for the prompt and its parameters."""
-        cache_data = f"{prompt}|{model}|{json.dumps(parameters, sort_keys=True)}"
-        return hashlib.sha256(cache_data.encode()).hexdigest()
+    def _generate_cache_key(self, prompt: str, model: str, parameters: Dict,
+                            system_instructions: Optional[str] = None) -> str:
+        """
+        Generate the cache key for the prompt and its parameters. The prompt is
+        canonicalized first (relative paths, sorted sets, no timestamps or line
+        numbers), so requests that differ only in those details share a key.
+        """
+        if self.canonicalizer is None:
+            return self._generate_raw_cache_key(prompt, model, parameters)
+        return canonical_cache_key(self.canonicalizer, prompt, model, parameters, system_instructions)
+
+    def _generate_raw_cache_key(self, prompt: str, model: str, parameters: Dict) -> str:
+        """Hash of the prompt exactly as sent (the key format of older cache entries)."""
+        return raw_cache_key(prompt, model, parameters)
+
+    def _log_prompt(self, prompt: str, model: str, parameters: Dict, system_instructions: Optional[str]):
+        with open(self.prompt_log_path, 'a', encoding='utf-8') as f:
+            f.write(json.dumps({
+                "timestamp": datetime.now().isoformat(),
+                "model": model,
+                "parameters": parameters,
+                "system_instructions": system_instructions,
+                "prompt": prompt
+            }) + "\n")
     
-    def _get_cached_response(self, cache_key: str) -> Optional[str]:
+    def _get_cached_response(self, cache_key: str, raw_key: Optional[str] = None) -> Optional[str]:
         """Retrieve a cached response if it exists."""
-        with sqlite3.connect(self.cache_db_path) as conn:
-            cursor = conn.execute(
-                "SELECT response FROM prompt_cache WHERE prompt_hash = ?",
-                (cache_key,)
-            )
-            result = cursor.fetchone()
-            return result[0] if result else None
+        return self.cache.get(cache_key, raw_key)
     
     def _cache_response(self, cache_key: str, prompt: str, response: str, 
-                       model: str, parameters: Dict):
+                       model: str, parameters: Dict, raw_key: Optional[str] = None):
         """Cache a response in the SQLite database."""
-        with sqlite3.connect(self.cache_db_path) as conn:
-            conn.execute(
-                """
-                INSERT OR REPLACE INTO prompt_cache 
-                (prompt_hash, prompt, response, model, timestamp, parameters)
-                VALUES (?, ?, ?, ?, ?, ?)
-                """,
-                (cache_key, prompt, response, model, 
-                 datetime.now().isoformat(), json.dumps(parameters))
-            )
+        self.cache.put(cache_key, prompt, response, model, parameters, raw_key)
     
     def generate_text(
         self,
@@ -122,50 +148,42 @@ class GeminiClient:
                 "parts": [{"text": system_instructions}]
             })
         
+        if self.prompt_log_path:
+            self._log_prompt(prompt, model, parameters, system_instructions)
+
         # Check cache first if enabled
-        cache_key = self._generate_cache_key(prompt, model, parameters)
+        cache_key = self._generate_cache_key(prompt, model, parameters, system_instructions)
+        raw_key = self._generate_raw_cache_key(prompt, model, parameters)
         if use_cache:
-            cached_response = self._get_cached_response(cache_key)
+            cached_response = self._get_cached_response(cache_key, raw_key)
             if cached_response:
                 return json.loads(cached_response)            
         
-        # Make API request
-        url = f"{self.base_url}/{model}:generateContent?key={self.api_key}"
-        response = requests.post(url, json=payload)
-        
-        if response.status_code != 200:
-            raise Exception(f"API request failed: ", response.text)
-        
-        result = response.json()
+        # Make API request (pooled connections, rate limited, identical requests in flight coalesced)
+        url = f"{self.base_url}/{model}:generateContent"
+        try:
+            # One shared client per model: Gemini quotas are per model
+            llm_client = get_shared_client(self.api_key, model, max_concurrency=self.max_concurrency)
+            result = llm_client.generate_sync(url, payload)
+        except LLMRequestError as e:
+            raise Exception(f"API request failed: ", e.body)
         
         # Cache the response if caching is enabled
         if use_cache:
             self._cache_response(
                 cache_key, prompt, json.dumps(result), 
-                model, parameters
+                model, parameters, raw_key
             )
         
         return result
     
     def clear_cache(self):
         """Clear all cached responses."""
-        with sqlite3.connect(self.cache_db_path) as conn:
-            conn.execute("DELETE FROM prompt_cache")
+        self.cache.clear()
     
     def get_cache_stats(self) -> Dict[str, Any]:
-        """Get statistics about the cache usage."""
-        with sqlite3.connect(self.cache_db_path) as conn:
-            cursor = conn.execute("""
-                SELECT 
-                    COUNT(*) as total_entries,
-                    MIN(timestamp) as oldest_entry,
-                    MAX(timestamp) as newest_entry
-                FROM prompt_cache
-            """)
-            stats = cursor.fetchone()
-            return {
-                "total_entries": stats[0],
-                "oldest_entry": stats[1],
-                "newest_entry": stats[2]
-            }
-        
\ No newline at end of file
+        """
+        Get statistics about the cache usage: entries and size on disk, plus
+        hits, misses, hit rate and average lookup latency for this client.
+        """
+        return self.cache.stats()
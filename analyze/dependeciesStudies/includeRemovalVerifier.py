@@ -0,0 +1,653 @@
+import os
+import re
+import sys
+import json
+import shlex
+import difflib
+import hashlib
+import tempfile
+import threading
+import subprocess
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Dict, List, Optional, Set, Tuple
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+INCLUDE_LINE_RE = re.compile(r'^\s*#\s*include\s*([<"])([^>"]+)[>"]')
+LINEMARKER_RE = re.compile(r'^#\s*(?:line\s+)?\d+\s+"((?:[^"\\]|\\.)*)"')
+
+# Segnaposto per la directory temporanea nei comandi: le chiavi di cache restano stabili
+TMP_DIR = '@IRV_TMP@'
+
+# Flag che non hanno senso per un controllo -fsyntax-only (output, dipendenze, ecc.)
+_DROP_FLAGS_WITH_ARG = {'-o', '-MF', '-MT', '-MQ'}
+_DROP_FLAGS = {'-c', '-MD', '-MMD', '-MP', '-M', '-MM'}
+
+# Senza questi, gcc accetta in C una funzione non dichiarata con un semplice warning
+# e la rimozione dell'header che la dichiara sembrerebbe "sicura".
+DEFAULT_STRICT_FLAGS = [
+    '-Werror=implicit-function-declaration',
+    '-Werror=implicit-int',
+    '-Werror=incompatible-pointer-types',
+]
+
+
+@dataclass
+class IncludeLine:
+    """A single #include directive inside a file"""
+    index: int          # line index (0-based)
+    target: str         # included name, as written
+    system: bool        # <...> vs "..."
+    text: str
+
+
+@dataclass
+class FileRemovalResult:
+    """Outcome of the verification of a single file"""
+    path: Path
+    baseline_ok: bool
+    removed: List[IncludeLine] = field(default_factory=list)
+    kept: List[IncludeLine] = field(default_factory=list)
+    compiles: int = 0
+    cache_hits: int = 0
+    consumers_checked: int = 0
+    patch: str = ''
+    error: Optional[str] = None
+    # Set when the removals were backed out because they break a file together with other patches
+    conflict: Optional[str] = None
+
+
+@dataclass
+class Consumer:
+    """A file that includes a header being verified"""
+    path: Path
+    target: str         # include name as written in the consumer
+
+
+class CompileCache:
+    """
+    Persistent cache of syntax-check outcomes, keyed by the hash of the exact
+    source text that was compiled plus the compile command.
+    """
+
+    def __init__(self, cache_path: Optional[str] = None):
+        self.cache_path = cache_path
+        self._lock = threading.Lock()
+        # bool per i controlli di sintassi, str (fingerprint, '' se fallito) per i preprocessati
+        self._data: Dict[str, object] = {}
+        self._dirty = False
+        if cache_path and os.path.exists(cache_path):
+            try:
+                with open(cache_path, 'r') as f:
+                    self._data = json.load(f)
+            except (OSError, ValueError):
+                self._data = {}
+
+    @staticmethod
+    def make_key(content: str, command: List[str]) -> str:
+        h = hashlib.sha256()
+        h.update(content.encode('utf-8', errors='replace'))
+        h.update(b'\0')
+        h.update('\0'.join(command).encode('utf-8', errors='replace'))
+        return h.hexdigest()
+
+    def get(self, key: str):
+        with self._lock:
+            return self._data.get(key)
+
+    def put(self, key: str, ok):
+        with self._lock:
+            self._data[key] = ok
+            self._dirty = True
+
+    def save(self):
+        if not self.cache_path:
+            return
+        with self._lock:
+            if not self._dirty:
+                return
+            tmp_path = self.cache_path + '.tmp'
+            with open(tmp_path, 'w') as f:
+                json.dump(self._data, f)
+            os.replace(tmp_path, self.cache_path)
+            self._dirty = False
+
+
+def load_compile_commands(compile_commands_path: str) -> Dict[str, Tuple[str, List[str]]]:
+    """
+    Read build/compile_commands.json (generated by buildVerbose.sh) and return,
+    for each source file, the compiler and the flags usable for -fsyntax-only.
+    """
+    with open(compile_commands_path, 'r') as f:
+        entries = json.load(f)
+
+    commands = {}
+    for entry in entries:
+        directory = entry.get('directory', '.')
+        source = os.path.normpath(os.path.join(directory, entry['file']))
+        args = entry.get('arguments') or shlex.split(entry.get('command', ''))
+        if not args:
+            continue
+
+        flags = []
+        skip_next = False
+        for arg in args[1:]:
+            if skip_next:
+                skip_next = False
+                continue
+            if arg in _DROP_FLAGS_WITH_ARG:
+                skip_next = True
+                continue
+            if arg in _DROP_FLAGS or arg.startswith(('-MF', '-MT', '-MQ')):
+                continue
+            if os.path.normpath(os.path.join(directory, arg)) == source:
+                continue
+            # Rende assoluti i path relativi alla directory di build
+            if arg.startswith(('-I', '-iquote', '-isystem')) and not arg in ('-I', '-iquote', '-isystem'):
+                prefix = next(p for p in ('-iquote', '-isystem', '-I') if arg.startswith(p))
+                value = arg[len(prefix):]
+                if not os.path.isabs(value):
+                    arg = prefix + os.path.normpath(os.path.join(directory, value))
+            flags.append(arg)
+
+        commands[source] = (args[0], flags)
+
+    return commands
+
+
+def find_include_lines(content: str) -> List[IncludeLine]:
+    """Return every #include directive of a file, skipping block comments."""
+    includes = []
+    in_comment = False
+    for i, line in enumerate(content.splitlines(keepends=True)):
+        if in_comment:
+            if '*/' in line:
+                in_comment = False
+            continue
+        stripped = line.lstrip()
+        if stripped.startswith('/*') and '*/' not in stripped:
+            in_comment = True
+            continue
+        match = INCLUDE_LINE_RE.match(line)
+        if match:
+            includes.append(IncludeLine(
+                index=i,
+                target=match.group(2),
+                system=match.group(1) == '<',
+                text=line
+            ))
+    return includes
+
+
+def main_file_fingerprint(preprocessed: str, main_path: str) -> str:
+    """
+    Hash of the preprocessed text that comes from the main file itself. A
+    removal that changes which #if/#ifdef branches survive, or how a macro
+    expands, changes this even when the file still compiles.
+    """
+    h = hashlib.sha256()
+    current = None
+    for line in preprocessed.splitlines():
+        marker = LINEMARKER_RE.match(line)
+        if marker:
+            current = marker.group(1)
+            continue
+        if current == main_path and line.strip():
+            h.update(line.strip().encode('utf-8', errors='replace'))
+            h.update(b'\n')
+    return h.hexdigest()
+
+
+def index_consumers(files: List[Path]) -> Dict[str, List[Consumer]]:
+    """For every header in files, the files of the set that include it directly."""
+    headers = [Path(f) for f in files if Path(f).suffix in ('.h', '.hpp')]
+    by_name: Dict[str, List[Path]] = {}
+    for header in headers:
+        by_name.setdefault(header.name, []).append(header)
+
+    consumers: Dict[str, List[Consumer]] = {}
+    for path in map(Path, files):
+        try:
+            with open(path, 'r', errors='replace') as f:
+                includes = find_include_lines(f.read())
+        except OSError:
+            continue
+        for inc in includes:
+            for header in by_name.get(os.path.basename(inc.target), ()):
+                relative = os.path.normpath(os.path.join(str(path.parent), inc.target))
+                # Relativo al file, oppure trovato tramite un -I (il path scritto è un suffisso)
+                if relative == os.path.normpath(str(header)) or str(header).endswith(os.sep + inc.target):
+                    if header != path:
+                        consumers.setdefault(str(header), []).append(Consumer(path, inc.target))
+    return consumers
+
+
+class IncludeRemovalVerifier:
+    """
+    Verifica con il compilatore quali #include possono essere rimossi.
+
+    The static guessers (ImprovedIncludeResolver._find_unnecessary_includes,
+    HeaderDependencyOptimizer.optimize_includes) only propose candidates: here
+    every candidate removal is confirmed by the compiler. A removal is accepted
+    only if the file still passes -fsyntax-only, its own preprocessed text is
+    unchanged (dropping sdkconfig.h compiles, but flips #ifdef CONFIG_*
+    branches) and, for headers, the same holds for every file of the set that
+    includes it. Removals are tried in groups and bisected on failure, so a
+    file where everything is needed costs about 2*N checks and a file where
+    everything is removable costs one.
+    """
+
+    def __init__(self,
+                 compiler: str = 'gcc',
+                 flags: Optional[List[str]] = None,
+                 compile_commands: Optional[Dict[str, Tuple[str, List[str]]]] = None,
+                 cache_path: Optional[str] = '.include_removal_cache.json',
+                 max_workers: Optional[int] = None,
+                 include_system: bool = False,
+                 strict: bool = True,
+                 timeout: int = 60):
+        self.compiler = compiler
+        self.flags = list(flags or [])
+        self.compile_commands = compile_commands or {}
+        self.cache = CompileCache(cache_path)
+        self.max_workers = max_workers or os.cpu_count() or 4
+        self.include_system = include_system
+        self.strict = strict
+        self.timeout = timeout
+        self.consumers: Dict[str, List[Consumer]] = {}
+        # file -> headers of the set it includes directly (filled by _verify_combined)
+        self._includes: Dict[str, Set[str]] = {}
+
+    def _command_for(self, path: Path) -> Tuple[str, List[str]]:
+        """Compiler and flags for a file; headers borrow the flags of a TU in the same directory."""
+        key = os.path.normpath(str(path))
+        if key in self.compile_commands:
+            return self.compile_commands[key]
+
+        directory = os.path.dirname(key)
+        for source, command in self.compile_commands.items():
+            if os.path.dirname(source) == directory:
+                return command
+        for command in self.compile_commands.values():
+            return command
+
+        return self.compiler, self.flags
+
+    def _base_command(self, path: Path) -> List[str]:
+        compiler, flags = self._command_for(path)
+        language = ['-x', 'c-header'] if path.suffix in ('.h', '.hpp') else []
+        extra = DEFAULT_STRICT_FLAGS if self.strict else []
+        # "-iquote <dir>" keeps #include "..." relative to the original file working
+        return [compiler, *extra, '-iquote', str(path.parent), *flags, *language]
+
+    def _compile(self, command: List[str], files: Dict[str, str], main: str,
+                 mode: str, result: FileRemovalResult):
+        """
+        Run command on `main` inside a temporary directory holding `files`
+        (relative path -> content). mode 'syntax' returns a bool, mode
+        'fingerprint' the main-file fingerprint ('' on failure). None means
+        the compiler could not be run at all (result.error is set).
+        """
+        key = CompileCache.make_key(
+            '\0'.join(f'{name}\0{content}' for name, content in sorted(files.items())),
+            command + [mode, main])
+        cached = self.cache.get(key)
+        if cached is not None:
+            result.cache_hits += 1
+            return cached
+
+        with tempfile.TemporaryDirectory(prefix='irv_') as tmp_dir:
+            for name, content in files.items():
+                file_path = os.path.join(tmp_dir, name)
+                os.makedirs(os.path.dirname(file_path), exist_ok=True)
+                with open(file_path, 'w') as f:
+                    f.write(content)
+            main_path = os.path.join(tmp_dir, main)
+            full = [arg.replace(TMP_DIR, tmp_dir) for arg in command]
+            full += ['-fsyntax-only'] if mode == 'syntax' else ['-E']
+            result.compiles += 1
+            try:
+                proc = subprocess.run(full + [main_path], capture_output=True, timeout=self.timeout,
+                                      text=True, encoding='utf-8', errors='replace')
+            except subprocess.TimeoutExpired:
+                # A timeout says nothing about the source: count it as a failure, but don't cache it
+                return False if mode == 'syntax' else ''
+            except OSError as e:
+                result.error = f"impossibile eseguire {command[0]}: {e}"
+                return None
+
+        if mode == 'syntax':
+            value = proc.returncode == 0
+        else:
+            value = main_file_fingerprint(proc.stdout, main_path) if proc.returncode == 0 else ''
+        self.cache.put(key, value)
+        return value
+
+    def _state(self, command: List[str], files: Dict[str, str], main: str,
+               result: FileRemovalResult) -> Optional[str]:
+        """Fingerprint of `main` if it compiles, else None."""
+        if not self._compile(command, files, main, 'syntax', result):
+            return None
+        return self._compile(command, files, main, 'fingerprint', result) or None
+
+    def _file_state(self, path: Path, content: str, result: FileRemovalResult) -> Optional[str]:
+        return self._state(self._base_command(path), {path.name: content}, path.name, result)
+
+    def _consumer_state(self, consumer: Consumer, header: Path, header_content: str,
+                        result: FileRemovalResult) -> Optional[str]:
+        """
+        State of a file that includes `header`, compiled against header_content:
+        both are copied to a temporary directory laid out so that the include
+        as written (quoted or through -I) finds the copy first.
+        """
+        try:
+            with open(consumer.path, 'r', errors='replace') as f:
+                content = f.read()
+        except OSError:
+            return None
+        depth = Path(consumer.target).parts.count('..')
+        main = os.path.join(*(['_'] * depth), consumer.path.name) if depth else consumer.path.name
+        shadow = os.path.normpath(os.path.join(os.path.dirname(main), consumer.target))
+        if shadow.startswith('..') or os.path.isabs(shadow):
+            return None
+        command = self._base_command(consumer.path)
+        command[1:1] = ['-I', TMP_DIR, '-iquote', str(header.parent)]
+        return self._state(command, {main: content, shadow: header_content}, main, result)
+
+    def _removal_ok(self, path: Path, lines: List[str], removed: Set[int], baseline: Dict[str, str],
+                    result: FileRemovalResult) -> bool:
+        """The file and every consumer with a known baseline keep their exact state."""
+        content = ''.join(line for i, line in enumerate(lines) if i not in removed)
+        if self._file_state(path, content, result) != baseline[str(path)]:
+            return False
+        for consumer in self.consumers.get(str(path), ()):
+            expected = baseline.get(str(consumer.path))
+            if expected is not None and self._consumer_state(consumer, path, content, result) != expected:
+                return False
+        return True
+
+    def _bisect(self, path: Path, lines: List[str], accepted: Set[int], group: List[IncludeLine],
+                baseline: Dict[str, str], result: FileRemovalResult):
+        """Greedy delta reduction: accept the whole group or split it in two."""
+        if not group or result.error:
+            return
+        candidate = accepted | {inc.index for inc in group}
+        if self._removal_ok(path, lines, candidate, baseline, result):
+            accepted.update(inc.index for inc in group)
+            return
+        if len(group) == 1:
+            return
+        mid = len(group) // 2
+        self._bisect(path, lines, accepted, group[:mid], baseline, result)
+        self._bisect(path, lines, accepted, group[mid:], baseline, result)
+
+    def propose_removals(self, path: Path, content: str, hints: Optional[Set[str]] = None) -> List[IncludeLine]:
+        """
+        Candidate removals for a file. Static hints (include names reported as
+        unnecessary by the other analyzers) are tried first, as one group, so
+        a correct guess costs a single compile.
+        """
+        includes = [inc for inc in find_include_lines(content)
+                    if self.include_system or not inc.system]
+        if not hints:
+            return includes
+        hinted = [inc for inc in includes if _matches_hint(inc.target, hints)]
+        others = [inc for inc in includes if not _matches_hint(inc.target, hints)]
+        return hinted + others
+
+    def verify_file(self, path: Path, hints: Optional[Set[str]] = None) -> FileRemovalResult:
+        path = Path(path)
+        result = FileRemovalResult(path=path, baseline_ok=False)
+        try:
+            with open(path, 'r', errors='replace') as f:
+                content = f.read()
+        except OSError as e:
+            result.error = str(e)
+            return result
+
+        lines = content.splitlines(keepends=True)
+        candidates = self.propose_removals(path, content, hints)
+
+        # Se il file non compila già così com'è, nessuna rimozione è verificabile
+        state = self._file_state(path, content, result)
+        result.baseline_ok = state is not None
+        if not result.baseline_ok:
+            result.kept = candidates
+            return result
+
+        # Stato di riferimento dei file che includono l'header; chi non compila già non vincola
+        baseline = {str(path): state}
+        for consumer in (self.consumers.get(str(path), ()) if candidates else ()):
+            consumer_state = self._consumer_state(consumer, path, content, result)
+            if consumer_state is not None:
+                baseline[str(consumer.path)] = consumer_state
+                result.consumers_checked += 1
+
+        accepted: Set[int] = set()
+        if hints:
+            hinted = [inc for inc in candidates if _matches_hint(inc.target, hints)]
+            self._bisect(path, lines, accepted, hinted, baseline, result)
+            self._bisect(path, lines, accepted, candidates[len(hinted):], baseline, result)
+        else:
+            self._bisect(path, lines, accepted, candidates, baseline, result)
+        if result.error:
+            result.kept = candidates
+            return result
+
+        result.removed = [inc for inc in candidates if inc.index in accepted]
+        result.kept = [inc for inc in candidates if inc.index not in accepted]
+
+        if accepted:
+            new_lines = [line for i, line in enumerate(lines) if i not in accepted]
+            result.patch = ''.join(difflib.unified_diff(
+                lines, new_lines,
+                fromfile=f'a/{path}', tofile=f'b/{path}'
+            ))
+        return result
+
+    def _read(self, path: str) -> Optional[str]:
+        try:
+            with open(path, 'r', errors='replace') as f:
+                return f.read()
+        except OSError:
+            return None
+
+    def _include_closure(self, path: str) -> Set[str]:
+        """path plus every file of the set it includes, directly or not."""
+        closure = {path}
+        pending = [path]
+        while pending:
+            for header in self._includes.get(pending.pop(), ()):
+                if header not in closure:
+                    closure.add(header)
+                    pending.append(header)
+        return closure
+
+    def _overlay_state(self, path: str, patched: Dict[str, str], root: str,
+                       result: FileRemovalResult) -> Optional[str]:
+        """
+        State of `path` compiled in a copy of its include closure (relative
+        layout under root preserved) where the files in `patched` have their
+        new content. The copy's directories come before the original ones, so
+        every include of a file of the set, quoted or through -I, sees the
+        patched version.
+        """
+        files = {}
+        for member in self._include_closure(path):
+            content = patched.get(member)
+            if content is None:
+                content = self._read(member)
+            if content is None:
+                return None
+            files[os.path.relpath(member, root)] = content
+
+        command = self._base_command(Path(path))
+        overlay = ['-iquote', os.path.join(TMP_DIR, os.path.relpath(os.path.dirname(path), root))]
+        args = command[1:]
+        for i, arg in enumerate(args):
+            for prefix in ('-iquote', '-isystem', '-I'):
+                if arg == prefix and i + 1 < len(args):
+                    directory = args[i + 1]
+                elif arg.startswith(prefix) and arg != prefix:
+                    directory = arg[len(prefix):]
+                else:
+                    continue
+                directory = os.path.normpath(directory)
+                if directory == root or directory.startswith(root + os.sep):
+                    overlay += [prefix, os.path.join(TMP_DIR, os.path.relpath(directory, root))]
+                break
+        command[1:1] = overlay
+        return self._state(command, files, os.path.relpath(path, root), result)
+
+    def _verify_combined(self, files: List[Path], results: List[FileRemovalResult]):
+        """
+        Each file's removals were checked against the other files as they are
+        on disk. Two headers that each drop a redundant include of the same
+        header can both pass and together break a file that needed it through
+        either one. Re-check the patch set as a whole: patches are added one
+        file at a time, in path order, and every file that sees the new one
+        (itself and its direct and indirect includers) must keep its original
+        state with all patches accepted so far. A file whose removals break
+        something is backed out entirely.
+        """
+        by_path = {str(r.path): r for r in results if r.removed}
+        if len(by_path) < 2:
+            return
+        paths = [str(f) for f in files]
+        root = os.path.commonpath([os.path.dirname(p) for p in paths])
+        self._includes = {}
+        for header, consumers in self.consumers.items():
+            for consumer in consumers:
+                self._includes.setdefault(str(consumer.path), set()).add(header)
+        includers: Dict[str, Set[str]] = {}
+        for path in paths:
+            for member in self._include_closure(path):
+                includers.setdefault(member, set()).add(path)
+
+        accepted: Dict[str, str] = {}
+        baseline: Dict[str, Optional[str]] = {}
+        for path, result in sorted(by_path.items()):
+            lines = self._read(path)
+            if lines is None:
+                continue
+            removed = {inc.index for inc in result.removed}
+            lines = lines.splitlines(keepends=True)
+            candidate = dict(accepted)
+            candidate[path] = ''.join(line for i, line in enumerate(lines) if i not in removed)
+
+            broken = None
+            for affected in sorted(includers.get(path, {path})):
+                if affected not in baseline:
+                    baseline[affected] = self._overlay_state(affected, {}, root, result)
+                expected = baseline[affected]
+                if expected is not None and self._overlay_state(affected, candidate, root, result) != expected:
+                    broken = affected
+                    break
+            if broken is None:
+                accepted[path] = candidate[path]
+                continue
+            result.conflict = broken
+            result.kept = sorted(result.kept + result.removed, key=lambda inc: inc.index)
+            result.removed = []
+            result.patch = ''
+
+    def verify(self, files: List[Path], hints: Optional[Dict[str, Set[str]]] = None) -> List[FileRemovalResult]:
+        """
+        Verify many files in parallel; each worker owns one file at a time.
+        The accepted removals are then re-checked together (_verify_combined).
+        """
+        hints = hints or {}
+        self.consumers = index_consumers([Path(f) for f in files])
+        results = []
+        with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+            futures = {
+                executor.submit(self.verify_file, Path(f), hints.get(str(f))): f
+                for f in files
+            }
+            for future in as_completed(futures):
+                results.append(future.result())
+        results.sort(key=lambda r: str(r.path))
+        self._verify_combined([Path(f) for f in files], results)
+        self.cache.save()
+        return results
+
+
+def _matches_hint(target: str, hints: Set[str]) -> bool:
+    name = os.path.basename(target)
+    return any(target == h or name == os.path.basename(h) for h in hints)
+
+
+def hints_from_resolver(resolver) -> Dict[str, Set[str]]:
+    """Candidates guessed by includesManager2.ImprovedIncludeResolver."""
+    return {str(path): resolver._find_unnecessary_includes(path) for path in resolver.header_deps}
+
+
+def hints_from_optimizer(optimizer) -> Dict[str, Set[str]]:
+    """Candidates guessed by checkCircularDeps.HeaderDependencyOptimizer (call optimize_includes first)."""
+    hints = {}
+    for file_name, file_info in optimizer.files.items():
+        kept = set(optimizer.optimized_includes.get(file_name, []))
+        hints[file_name] = set(file_info['includes']) - kept
+    return hints
+
+
+def write_patch_set(results: List[FileRemovalResult], output_path: str) -> int:
+    """Write every per-file diff into one patch applicable with `git apply`."""
+    removed_total = 0
+    with open(output_path, 'w') as f:
+        for result in results:
+            if result.patch:
+                f.write(result.patch)
+                removed_total += len(result.removed)
+    return removed_total
+
+
+def print_summary(results: List[FileRemovalResult]):
+    total_compiles = sum(r.compiles for r in results)
+    total_hits = sum(r.cache_hits for r in results)
+    total_removed = sum(len(r.removed) for r in results)
+    total_includes = sum(len(r.removed) + len(r.kept) for r in results)
+    total_consumers = sum(r.consumers_checked for r in results)
+
+    for result in results:
+        if result.error:
+            print(f"{result.path}: errore: {result.error}")
+        elif not result.baseline_ok:
+            print(f"{result.path}: non compila senza modifiche, saltato")
+        elif result.conflict:
+            print(f"{result.path}: rimozioni annullate, insieme alle altre rompono {result.conflict}")
+        elif result.removed:
+            print(f"{result.path}: rimovibili {len(result.removed)}/{len(result.removed) + len(result.kept)}")
+            for inc in result.removed:
+                print(f"    - {inc.text.strip()}")
+
+    print(f"\nInclude rimovibili: {total_removed}/{total_includes}")
+    print(f"Compilazioni: {total_compiles} (cache hit: {total_hits}), "
+          f"file che includono gli header ricontrollati: {total_consumers}")
+
+
+def main():
+    if len(sys.argv) < 2:
+        print("Uso: python includeRemovalVerifier.py <source_dir> [compile_commands.json] [output.patch]")
+        sys.exit(1)
+
+    source_dir = Path(sys.argv[1]).resolve()
+    compile_commands = {}
+    if len(sys.argv) >= 3 and sys.argv[2].endswith('.json'):
+        compile_commands = load_compile_commands(sys.argv[2])
+    output_path = sys.argv[3] if len(sys.argv) >= 4 else 'include_removals.patch'
+
+    files = sorted(p for ext in ('*.c', '*.h') for p in source_dir.rglob(ext))
+    verifier = IncludeRemovalVerifier(compile_commands=compile_commands,
+                                      flags=[f'-I{source_dir}'])
+    results = verifier.verify(files)
+
+    print_summary(results)
+    removed = write_patch_set(results, output_path)
+    print(f"Patch con {removed} rimozioni salvata in: {output_path}")
+
+
+if __name__ == "__main__":
+    main()
+
+# python3 includeRemovalVerifier.py ../../hello-idf/components/wasm3-helloesp/platforms/embedded/esp32-idf-wasi/wasm3/wasm3 ../../hello-idf/build/compile_commands.json
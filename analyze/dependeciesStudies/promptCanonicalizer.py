@@ -0,0 +1,213 @@
+import os
+import re
+import sys
+import json
+import hashlib
+import sqlite3
+from pathlib import Path
+from typing import Any, Dict, Iterable, Iterator, List, Optional
+
+# Fields whose value changes between otherwise identical requests
+DEFAULT_VOLATILE_KEYS = {
+    'timestamp', 'time', 'date', 'elapsed', 'duration', 'latency_ms', 'pid',
+}
+# Fields holding line/column positions (dropped when strip_line_numbers is set)
+POSITION_KEYS = {'line', 'column', 'line_number', 'lineno'}
+# Lists built from sets: their order carries no meaning
+DEFAULT_UNORDERED_KEYS = {
+    'provided_symbols', 'required_symbols', 'blocking_symbols', 'missing_symbols',
+    'related_files', 'includes', 'direct_includes', 'indirect_includes',
+    'dependent_files', 'affected_files', 'blocking_files',
+}
+
+TIMESTAMP_RE = re.compile(r'\d{4}-\d{2}-\d{2}[T ]\d{2}:\d{2}:\d{2}(?:[.,]\d+)?(?:Z|[+-]\d{2}:?\d{2})?')
+CLOCK_RE = re.compile(r'\b\d{2}:\d{2}:\d{2}(?:[.,]\d+)?\b')
+# gcc locations: file.c:12:5: or file.c:12:
+LOCATION_RE = re.compile(r'(\.(?:c|h|cpp|hpp|cc|S|s)):\d+(?::\d+)?(?=[:\s,\'"]|$)')
+LINE_WORD_RE = re.compile(r'\b(line|lines)\s+\d+(?:\s*-\s*\d+)?', re.IGNORECASE)
+PY_STRING_SET_RE = re.compile(r"\{'[^'{}]*'(?:, '[^'{}]*')*\}")
+WHITESPACE_RE = re.compile(r'\s+')
+
+def find_project_root(start: Optional[str] = None) -> Path:
+    """First ancestor of `start` containing .git (or `start` itself)."""
+    current = Path(start or os.getcwd()).resolve()
+    for candidate in (current, *current.parents):
+        if (candidate / '.git').exists():
+            return candidate
+    return current
+
+class PromptCanonicalizer:
+    """
+    Rewrites a prompt into the canonical form used for cache keys.
+
+    The prompt sent to the model is never changed; only the text that is
+    hashed. Absolute paths become relative to the project root, JSON blocks
+    embedded in the prompt are re-serialized with sorted keys, set-like lists
+    sorted and volatile fields removed, timestamps are masked, gcc line and
+    column numbers are dropped (optional) and whitespace is collapsed.
+    """
+
+    def __init__(self, project_root=None, extra_roots: Iterable = (),
+                 volatile_keys: Optional[Iterable[str]] = None,
+                 unordered_keys: Optional[Iterable[str]] = None,
+                 strip_line_numbers: bool = True):
+        self.project_root = Path(project_root).resolve() if project_root else find_project_root()
+        self.volatile_keys = set(DEFAULT_VOLATILE_KEYS if volatile_keys is None else volatile_keys)
+        self.unordered_keys = set(DEFAULT_UNORDERED_KEYS if unordered_keys is None else unordered_keys)
+        self.strip_line_numbers = strip_line_numbers
+        if strip_line_numbers:
+            self.volatile_keys |= POSITION_KEYS
+
+        # The same root can appear both as given and with symlinks resolved
+        roots = {str(self.project_root), os.path.realpath(self.project_root)}
+        for root in extra_roots:
+            roots.add(str(Path(root).absolute()))
+            roots.add(os.path.realpath(root))
+        # Longest first, so nested roots win over their parents
+        alternatives = '|'.join(re.escape(root) for root in sorted(roots, key=len, reverse=True))
+        self._roots_re = re.compile(rf'''(?:{alternatives})(/|(?=[\s'",:)\]}}]|$))''')
+        self._decoder = json.JSONDecoder()
+
+    def _relativize(self, text: str) -> str:
+        return self._roots_re.sub(lambda m: '' if m.group(1) == '/' else '.', text)
+
+    def _canonical_value(self, value: Any, key: Optional[str] = None) -> Any:
+        if isinstance(value, dict):
+            return {
+                k: self._canonical_value(v, k)
+                for k, v in value.items()
+                if k not in self.volatile_keys
+            }
+        if isinstance(value, list):
+            items = [self._canonical_value(v) for v in value]
+            if key in self.unordered_keys:
+                items.sort(key=lambda v: json.dumps(v, sort_keys=True))
+            return items
+        if isinstance(value, str):
+            return self._canonical_text(value)
+        return value
+
+    def _sort_set_repr(self, match: re.Match) -> str:
+        items = sorted(item.strip() for item in match.group(0)[1:-1].split(', '))
+        return '{' + ', '.join(items) + '}'
+
+    def _canonical_text(self, text: str) -> str:
+        text = TIMESTAMP_RE.sub('<time>', text)
+        text = CLOCK_RE.sub('<time>', text)
+        if self.strip_line_numbers:
+            text = LOCATION_RE.sub(r'\1', text)
+            text = LINE_WORD_RE.sub(r'\1 <n>', text)
+        text = PY_STRING_SET_RE.sub(self._sort_set_repr, text)
+        return text
+
+    def _canonical_json_blocks(self, text: str) -> str:
+        """Re-serializes every JSON object/array found in the text."""
+        out = []
+        pos = 0
+        i = 0
+        length = len(text)
+        while i < length:
+            ch = text[i]
+            if ch in '{[':
+                try:
+                    value, end = self._decoder.raw_decode(text, i)
+                except ValueError:
+                    i += 1
+                    continue
+                if isinstance(value, (dict, list)):
+                    out.append(text[pos:i])
+                    out.append(json.dumps(self._canonical_value(value), sort_keys=True))
+                    pos = i = end
+                    continue
+            i += 1
+        out.append(text[pos:])
+        return ''.join(out)
+
+    def canonicalize(self, prompt: str) -> str:
+        text = self._relativize(prompt)
+        text = self._canonical_json_blocks(text)
+        text = self._canonical_text(text)
+        return WHITESPACE_RE.sub(' ', text).strip()
+
+def iter_prompt_log(path) -> Iterator[Dict[str, Any]]:
+    """
+    Prompts from a log written by GeminiClient(prompt_log_path=...) (JSON lines)
+    or, for a .db file, from the prompt_cache table in insertion order.
+    """
+    path = str(path)
+    if path.endswith('.db'):
+        conn = sqlite3.connect(path)
+        try:
+            for prompt, model, parameters in conn.execute(
+                "SELECT prompt, model, parameters FROM prompt_cache ORDER BY timestamp"
+            ):
+                yield {'prompt': prompt, 'model': model, 'parameters': json.loads(parameters or '{}')}
+        finally:
+            conn.close()
+        return
+
+    with open(path, 'r', encoding='utf-8') as f:
+        for line in f:
+            line = line.strip()
+            if line:
+                yield json.loads(line)
+
+def raw_cache_key(prompt: str, model: str, parameters: Dict) -> str:
+    """Key of the prompt as sent (the format used before canonicalization)."""
+    cache_data = f"{prompt}|{model}|{json.dumps(parameters, sort_keys=True)}"
+    return hashlib.sha256(cache_data.encode()).hexdigest()
+
+def canonical_cache_key(canonicalizer: PromptCanonicalizer, prompt: str, model: str,
+                        parameters: Dict, system_instructions: Optional[str] = None) -> str:
+    """Key of the canonical prompt; unlike the raw key it covers the system instructions too."""
+    text = canonicalizer.canonicalize(prompt)
+    if system_instructions:
+        text = canonicalizer.canonicalize(system_instructions) + '\0' + text
+    return raw_cache_key(text, model, parameters)
+
+def measure_hit_rate(entries: Iterable[Dict[str, Any]], canonicalizer: PromptCanonicalizer) -> Dict[str, Any]:
+    """
+    Replays a prompt log against an empty cache and counts the hits obtained
+    with raw and with canonical keys.
+    """
+    raw_seen = set()
+    canonical_seen = set()
+    stats = {'requests': 0, 'raw_hits': 0, 'canonical_hits': 0}
+    for entry in entries:
+        prompt = entry.get('prompt') or ''
+        model = entry.get('model')
+        parameters = entry.get('parameters') or {}
+        raw = raw_cache_key(prompt, model, parameters)
+        canonical = canonical_cache_key(canonicalizer, prompt, model, parameters,
+                                        entry.get('system_instructions'))
+
+        stats['requests'] += 1
+        if raw in raw_seen:
+            stats['raw_hits'] += 1
+        if canonical in canonical_seen:
+            stats['canonical_hits'] += 1
+        raw_seen.add(raw)
+        canonical_seen.add(canonical)
+
+    stats['raw_keys'] = len(raw_seen)
+    stats['canonical_keys'] = len(canonical_seen)
+    requests = stats['requests'] or 1
+    stats['raw_hit_rate'] = stats['raw_hits'] / requests
+    stats['canonical_hit_rate'] = stats['canonical_hits'] / requests
+    return stats
+
+def main(argv: List[str]):
+    if len(argv) < 2:
+        print(f"Usage: {argv[0]} <prompt_log.jsonl|gemini_cache.db> [project_root]")
+        sys.exit(1)
+
+    canonicalizer = PromptCanonicalizer(argv[2] if len(argv) > 2 else None)
+    stats = measure_hit_rate(iter_prompt_log(argv[1]), canonicalizer)
+    print(f"Project root: {canonicalizer.project_root}")
+    print(f"Requests: {stats['requests']}")
+    print(f"Raw keys: {stats['raw_keys']}  hits: {stats['raw_hits']} ({stats['raw_hit_rate']:.1%})")
+    print(f"Canonical keys: {stats['canonical_keys']}  hits: {stats['canonical_hits']} "
+          f"({stats['canonical_hit_rate']:.1%})")
+
+if __name__ == "__main__":
+    main(sys.argv)
@@ -0,0 +1,293 @@
+import json
+import time
+import zlib
+import sqlite3
+import threading
+from collections import OrderedDict
+from datetime import datetime
+from typing import Any, Dict, Optional
+
+
+class ResponseCache:
+    """
+    Response cache for model calls: SQLite in WAL mode with one long-lived
+    connection per thread, an in-memory LRU in front of the database,
+    zlib-compressed responses, TTL expiry and total-size eviction.
+
+    Compatible with the prompt_cache table created by earlier GeminiClient
+    versions: the new columns are added and filled in on first open.
+    """
+
+    # Writing last_access on every hit would turn each read into a write
+    TOUCH_INTERVAL = 60.0
+
+    def __init__(self, db_path: str = "gemini_cache.db",
+                 memory_entries: int = 256,
+                 ttl_seconds: Optional[float] = None,
+                 max_size_bytes: Optional[int] = 256 * 1024 * 1024,
+                 compress_level: int = 6):
+        self.db_path = db_path
+        self.memory_entries = memory_entries
+        self.ttl_seconds = ttl_seconds
+        self.max_size_bytes = max_size_bytes
+        self.compress_level = compress_level
+
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        # key -> (response, created_at, touched_at, raw_hash)
+        self._memory: "OrderedDict[str, tuple]" = OrderedDict()
+        self._stats = {
+            'memory_hits': 0, 'disk_hits': 0, 'misses': 0, 'expired': 0,
+            'canonical_hits': 0, 'raw_key_hits': 0,
+            'evicted': 0, 'writes': 0, 'get_time': 0.0, 'put_time': 0.0,
+        }
+
+        self._init_schema()
+        self._total_size = self._conn().execute(
+            "SELECT COALESCE(SUM(size), 0) FROM prompt_cache"
+        ).fetchone()[0]
+
+    def _conn(self) -> sqlite3.Connection:
+        """Connection for the current thread, opened once."""
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.db_path, timeout=30)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.execute("PRAGMA busy_timeout=30000")
+            self._local.conn = conn
+        return conn
+
+    def _init_schema(self):
+        conn = self._conn()
+        with conn:
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS prompt_cache (
+                    prompt_hash TEXT PRIMARY KEY,
+                    prompt TEXT,
+                    response TEXT,
+                    model TEXT,
+                    timestamp DATETIME,
+                    parameters TEXT
+                )
+            """)
+            columns = {row[1] for row in conn.execute("PRAGMA table_info(prompt_cache)")}
+            for name, kind in (('response_blob', 'BLOB'), ('size', 'INTEGER'),
+                               ('created_at', 'REAL'), ('last_access', 'REAL'),
+                               ('raw_hash', 'TEXT')):
+                if name not in columns:
+                    conn.execute(f"ALTER TABLE prompt_cache ADD COLUMN {name} {kind}")
+
+            # Rows written by earlier versions: plain-text response, no metadata
+            conn.execute("""
+                UPDATE prompt_cache SET
+                    size = COALESCE(LENGTH(response), 0) + COALESCE(LENGTH(prompt), 0),
+                    created_at = COALESCE(CAST(strftime('%s', timestamp) AS REAL), ?),
+                    last_access = COALESCE(CAST(strftime('%s', timestamp) AS REAL), ?)
+                WHERE size IS NULL
+            """, (time.time(), time.time()))
+            conn.execute("CREATE INDEX IF NOT EXISTS prompt_cache_last_access ON prompt_cache(last_access)")
+            conn.execute("CREATE INDEX IF NOT EXISTS prompt_cache_raw_hash ON prompt_cache(raw_hash)")
+
+    def _is_expired(self, created_at: Optional[float], now: float) -> bool:
+        return self.ttl_seconds is not None and created_at is not None and now - created_at > self.ttl_seconds
+
+    def _remember(self, key: str, response: str, created_at: float, touched_at: float,
+                  raw_hash: Optional[str] = None):
+        with self._lock:
+            self._memory[key] = (response, created_at, touched_at, raw_hash)
+            self._memory.move_to_end(key)
+            while len(self._memory) > self.memory_entries:
+                self._memory.popitem(last=False)
+
+    def get(self, key: str, raw_key: Optional[str] = None) -> Optional[str]:
+        """
+        Response stored under `key`. With `raw_key` (the key of the prompt as
+        sent), a miss falls back to rows stored under that key, which covers
+        entries written before keys were canonicalized; hits where the stored
+        raw key differs are counted as 'canonical_hits'.
+        """
+        start = time.perf_counter()
+        now = time.time()
+        try:
+            with self._lock:
+                cached = self._memory.get(key)
+                if cached is not None:
+                    self._memory.move_to_end(key)
+            if cached is not None:
+                response, created_at, touched_at, raw_hash = cached
+                if not self._is_expired(created_at, now):
+                    self._count('memory_hits')
+                    self._count_raw(raw_key, raw_hash)
+                    if now - touched_at > self.TOUCH_INTERVAL:
+                        self._touch(key, now)
+                        self._remember(key, response, created_at, now, raw_hash)
+                    return response
+                self._forget(key)
+
+            conn = self._conn()
+            query = "SELECT prompt_hash, response, response_blob, created_at, raw_hash FROM prompt_cache WHERE "
+            row = conn.execute(query + "prompt_hash = ?", (key,)).fetchone()
+            if row is None and raw_key is not None and raw_key != key:
+                row = conn.execute(query + "prompt_hash = ? OR raw_hash = ? LIMIT 1", (raw_key, raw_key)).fetchone()
+                if row is not None:
+                    self._count('raw_key_hits')
+            if row is None:
+                self._count('misses')
+                return None
+
+            row_key, text, blob, created_at, raw_hash = row
+            if self._is_expired(created_at, now):
+                self._count('expired')
+                self._count('misses')
+                self.delete(row_key)
+                return None
+
+            response = zlib.decompress(blob).decode('utf-8') if blob is not None else text
+            self._count('disk_hits')
+            if row_key == key:
+                self._count_raw(raw_key, raw_hash)
+            self._touch(row_key, now)
+            self._remember(key, response, created_at or now, now, raw_hash)
+            return response
+        finally:
+            self._count('get_time', time.perf_counter() - start)
+
+    def put(self, key: str, prompt: str, response: str, model: str, parameters: Dict[str, Any],
+            raw_key: Optional[str] = None):
+        start = time.perf_counter()
+        now = time.time()
+        blob = zlib.compress(response.encode('utf-8'), self.compress_level)
+        size = len(blob) + len(prompt or '')
+
+        conn = self._conn()
+        with conn:
+            previous = conn.execute("SELECT size FROM prompt_cache WHERE prompt_hash = ?", (key,)).fetchone()
+            conn.execute(
+                """
+                INSERT OR REPLACE INTO prompt_cache
+                (prompt_hash, prompt, response, model, timestamp, parameters,
+                 response_blob, size, created_at, last_access, raw_hash)
+                VALUES (?, ?, NULL, ?, ?, ?, ?, ?, ?, ?, ?)
+                """,
+                (key, prompt, model, datetime.now().isoformat(), json.dumps(parameters),
+                 blob, size, now, now, raw_key)
+            )
+        with self._lock:
+            self._total_size += size - (previous[0] or 0 if previous else 0)
+        self._remember(key, response, now, now, raw_key)
+        self._count('writes')
+        self._count('put_time', time.perf_counter() - start)
+
+        if self.max_size_bytes is not None and self._total_size > self.max_size_bytes:
+            self.evict()
+
+    def _touch(self, key: str, now: float):
+        try:
+            with self._conn() as conn:
+                conn.execute("UPDATE prompt_cache SET last_access = ? WHERE prompt_hash = ?", (now, key))
+        except sqlite3.OperationalError:
+            pass  # a lost touch only skews eviction order
+
+    def _forget(self, key: str):
+        with self._lock:
+            self._memory.pop(key, None)
+
+    def delete(self, key: str):
+        self._forget(key)
+        conn = self._conn()
+        with conn:
+            row = conn.execute("SELECT size FROM prompt_cache WHERE prompt_hash = ?", (key,)).fetchone()
+            conn.execute("DELETE FROM prompt_cache WHERE prompt_hash = ?", (key,))
+        if row:
+            with self._lock:
+                self._total_size -= row[0] or 0
+
+    def evict(self) -> int:
+        """Drop expired entries, then least recently used ones until under the size limit."""
+        conn = self._conn()
+        removed = 0
+        with conn:
+            if self.ttl_seconds is not None:
+                removed += conn.execute(
+                    "DELETE FROM prompt_cache WHERE created_at < ?", (time.time() - self.ttl_seconds,)
+                ).rowcount
+
+            total = conn.execute("SELECT COALESCE(SUM(size), 0) FROM prompt_cache").fetchone()[0]
+            if self.max_size_bytes is not None and total > self.max_size_bytes:
+                # Go down to 90% of the limit so the next writes don't evict again
+                target = int(self.max_size_bytes * 0.9)
+                victims = []
+                for key, size in conn.execute("SELECT prompt_hash, size FROM prompt_cache ORDER BY last_access"):
+                    if total <= target:
+                        break
+                    victims.append((key,))
+                    total -= size or 0
+                conn.executemany("DELETE FROM prompt_cache WHERE prompt_hash = ?", victims)
+                removed += len(victims)
+                with self._lock:
+                    for (key,) in victims:
+                        self._memory.pop(key, None)
+
+            self._total_size = conn.execute("SELECT COALESCE(SUM(size), 0) FROM prompt_cache").fetchone()[0]
+
+        self._count('evicted', removed)
+        return removed
+
+    def clear(self):
+        with self._conn() as conn:
+            conn.execute("DELETE FROM prompt_cache")
+        with self._lock:
+            self._memory.clear()
+            self._total_size = 0
+
+    def _count_raw(self, raw_key: Optional[str], stored_raw_key: Optional[str]):
+        # A hit whose stored prompt differs textually from this one: only canonicalization made it hit
+        if raw_key is not None and stored_raw_key is not None and raw_key != stored_raw_key:
+            self._count('canonical_hits')
+
+    def _count(self, name: str, amount=1):
+        with self._lock:
+            self._stats[name] += amount
+
+    def stats(self) -> Dict[str, Any]:
+        row = self._conn().execute("""
+            SELECT
+                COUNT(*) as total_entries,
+                MIN(timestamp) as oldest_entry,
+                MAX(timestamp) as newest_entry,
+                COALESCE(SUM(size), 0) as total_bytes
+            FROM prompt_cache
+        """).fetchone()
+        with self._lock:
+            counters = dict(self._stats)
+            memory_entries = len(self._memory)
+
+        hits = counters['memory_hits'] + counters['disk_hits']
+        lookups = hits + counters['misses']
+        return {
+            "total_entries": row[0],
+            "oldest_entry": row[1],
+            "newest_entry": row[2],
+            "total_bytes": row[3],
+            "memory_entries": memory_entries,
+            "hits": hits,
+            "memory_hits": counters['memory_hits'],
+            "disk_hits": counters['disk_hits'],
+            "misses": counters['misses'],
+            "canonical_hits": counters['canonical_hits'],
+            "raw_key_hits": counters['raw_key_hits'],
+            "expired": counters['expired'],
+            "evicted": counters['evicted'],
+            "writes": counters['writes'],
+            "hit_rate": hits / lookups if lookups else 0.0,
+            "avg_get_ms": counters['get_time'] * 1000 / lookups if lookups else 0.0,
+            "avg_put_ms": counters['put_time'] * 1000 / counters['writes'] if counters['writes'] else 0.0,
+        }
+
+    def close(self):
+        """Close the connection of the current thread."""
+        conn = getattr(self._local, 'conn', None)
+        if conn is not None:
+            conn.close()
+            self._local.conn = None
@@ -1,5 +1,14 @@
+import os
+import sys
+
+# llmReplay lives in analyze/, one level up: don't rely on geminiApi adding it to sys.path
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+# In replay only exact fixtures: a fuzzy match would let the test pass on another request's answer
+os.environ.setdefault('LLM_REPLAY_STRICT', '1')
+
 from includeManager import *
 from geminiApi import *
+from llmReplay import wrap_from_env
 import json
 #from optimizeIncludesFuncs import *
 #from includesManager2 import *
@@ -46,7 +55,8 @@ def main():
     # Uso del resolver
     result = {}
     if False:
-        resolver = IncludeResolver(project_paths, askAI)
+        # LLM_REPLAY_MODE=record|replay registra o riproduce le risposte (vedi llmReplay.py)
+        resolver = IncludeResolver(project_paths, wrap_from_env(askAI))
 
         print("resolver.verify_and_resolve()")
         result = resolver.verify_and_resolve()
@@ -0,0 +1,147 @@
+import os
+import re
+import hashlib
+import threading
+from bisect import bisect_right
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional, Set, Tuple
+
+# Pattern compilati una sola volta e condivisi da tutti gli analizzatori
+GUARD_RE = re.compile(r'#ifndef\s+(\w+)')
+PRAGMA_ONCE_RE = re.compile(r'^\s*#\s*pragma\s+once\b', re.MULTILINE)
+STRUCT_DEF_RE = re.compile(r'struct\s+(\w+)\s*{([^}]+)}')
+STRUCT_REF_RE = re.compile(r'struct\s+(\w+)')
+STRUCT_FWD_RE = re.compile(r'struct\s+(\w+)\s*;')
+INCLUDE_RE = re.compile(r'^[ \t]*#[ \t]*include[ \t]*([<"])([^>"]+)[>"]', re.MULTILINE)
+
+class LineIndex:
+    """Tabella degli offset di inizio riga: numero di riga in O(log n) con bisect."""
+
+    def __init__(self, content: str):
+        starts = [0]
+        find = content.find
+        pos = find('\n')
+        while pos != -1:
+            starts.append(pos + 1)
+            pos = find('\n', pos + 1)
+        self.starts = starts
+
+    def line_of(self, offset: int) -> int:
+        """Numero di riga (1-based) del carattere in posizione `offset`."""
+        return bisect_right(self.starts, offset)
+
+    def __len__(self):
+        return len(self.starts)
+
+@dataclass
+class StructDefinition:
+    name: str
+    line: int
+    dependencies: Set[str]
+
+@dataclass
+class IncludeDirective:
+    name: str
+    line: int
+    system: bool
+
+@dataclass
+class FileModel:
+    """
+    Vista pre-calcolata di un file sorgente: contenuto, tabella delle righe e
+    indici di guard, struct definite, forward declaration e include.
+    Costruita una sola volta per contenuto (hash) e poi condivisa.
+    """
+    path: str
+    digest: str
+    content: str
+    lines: LineIndex
+    guard: Optional[str] = None
+    pragma_once: bool = False
+    structs: Dict[str, StructDefinition] = field(default_factory=dict)
+    forward_declarations: Set[str] = field(default_factory=set)
+    includes: List[str] = field(default_factory=list)
+    include_directives: List[IncludeDirective] = field(default_factory=list)
+
+    def line_of(self, offset: int) -> int:
+        return self.lines.line_of(offset)
+
+def build_file_model(path: str, content: str, digest: Optional[str] = None) -> FileModel:
+    model = FileModel(
+        path=path,
+        digest=digest or hashlib.sha1(content.encode('utf-8', errors='replace')).hexdigest(),
+        content=content,
+        lines=LineIndex(content)
+    )
+
+    guard_match = GUARD_RE.search(content)
+    if guard_match:
+        model.guard = guard_match.group(1)
+    model.pragma_once = PRAGMA_ONCE_RE.search(content) is not None
+
+    for match in STRUCT_DEF_RE.finditer(content):
+        name = match.group(1)
+        model.structs[name] = StructDefinition(
+            name=name,
+            line=model.line_of(match.start()),
+            dependencies=set(STRUCT_REF_RE.findall(match.group(2)))
+        )
+
+    model.forward_declarations.update(STRUCT_FWD_RE.findall(content))
+    for match in INCLUDE_RE.finditer(content):
+        model.include_directives.append(IncludeDirective(
+            name=match.group(2),
+            line=model.line_of(match.start()),
+            system=match.group(1) == '<'
+        ))
+    model.includes = [directive.name for directive in model.include_directives]
+    return model
+
+class FileModelCache:
+    """
+    Cache dei FileModel. Per ogni percorso si ricontrolla solo (mtime, size);
+    il modello vero e proprio è indicizzato per hash del contenuto, così copie
+    identiche dello stesso header (es. in più componenti) vengono analizzate una volta.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._by_digest: Dict[str, FileModel] = {}
+        self._by_path: Dict[str, Tuple[Tuple[float, int], FileModel]] = {}
+
+    def get(self, path: str) -> Optional[FileModel]:
+        try:
+            stat = os.stat(path)
+        except OSError:
+            return None
+        signature = (stat.st_mtime, stat.st_size)
+
+        with self._lock:
+            cached = self._by_path.get(path)
+            if cached and cached[0] == signature:
+                return cached[1]
+
+        try:
+            with open(path, 'rb') as f:
+                raw = f.read()
+        except OSError:
+            return None
+
+        digest = hashlib.sha1(raw).hexdigest()
+        with self._lock:
+            model = self._by_digest.get(digest)
+        if model is None:
+            model = build_file_model(path, raw.decode('utf-8', errors='replace'), digest)
+
+        with self._lock:
+            model = self._by_digest.setdefault(digest, model)
+            self._by_path[path] = (signature, model)
+        return model
+
+    def clear(self):
+        with self._lock:
+            self._by_digest.clear()
+            self._by_path.clear()
+
+# Cache di processo condivisa dagli analizzatori
+shared_file_models = FileModelCache()
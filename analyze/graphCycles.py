@@ -0,0 +1,118 @@
+from collections import deque
+from dataclasses import dataclass
+from typing import Dict, Hashable, Iterable, List, Mapping, Optional
+
+@dataclass
+class CycleReport:
+    """Una componente fortemente connessa con un ciclo di esempio"""
+    component: List[Hashable]   # tutti i nodi della SCC
+    witness: List[Hashable]     # ciclo più corto che passa per witness[0], chiuso (primo == ultimo)
+
+def _neighbors(graph: Mapping, node) -> Iterable:
+    return graph.get(node, ()) if hasattr(graph, 'get') else graph[node]
+
+def strongly_connected_components(graph: Mapping[Hashable, Iterable[Hashable]]) -> List[List[Hashable]]:
+    """
+    Tarjan iterativo: O(V + E), nessuna ricorsione (le catene di include
+    profonde non fanno saltare il limite di ricorsione di Python).
+
+    `graph` mappa ogni nodo ai suoi successori (dict di set, defaultdict, ...);
+    i nodi presenti solo come successori vengono comunque visitati.
+    Restituisce le SCC in ordine topologico inverso.
+    """
+    index_of: Dict[Hashable, int] = {}
+    lowlink: Dict[Hashable, int] = {}
+    on_stack = set()
+    stack: List[Hashable] = []
+    components: List[List[Hashable]] = []
+    counter = 0
+
+    for root in list(graph):
+        if root in index_of:
+            continue
+
+        index_of[root] = lowlink[root] = counter
+        counter += 1
+        stack.append(root)
+        on_stack.add(root)
+        work = [(root, iter(_neighbors(graph, root)))]
+
+        while work:
+            node, successors = work[-1]
+            advanced = False
+            for succ in successors:
+                if succ not in index_of:
+                    index_of[succ] = lowlink[succ] = counter
+                    counter += 1
+                    stack.append(succ)
+                    on_stack.add(succ)
+                    work.append((succ, iter(_neighbors(graph, succ))))
+                    advanced = True
+                    break
+                if succ in on_stack and index_of[succ] < lowlink[node]:
+                    lowlink[node] = index_of[succ]
+            if advanced:
+                continue
+
+            work.pop()
+            if work:
+                parent = work[-1][0]
+                if lowlink[node] < lowlink[parent]:
+                    lowlink[parent] = lowlink[node]
+
+            if lowlink[node] == index_of[node]:
+                component = []
+                while True:
+                    member = stack.pop()
+                    on_stack.discard(member)
+                    component.append(member)
+                    if member == node:
+                        break
+                components.append(component)
+
+    return components
+
+def shortest_cycle_through(graph: Mapping, start: Hashable, component: Optional[set] = None) -> List[Hashable]:
+    """
+    BFS da `start` limitata alla sua SCC: il primo arco che torna a `start`
+    chiude il ciclo più corto che lo contiene. Lineare nella dimensione della SCC.
+    """
+    parent = {start: None}
+    queue = deque([start])
+    while queue:
+        node = queue.popleft()
+        for succ in _neighbors(graph, node):
+            if succ == start:
+                path = [node]
+                while parent[path[-1]] is not None:
+                    path.append(parent[path[-1]])
+                path.reverse()
+                return path + [start]
+            if succ in parent or (component is not None and succ not in component):
+                continue
+            parent[succ] = node
+            queue.append(succ)
+    return []
+
+def find_cycles(graph: Mapping[Hashable, Iterable[Hashable]]) -> List[CycleReport]:
+    """
+    Tutte le SCC cicliche del grafo (più di un nodo, o un nodo con auto-arco),
+    ciascuna con un ciclo testimone minimo.
+    """
+    reports = []
+    for component in strongly_connected_components(graph):
+        if len(component) == 1:
+            node = component[0]
+            if node not in set(_neighbors(graph, node)):
+                continue
+            reports.append(CycleReport(component=component, witness=[node, node]))
+            continue
+
+        members = set(component)
+        # Il testimone parte dal nodo con ordinamento minimo: output stabile tra esecuzioni
+        start = min(component, key=str)
+        reports.append(CycleReport(
+            component=sorted(component, key=str),
+            witness=shortest_cycle_through(graph, start, members)
+        ))
+    return reports
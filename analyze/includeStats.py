@@ -0,0 +1,248 @@
+import os
+import re
+import csv
+import sys
+import argparse
+from collections import defaultdict, Counter
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional
+
+from cmakeLogs import parse_cmake_log_file, UNKNOWN_SOURCE
+
+INCLUDE_DIRECTIVE_RE = re.compile(rb'^[ \t]*#[ \t]*include[ \t]*[<"]([^>"]+)[>"]', re.MULTILINE)
+# Direttive condizionali, per saltare i blocchi #if 0
+CONDITIONAL_RE = re.compile(rb'^[ \t]*#[ \t]*(if|ifdef|ifndef|elif|else|endif)\b[ \t]*(.*)$', re.MULTILINE)
+
+@dataclass
+class HeaderStats:
+    """Statistiche aggregate di un header su tutta la build"""
+    path: str
+    size: int = 0
+    tus: int = 0                  # TU raggiunti (fan-in)
+    reads: int = 0                # volte che gcc lo ha effettivamente letto
+    rereads: int = 0              # letture oltre la prima nello stesso TU (guard inefficace o assente)
+    skipped_max: int = 0          # #include verso di lui saltati grazie a guard / #pragma once (limite superiore)
+    missing_guard_tus: int = 0    # TU in cui gcc suggerisce un include guard
+
+    @property
+    def bytes_lexed(self) -> int:
+        return self.reads * self.size
+
+@dataclass
+class TUStats:
+    """Statistiche di un singolo comando di compilazione"""
+    source: str
+    headers: int = 0
+    distinct_headers: int = 0
+    max_depth: int = 0
+    bytes_lexed: int = 0
+    rereads: int = 0
+    skipped_max: int = 0
+
+HEADER_COLUMNS = ['path', 'tus', 'reads', 'rereads', 'skipped_max', 'missing_guard_tus', 'size', 'bytes_lexed']
+TU_COLUMNS = ['source', 'headers', 'distinct_headers', 'max_depth', 'rereads', 'skipped_max', 'bytes_lexed']
+SORT_COLUMNS = sorted(set(HEADER_COLUMNS) | set(TU_COLUMNS))
+
+def include_directives(data: bytes) -> List[str]:
+    """
+    Nomi delle direttive #include fuori dai blocchi #if 0. Le altre condizioni
+    dipendono dalle macro del TU e non vengono valutate: le direttive dentro
+    #ifdef/#if inattivi sono contate comunque.
+    """
+    dead_ranges = []
+    stack = []          # per ogni #if aperto: True se il ramo corrente è #if 0
+    dead_start = None
+    for match in CONDITIONAL_RE.finditer(data):
+        keyword, condition = match.group(1), match.group(2).strip()
+        if keyword in (b'if', b'ifdef', b'ifndef'):
+            dead = keyword == b'if' and condition.split(b'/', 1)[0].strip() == b'0'
+            stack.append(dead)
+            if dead and dead_start is None:
+                dead_start = (match.start(), len(stack))
+        elif not stack:
+            continue
+        elif keyword in (b'elif', b'else'):
+            if stack[-1] and dead_start is not None and dead_start[1] == len(stack):
+                # Il ramo #else di un #if 0 è attivo (un #elif lo trattiamo allo stesso modo)
+                dead_ranges.append((dead_start[0], match.start()))
+                dead_start = None
+            stack[-1] = False
+        else:
+            if dead_start is not None and dead_start[1] == len(stack):
+                dead_ranges.append((dead_start[0], match.end()))
+                dead_start = None
+            stack.pop()
+    if dead_start is not None:
+        dead_ranges.append((dead_start[0], len(data)))
+
+    return [m.group(1).decode('utf-8', errors='replace') for m in INCLUDE_DIRECTIVE_RE.finditer(data)
+            if not any(start <= m.start() < end for start, end in dead_ranges)]
+
+class IncludeStatsCollector:
+    """
+    Raccoglie fan-in, inclusioni ridondanti e byte letti per TU dagli alberi
+    di gcc -H (vedi cmakeLogs.parse_cmake_log_file).
+
+    gcc -H stampa solo i file che apre davvero: un header protetto da guard o
+    #pragma once e incluso di nuovo non compare. Le inclusioni saltate si
+    ricavano quindi contando le direttive #include dei file letti (dal disco)
+    e sottraendo le letture effettive. Le direttive in un ramo #ifdef/#if
+    inattivo non si possono distinguere senza rieseguire il preprocessore:
+    skipped_max è quindi un limite superiore (solo i blocchi #if 0 sono esclusi).
+    """
+
+    def __init__(self, scan_directives: bool = True):
+        self.scan_directives = scan_directives
+        self.headers: Dict[str, HeaderStats] = {}
+        self.tus: List[TUStats] = []
+        self._sizes: Dict[str, int] = {}
+        self._directives: Dict[str, List[str]] = {}
+
+    def _size(self, path: str) -> int:
+        size = self._sizes.get(path)
+        if size is None:
+            try:
+                size = os.path.getsize(path)
+            except OSError:
+                size = 0
+            self._sizes[path] = size
+        return size
+
+    def _includes_of(self, path: str) -> List[str]:
+        """Direttive #include di un file, lette una volta sola per tutta la build."""
+        includes = self._directives.get(path)
+        if includes is None:
+            includes = []
+            if self.scan_directives and path != UNKNOWN_SOURCE:
+                try:
+                    with open(path, 'rb') as f:
+                        includes = include_directives(f.read())
+                except OSError:
+                    pass
+            self._directives[path] = includes
+        return includes
+
+    def _header(self, path: str) -> HeaderStats:
+        stats = self.headers.get(path)
+        if stats is None:
+            stats = self.headers[path] = HeaderStats(path=path, size=self._size(path))
+        return stats
+
+    def add_tree(self, tree):
+        tu = TUStats(
+            source=tree.source,
+            headers=sum(tree.counts.values()),
+            distinct_headers=len(tree.counts),
+            max_depth=tree.max_depth,
+            bytes_lexed=self._size(tree.source)
+        )
+
+        # Direttive #include incontrate in questo TU, per nome scritto nel sorgente
+        directive_counts = Counter()
+        readers = Counter({tree.source: 1})
+        readers.update(tree.counts)
+        for reader, times in readers.items():
+            for target in self._includes_of(reader):
+                directive_counts[target] += times
+
+        # Risolve i nomi scritti ("m3_env.h", "sys/types.h") sugli header letti nel TU
+        by_basename = defaultdict(list)
+        for path in tree.counts:
+            by_basename[os.path.basename(path)].append(path)
+
+        for path, reads in tree.counts.items():
+            header = self._header(path)
+            header.tus += 1
+            header.reads += reads
+            header.rereads += reads - 1
+            tu.rereads += reads - 1
+            tu.bytes_lexed += reads * header.size
+
+        for target, seen in directive_counts.items():
+            candidates = [p for p in by_basename.get(os.path.basename(target), [])
+                          if p == target or p.endswith('/' + target)]
+            if len(candidates) != 1:
+                continue  # nome ambiguo o header di sistema non presente nell'albero
+            path = candidates[0]
+            skipped = seen - tree.counts[path]
+            if skipped > 0:
+                self.headers[path].skipped_max += skipped
+                tu.skipped_max += skipped
+
+        for path in tree.guard_suggestions:
+            self._header(path).missing_guard_tus += 1
+
+        self.tus.append(tu)
+
+    def collect(self, trees):
+        for tree in trees:
+            self.add_tree(tree)
+        return self
+
+def _rows(items, columns):
+    return [[getattr(item, column) for column in columns] for item in items]
+
+def sorted_headers(collector: IncludeStatsCollector, sort_by: str = 'bytes_lexed') -> List[HeaderStats]:
+    reverse = sort_by != 'path'
+    return sorted(collector.headers.values(), key=lambda h: getattr(h, sort_by), reverse=reverse)
+
+def sorted_tus(collector: IncludeStatsCollector, sort_by: str = 'bytes_lexed') -> List[TUStats]:
+    reverse = sort_by != 'source'
+    return sorted(collector.tus, key=lambda t: getattr(t, sort_by), reverse=reverse)
+
+def write_csv(path: str, columns: List[str], items):
+    with open(path, 'w', newline='') as f:
+        writer = csv.writer(f)
+        writer.writerow(columns)
+        writer.writerows(_rows(items, columns))
+
+def print_table(columns: List[str], items, limit: Optional[int] = None):
+    rows = _rows(items[:limit] if limit else items, columns)
+    widths = [max([len(column)] + [len(str(row[i])) for row in rows]) for i, column in enumerate(columns)]
+    # Il percorso va in fondo alla riga (lunghezza variabile), i numeri allineati a destra
+    order = list(range(1, len(columns))) + [0]
+    print('  '.join(columns[i].rjust(widths[i]) if i else columns[i] for i in order))
+    for row in rows:
+        print('  '.join(str(row[i]).rjust(widths[i]) if i else str(row[i]) for i in order))
+
+def main():
+    parser = argparse.ArgumentParser(description="Fan-in e inclusioni ridondanti dal log di buildVerbose.sh (gcc -H)")
+    parser.add_argument('log', help="log della build verbosa (es. ../hello-idf/build_output.txt)")
+    parser.add_argument('--sort', default='bytes_lexed', choices=SORT_COLUMNS,
+                        help="colonna di ordinamento (le colonne che una tabella non ha usano bytes_lexed)")
+    parser.add_argument('--limit', type=int, default=50, help="righe da stampare (0 = tutte)")
+    parser.add_argument('--csv', metavar='PREFIX', help="scrive PREFIX_headers.csv e PREFIX_tus.csv")
+    parser.add_argument('--no-scan', action='store_true', help="non leggere i sorgenti dal disco (niente conteggio dei salti)")
+    args = parser.parse_args()
+
+    if not os.path.exists(args.log):
+        print(f"Errore: File {args.log} non trovato")
+        sys.exit(1)
+
+    collector = IncludeStatsCollector(scan_directives=not args.no_scan)
+    collector.collect(parse_cmake_log_file(args.log, keep_entries=False))
+
+    header_sort = args.sort if args.sort in HEADER_COLUMNS else 'bytes_lexed'
+    tu_sort = args.sort if args.sort in TU_COLUMNS else 'bytes_lexed'
+    headers = sorted_headers(collector, header_sort)
+    tus = sorted_tus(collector, tu_sort)
+
+    print(f"\nHeader ({len(headers)}), ordinati per {header_sort}:")
+    print_table(HEADER_COLUMNS, headers, args.limit)
+    print(f"\nTU ({len(tus)}), ordinati per {tu_sort}:")
+    print_table(TU_COLUMNS, tus, args.limit)
+
+    total_bytes = sum(tu.bytes_lexed for tu in tus)
+    print(f"\nByte letti in totale: {total_bytes}, riletture: {sum(tu.rereads for tu in tus)}, "
+          f"inclusioni saltate: al massimo {sum(tu.skipped_max for tu in tus)} "
+          f"(contate anche le direttive nei rami #ifdef/#if inattivi)")
+
+    if args.csv:
+        write_csv(f"{args.csv}_headers.csv", HEADER_COLUMNS, headers)
+        write_csv(f"{args.csv}_tus.csv", TU_COLUMNS, tus)
+        print(f"CSV salvati in: {args.csv}_headers.csv, {args.csv}_tus.csv")
+
+if __name__ == "__main__":
+    main()
+
+# python3 includeStats.py ../hello-idf/build_output.txt --sort=tus --csv=include_stats
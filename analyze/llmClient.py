@@ -0,0 +1,509 @@
+import sys
+import os
+import json
+import time
+import random
+import asyncio
+import hashlib
+import logging
+import threading
+import http.client
+from dataclasses import dataclass, field
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, List, Optional, Tuple
+from urllib.parse import urlsplit
+
+CHARS_PER_TOKEN = 4
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+
+# Limiti noti del piano gratuito per modello (l'API non li restituisce). Unica
+# tabella: checkGeminiQuota la importa da qui, così questo modulo non dipende
+# da google.generativeai. Il bucket si adatta da solo quando arrivano 429.
+KNOWN_LIMITS = {
+    'gemini-pro': {'requests_per_minute': 15, 'tokens_per_minute': 32000},
+    'gemini-1.5-pro': {'requests_per_minute': 2, 'tokens_per_minute': 32000},
+    'gemini-1.5-flash': {'requests_per_minute': 15, 'tokens_per_minute': 1000000},
+}
+FALLBACK_QUOTA = {'requests_per_minute': 15, 'tokens_per_minute': 32000}
+
+class LLMRequestError(Exception):
+    def __init__(self, message: str, status: Optional[int] = None, body: str = ''):
+        super().__init__(message)
+        self.status = status
+        self.body = body
+
+@dataclass
+class RateLimits:
+    requests_per_minute: float
+    tokens_per_minute: Optional[float] = None
+
+    @classmethod
+    def for_model(cls, model: str) -> 'RateLimits':
+        quota = KNOWN_LIMITS.get(model, FALLBACK_QUOTA)
+        return cls(quota['requests_per_minute'], quota['tokens_per_minute'])
+
+    @classmethod
+    def from_quota(cls, quota_info: Dict[str, Any], model: str = 'gemini-pro') -> 'RateLimits':
+        """Limiti dal risultato di checkGeminiQuota.check_gemini_quota."""
+        limits = cls.for_model(quota_info.get('model', model))
+        if quota_info.get('requests_per_minute'):
+            limits.requests_per_minute = quota_info['requests_per_minute']
+        if quota_info.get('tokens_per_minute'):
+            limits.tokens_per_minute = quota_info['tokens_per_minute']
+        if quota_info.get('status') == 'quota_exceeded':
+            # Quota già esaurita: si parte piano e si lascia risalire il bucket
+            limits.requests_per_minute = max(1.0, limits.requests_per_minute / 4)
+        return limits
+
+    @classmethod
+    def from_api_key(cls, api_key: str, model: str = 'gemini-pro') -> 'RateLimits':
+        """Esegue check_gemini_quota (una richiesta di prova) e ne ricava i limiti."""
+        from checkGeminiQuota import check_gemini_quota
+        return cls.from_quota(check_gemini_quota(api_key, model), model)
+
+class TokenBucket:
+    """
+    Token bucket asincrono. Dopo un 429 la velocità viene dimezzata (fino a
+    min_rate) e poi risale gradualmente a ogni risposta andata a buon fine.
+    """
+
+    def __init__(self, rate_per_second: float, capacity: float, min_rate: Optional[float] = None):
+        self.base_rate = rate_per_second
+        self.rate = rate_per_second
+        self.capacity = max(1.0, capacity)
+        self.min_rate = min_rate or rate_per_second / 16
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self.waited = 0.0
+        self._lock = asyncio.Lock()
+
+    def _refill(self):
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    async def acquire(self, amount: float = 1.0):
+        amount = min(amount, self.capacity)
+        async with self._lock:
+            while True:
+                self._refill()
+                if self.tokens >= amount:
+                    self.tokens -= amount
+                    return
+                wait = (amount - self.tokens) / self.rate
+                self.waited += wait
+                await asyncio.sleep(wait)
+
+    def penalize(self):
+        self._refill()
+        self.rate = max(self.min_rate, self.rate / 2)
+        self.tokens = 0.0
+
+    def recover(self):
+        self.rate = min(self.base_rate, self.rate + self.base_rate / 20)
+
+class HTTPConnectionPool:
+    """Connessioni HTTP(S) keep-alive riutilizzate tra le richieste, per host."""
+
+    def __init__(self, max_size: int = 8, timeout: float = 60.0):
+        self.max_size = max_size
+        self.timeout = timeout
+        self._idle: Dict[Tuple[str, str, int], List[http.client.HTTPConnection]] = {}
+        self._lock = threading.Lock()
+        self.created = 0
+        self.reused = 0
+
+    def _acquire(self, scheme: str, host: str, port: int) -> http.client.HTTPConnection:
+        key = (scheme, host, port)
+        with self._lock:
+            idle = self._idle.get(key)
+            if idle:
+                self.reused += 1
+                return idle.pop()
+            self.created += 1
+        if scheme == 'https':
+            return http.client.HTTPSConnection(host, port, timeout=self.timeout)
+        return http.client.HTTPConnection(host, port, timeout=self.timeout)
+
+    def _release(self, scheme: str, host: str, port: int, conn: http.client.HTTPConnection):
+        with self._lock:
+            idle = self._idle.setdefault((scheme, host, port), [])
+            if len(idle) < self.max_size:
+                idle.append(conn)
+                return
+        conn.close()
+
+    def request(self, method: str, url: str, body: bytes,
+                headers: Dict[str, str]) -> Tuple[int, Dict[str, str], bytes]:
+        parts = urlsplit(url)
+        scheme = parts.scheme or 'http'
+        port = parts.port or (443 if scheme == 'https' else 80)
+        path = parts.path + ('?' + parts.query if parts.query else '')
+
+        # Una connessione rimasta ferma può essere stata chiusa dal server: un solo nuovo tentativo
+        for attempt in range(2):
+            conn = self._acquire(scheme, parts.hostname, port)
+            try:
+                conn.request(method, path, body=body, headers=headers)
+                response = conn.getresponse()
+                data = response.read()
+            except (http.client.HTTPException, ConnectionResetError, BrokenPipeError):
+                # RemoteDisconnected, BadStatusLine, IncompleteRead: la connessione non è più usabile
+                conn.close()
+                if attempt:
+                    raise
+                continue
+            except Exception:
+                conn.close()
+                raise
+            if response.will_close:
+                conn.close()
+            else:
+                self._release(scheme, parts.hostname, port, conn)
+            return response.status, {k.lower(): v for k, v in response.getheaders()}, data
+
+    def close(self):
+        with self._lock:
+            for conns in self._idle.values():
+                for conn in conns:
+                    conn.close()
+            self._idle.clear()
+
+@dataclass
+class ClientStats:
+    requests: int = 0
+    coalesced: int = 0
+    sent: int = 0
+    retries: int = 0
+    throttled: int = 0
+    errors: int = 0
+    prompt_tokens: int = 0
+    wait_time: float = 0.0
+    started: float = field(default_factory=time.monotonic)
+
+    def as_dict(self, bucket: Optional[TokenBucket], pool: HTTPConnectionPool) -> Dict[str, Any]:
+        elapsed = time.monotonic() - self.started
+        return {
+            'requests': self.requests,
+            'coalesced': self.coalesced,
+            'sent': self.sent,
+            'retries': self.retries,
+            'throttled': self.throttled,
+            'errors': self.errors,
+            'prompt_tokens': self.prompt_tokens,
+            'avg_latency_ms': self.wait_time * 1000 / self.sent if self.sent else 0.0,
+            'rate_limit_wait': bucket.waited if bucket else 0.0,
+            'current_rate_per_minute': bucket.rate * 60 if bucket else None,
+            'connections_created': pool.created,
+            'connections_reused': pool.reused,
+            'elapsed': elapsed,
+            'throughput_rps': self.requests / elapsed if elapsed > 0 else 0.0,
+        }
+
+class AsyncLLMClient:
+    """
+    Client asincrono condiviso per le API generateContent.
+
+    - un pool di connessioni keep-alive (le richieste girano in un pool di
+      thread grande quanto la concorrenza massima);
+    - un token bucket sulle richieste al minuto e uno sui token al minuto,
+      inizializzati dalla quota e rallentati automaticamente sui 429;
+    - richieste identiche in volo vengono unite: parte una sola chiamata e
+      tutti i chiamanti ricevono lo stesso risultato;
+    - concorrenza limitata da un semaforo.
+
+    I chiamanti sincroni (BuildAssistant, GeminiClient) usano generate_sync,
+    che esegue la coroutine sul loop del client in un thread dedicato.
+
+    `transport` sostituisce il pool HTTP (stessa interfaccia di
+    HTTPConnectionPool.request), ad esempio con le fixture di llmReplay.py.
+    """
+
+    def __init__(self, api_key: str, limits: Optional[RateLimits] = None, max_concurrency: int = 4,
+                 timeout: float = 60.0, max_retries: int = 5, backoff: float = 1.0, transport=None):
+        self.api_key = api_key
+        self.limits = limits or RateLimits(**FALLBACK_QUOTA)
+        self.max_concurrency = max_concurrency
+        self.max_retries = max_retries
+        self.backoff = backoff
+        self.logger = logging.getLogger('AsyncLLMClient')
+
+        self.pool = HTTPConnectionPool(max_concurrency, timeout)
+        self.set_transport(transport or self.pool)
+        self.stats = ClientStats()
+        self._executor = ThreadPoolExecutor(max_workers=max_concurrency, thread_name_prefix='llm-http')
+        self._in_flight: Dict[str, asyncio.Future] = {}
+        self._semaphore: Optional[asyncio.Semaphore] = None
+        self._request_bucket: Optional[TokenBucket] = None
+        self._token_bucket: Optional[TokenBucket] = None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._thread: Optional[threading.Thread] = None
+        self._start_lock = threading.Lock()
+
+    def set_transport(self, transport):
+        self.transport = transport
+        # Un transport che non va in rete (replay) non consuma quota
+        self.rate_limited = getattr(transport, 'rate_limited', True)
+
+    def _init_primitives(self):
+        # Le primitive asyncio vanno create dentro il loop che le usa
+        if self._semaphore is None:
+            rps = self.limits.requests_per_minute / 60
+            self._semaphore = asyncio.Semaphore(self.max_concurrency)
+            self._request_bucket = TokenBucket(rps, capacity=min(self.max_concurrency, max(1.0, rps * 60)))
+            if self.limits.tokens_per_minute:
+                tps = self.limits.tokens_per_minute / 60
+                self._token_bucket = TokenBucket(tps, capacity=self.limits.tokens_per_minute)
+
+    @staticmethod
+    def request_key(url: str, payload: Dict) -> str:
+        return hashlib.sha256(f"{url}|{json.dumps(payload, sort_keys=True)}".encode()).hexdigest()
+
+    async def generate(self, url: str, payload: Dict) -> Dict:
+        """
+        POST di `payload` su `url` (senza chiave, viene aggiunta qui).
+        Restituisce il JSON della risposta o solleva LLMRequestError.
+        """
+        self._init_primitives()
+        self.stats.requests += 1
+        key = self.request_key(url, payload)
+        pending = self._in_flight.get(key)
+        if pending is not None:
+            self.stats.coalesced += 1
+            return await asyncio.shield(pending)
+
+        future = asyncio.get_running_loop().create_future()
+        self._in_flight[key] = future
+        try:
+            result = await self._send(url, payload)
+            future.set_result(result)
+            return result
+        except BaseException as e:
+            future.set_exception(e)
+            # Segna l'eccezione come letta anche se nessun altro la aspetta
+            future.exception()
+            raise
+        finally:
+            del self._in_flight[key]
+
+    async def _send(self, url: str, payload: Dict) -> Dict:
+        body = json.dumps(payload).encode('utf-8')
+        tokens = max(1, len(body) // CHARS_PER_TOKEN)
+        full_url = f"{url}{'&' if '?' in url else '?'}key={self.api_key}"
+        headers = {'Content-Type': 'application/json'}
+        loop = asyncio.get_running_loop()
+
+        async with self._semaphore:
+            for attempt in range(self.max_retries + 1):
+                if self.rate_limited:
+                    await self._request_bucket.acquire()
+                    if self._token_bucket:
+                        await self._token_bucket.acquire(tokens)
+
+                start = time.monotonic()
+                try:
+                    status, response_headers, data = await loop.run_in_executor(
+                        self._executor, self.transport.request, 'POST', full_url, body, headers
+                    )
+                except (OSError, http.client.HTTPException) as e:
+                    # Il pool ha già scartato la connessione: si ritenta come per un 5xx
+                    status, response_headers, data = None, {}, str(e).encode() or type(e).__name__.encode()
+                self.stats.sent += 1
+                self.stats.wait_time += time.monotonic() - start
+
+                if status == 200:
+                    self.stats.prompt_tokens += tokens
+                    self._request_bucket.recover()
+                    return json.loads(data)
+
+                if status == 429:
+                    self.stats.throttled += 1
+                    self._request_bucket.penalize()
+                if (status is None or status in RETRY_STATUSES) and attempt < self.max_retries:
+                    self.stats.retries += 1
+                    delay = self._retry_delay(response_headers, attempt)
+                    self.logger.debug(f"HTTP {status}, retry in {delay:.2f}s")
+                    await asyncio.sleep(delay)
+                    continue
+
+                self.stats.errors += 1
+                text = data.decode('utf-8', errors='replace')
+                raise LLMRequestError(f"API request failed with status {status}: {text[:500]}", status, text)
+
+    def _retry_delay(self, headers: Dict[str, str], attempt: int) -> float:
+        retry_after = headers.get('retry-after')
+        if retry_after:
+            try:
+                return float(retry_after)
+            except ValueError:
+                pass
+        return self.backoff * (2 ** attempt) * (0.5 + random.random() / 2)
+
+    async def generate_many(self, requests: List[Tuple[str, Dict]]) -> List[Any]:
+        """Tutte le richieste in parallelo (entro i limiti); errori restituiti al loro posto."""
+        return await asyncio.gather(*(self.generate(url, payload) for url, payload in requests),
+                                    return_exceptions=True)
+
+    def _ensure_loop(self) -> asyncio.AbstractEventLoop:
+        with self._start_lock:
+            if self._loop is None:
+                self._loop = asyncio.new_event_loop()
+                self._thread = threading.Thread(target=self._loop.run_forever, name='llm-loop', daemon=True)
+                self._thread.start()
+        return self._loop
+
+    def generate_sync(self, url: str, payload: Dict, timeout: Optional[float] = None) -> Dict:
+        """Versione bloccante di generate(), utilizzabile da più thread."""
+        future = asyncio.run_coroutine_threadsafe(self.generate(url, payload), self._ensure_loop())
+        return future.result(timeout)
+
+    def get_stats(self) -> Dict[str, Any]:
+        return self.stats.as_dict(self._request_bucket, self.pool)
+
+    def close(self):
+        if self._loop is not None:
+            self._loop.call_soon_threadsafe(self._loop.stop)
+            self._thread.join()
+            self._loop.close()
+            self._loop = None
+            self._semaphore = None
+        self._executor.shutdown(wait=False)
+        self.pool.close()
+
+_shared_clients: Dict[Tuple[str, str], AsyncLLMClient] = {}
+_shared_lock = threading.Lock()
+
+def _probed_limits(api_key: str, model: str) -> RateLimits:
+    """
+    Limiti dalla quota verificata (RateLimits.from_api_key, una richiesta vera
+    e fatturata); se la prova fallisce per qualsiasi motivo, quelli noti del modello.
+    """
+    try:
+        return RateLimits.from_api_key(api_key, model)
+    except Exception as e:
+        logging.getLogger('AsyncLLMClient').info(f"Quota non verificata ({e}): limiti noti per {model}")
+        return RateLimits.for_model(model)
+
+def get_shared_client(api_key: str, model: str = 'gemini-pro', limits: Optional[RateLimits] = None,
+                      probe_quota: bool = False, **kwargs) -> AsyncLLMClient:
+    """
+    Un client per chiave API e modello nel processo, così quota e pool sono
+    condivisi da tutti i chiamanti (le quote di Gemini sono per modello).
+    Senza limiti espliciti valgono quelli noti del modello (RateLimits.for_model);
+    con probe_quota=True vengono ricavati da check_gemini_quota, fuori dal lock
+    e mai in replay. Senza transport esplicito vale la modalità record/replay
+    impostata dall'ambiente (vedi llmReplay.transport_from_env).
+    """
+    key = (api_key, model)
+    with _shared_lock:
+        client = _shared_clients.get(key)
+        if client is not None:
+            return client
+
+    if limits is None and probe_quota and 'transport' not in kwargs:
+        from llmReplay import MODE_ENV
+        # In replay non si va in rete: niente richiesta di prova
+        if os.environ.get(MODE_ENV, 'off').lower() != 'replay':
+            limits = _probed_limits(api_key, model)
+
+    with _shared_lock:
+        # Un altro thread può averlo creato mentre si verificava la quota
+        client = _shared_clients.get(key)
+        if client is None:
+            client = AsyncLLMClient(api_key, limits or RateLimits.for_model(model), **kwargs)
+            if 'transport' not in kwargs:
+                from llmReplay import transport_from_env
+                transport = transport_from_env(client.pool)
+                if transport is not None:
+                    client.set_transport(transport)
+            _shared_clients[key] = client
+        return client
+
+def response_text(result: Dict) -> str:
+    """Testo del primo candidato di una risposta generateContent."""
+    if result.get('candidates'):
+        return result['candidates'][0]['content']['parts'][0]['text']
+    raise ValueError("No valid response from Gemini API")
+
+# --- Server di prova per misurare il client senza rete ---
+
+def start_stub_server(latency: float = 0.2, throttle_ratio: float = 0.1, port: int = 0):
+    """
+    Server HTTP locale che imita generateContent: risponde dopo `latency`
+    secondi e restituisce 429 (con Retry-After) su una frazione delle richieste.
+    Restituisce (server, url); il server gira in un thread daemon.
+    """
+    from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = 'HTTP/1.1'
+        received = 0
+
+        def do_POST(self):
+            length = int(self.headers.get('Content-Length', 0))
+            payload = json.loads(self.rfile.read(length) or b'{}')
+            Handler.received += 1
+            time.sleep(latency)
+            if random.random() < throttle_ratio:
+                body = b'{"error": {"code": 429, "status": "RESOURCE_EXHAUSTED"}}'
+                self.send_response(429)
+                self.send_header('Retry-After', '0.1')
+            else:
+                text = payload.get('contents', [{}])[-1].get('parts', [{}])[0].get('text', '')
+                body = json.dumps({'candidates': [{'content': {'parts': [{'text': f"echo: {text[:40]}"}]}}]}).encode()
+                self.send_response(200)
+            self.send_header('Content-Type', 'application/json')
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, format, *args):
+            pass
+
+    server = ThreadingHTTPServer(('127.0.0.1', port), Handler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    url = f"http://127.0.0.1:{server.server_address[1]}/v1beta/models/gemini-pro:generateContent"
+    return server, url
+
+def benchmark(requests: int = 60, distinct: int = 40, latency: float = 0.2, throttle_ratio: float = 0.1,
+              concurrency: int = 8, requests_per_minute: float = 600):
+    """Confronta chiamate sequenziali una alla volta con il client asincrono sullo stesso server di prova."""
+    server, url = start_stub_server(latency, throttle_ratio)
+    prompts = [f"prompt {i % distinct}" for i in range(requests)]
+    payloads = [{'contents': [{'role': 'user', 'parts': [{'text': p}]}]} for p in prompts]
+
+    sequential = AsyncLLMClient('stub', RateLimits(requests_per_minute), max_concurrency=1, backoff=0.1)
+    start = time.monotonic()
+    for payload in payloads:
+        sequential.generate_sync(url, payload)
+    sequential_time = time.monotonic() - start
+    sequential.close()
+
+    client = AsyncLLMClient('stub', RateLimits(requests_per_minute), max_concurrency=concurrency, backoff=0.1)
+    start = time.monotonic()
+    results = asyncio.run_coroutine_threadsafe(
+        client.generate_many([(url, payload) for payload in payloads]), client._ensure_loop()
+    ).result()
+    async_time = time.monotonic() - start
+    stats = client.get_stats()
+    client.close()
+    server.shutdown()
+
+    failed = sum(1 for r in results if isinstance(r, Exception))
+    print(f"Requests: {requests} ({distinct} distinct), latency {latency}s, 429 ratio {throttle_ratio:.0%}")
+    print(f"Sequential: {sequential_time:.2f}s ({requests / sequential_time:.1f} req/s)")
+    print(f"Async:      {async_time:.2f}s ({requests / async_time:.1f} req/s), failed {failed}")
+    print(f"  sent {stats['sent']}, coalesced {stats['coalesced']}, retries {stats['retries']}, "
+          f"429 {stats['throttled']}, avg latency {stats['avg_latency_ms']:.0f} ms")
+    print(f"  connections created {stats['connections_created']}, reused {stats['connections_reused']}, "
+          f"rate limit wait {stats['rate_limit_wait']:.2f}s")
+
+if __name__ == "__main__":
+    args = [float(a) for a in sys.argv[1:]]
+    names = ['requests', 'distinct', 'latency', 'throttle_ratio', 'concurrency', 'requests_per_minute']
+    kwargs = dict(zip(names, args))
+    for name in ('requests', 'distinct', 'concurrency'):
+        if name in kwargs:
+            kwargs[name] = int(kwargs[name])
+    benchmark(**kwargs)
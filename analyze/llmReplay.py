@@ -0,0 +1,360 @@
+import os
+import sys
+import json
+import time
+import runpy
+import hashlib
+import logging
+import threading
+from collections import defaultdict, deque
+from datetime import datetime
+from typing import Any, Callable, Dict, List, Optional, Tuple
+from urllib.parse import urlsplit, parse_qsl, urlencode, urlunsplit
+
+from llmClient import LLMRequestError
+
+# Variabili d'ambiente lette da transport_from_env()
+MODE_ENV = 'LLM_REPLAY_MODE'          # off | record | replay
+FIXTURES_ENV = 'LLM_FIXTURES'         # file JSON lines delle fixture
+LATENCY_ENV = 'LLM_REPLAY_LATENCY'    # recorded | zero (solo replay)
+STRICT_ENV = 'LLM_REPLAY_STRICT'      # 1: solo corrispondenze esatte
+
+class FixtureMissing(LLMRequestError):
+    """Nessuna fixture per la richiesta: per i chiamanti è un errore di richiesta come gli altri."""
+    pass
+
+def strip_key(url: str) -> str:
+    """URL senza il parametro key: le fixture non devono contenere la chiave API."""
+    parts = urlsplit(url)
+    query = [(k, v) for k, v in parse_qsl(parts.query) if k != 'key']
+    return urlunsplit((parts.scheme, parts.netloc, parts.path, urlencode(query), ''))
+
+def fixture_key(endpoint: str, body: bytes) -> str:
+    try:
+        body = json.dumps(json.loads(body), sort_keys=True).encode('utf-8')
+    except ValueError:
+        pass
+    return hashlib.sha256(endpoint.encode('utf-8') + b'|' + body).hexdigest()
+
+class FixtureStore:
+    """
+    Coppie richiesta/risposta registrate, una per riga in un file JSON lines
+    (in append, così una registrazione interrotta resta utilizzabile).
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self._lock = threading.Lock()
+        self.entries: List[Dict[str, Any]] = []
+        self.by_key: Dict[str, List[Dict[str, Any]]] = defaultdict(list)
+        if os.path.exists(path):
+            with open(path, 'r', encoding='utf-8') as f:
+                for line in f:
+                    if line.strip():
+                        self._index(json.loads(line))
+
+    def _index(self, entry: Dict[str, Any]):
+        self.entries.append(entry)
+        self.by_key[entry['key']].append(entry)
+
+    def append(self, entry: Dict[str, Any]):
+        with self._lock:
+            self._index(entry)
+            with open(self.path, 'a', encoding='utf-8') as f:
+                f.write(json.dumps(entry) + '\n')
+
+class TimingReport:
+    """
+    Separa il tempo passato ad aspettare il modello dal calcolo locale.
+
+    Gli intervalli di attesa vengono uniti prima di sommarli: con più
+    richieste in parallelo conta il tempo di parete, non la somma.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.intervals: List[Tuple[float, float]] = []
+        self.calls = 0
+        self.replayed = 0
+        self.recorded = 0
+        self.missing = 0
+        self.fuzzy = 0
+        self.started: Optional[float] = None
+        self.stopped: Optional[float] = None
+
+    def start(self):
+        self.started = time.monotonic()
+        self.stopped = None
+
+    def stop(self):
+        self.stopped = time.monotonic()
+
+    def add_wait(self, start: float, end: float):
+        with self._lock:
+            self.intervals.append((start, end))
+            self.calls += 1
+
+    def count(self, counter: str):
+        """Incrementa replayed/recorded/missing/fuzzy: i transport girano in più thread."""
+        with self._lock:
+            setattr(self, counter, getattr(self, counter) + 1)
+
+    def model_wait(self) -> float:
+        total = 0.0
+        current_start = current_end = None
+        for start, end in sorted(self.intervals):
+            if current_end is None or start > current_end:
+                if current_end is not None:
+                    total += current_end - current_start
+                current_start, current_end = start, end
+            else:
+                current_end = max(current_end, end)
+        if current_end is not None:
+            total += current_end - current_start
+        return total
+
+    def summary(self) -> Dict[str, Any]:
+        end = self.stopped or time.monotonic()
+        wall = end - self.started if self.started is not None else self.model_wait()
+        wait = self.model_wait()
+        return {
+            'wall_time': wall,
+            'model_wait': wait,
+            'local_compute': max(0.0, wall - wait),
+            'model_calls': self.calls,
+            'replayed': self.replayed,
+            'recorded': self.recorded,
+            'missing': self.missing,
+            'fuzzy': self.fuzzy,
+        }
+
+    def print(self):
+        s = self.summary()
+        print("\n=== LLM timing ===")
+        print(f"Wall time:      {s['wall_time']:.3f}s")
+        print(f"Model wait:     {s['model_wait']:.3f}s ({s['model_calls']} calls, "
+              f"{s['replayed']} replayed, {s['recorded']} recorded, {s['missing']} missing, {s['fuzzy']} not exact)")
+        print(f"Local compute:  {s['local_compute']:.3f}s")
+
+# Report di processo usato dai transport creati da transport_from_env()
+timing = TimingReport()
+
+class RecordingTransport:
+    """Inoltra al transport reale e registra richiesta, risposta e latenza."""
+
+    rate_limited = True
+
+    def __init__(self, inner, store: FixtureStore, report: TimingReport = timing):
+        self.inner = inner
+        self.store = store
+        self.report = report
+
+    def request(self, method: str, url: str, body: bytes, headers: Dict[str, str]):
+        start = time.monotonic()
+        status, response_headers, data = self.inner.request(method, url, body, headers)
+        end = time.monotonic()
+        self.report.add_wait(start, end)
+        self.report.count('recorded')
+
+        endpoint = strip_key(url)
+        self.store.append({
+            'key': fixture_key(endpoint, body),
+            'url': endpoint,
+            'request': body.decode('utf-8', errors='replace'),
+            'status': status,
+            'headers': response_headers,
+            'response': data.decode('utf-8', errors='replace'),
+            'latency': end - start,
+            'recorded_at': datetime.now().isoformat(),
+        })
+        return status, response_headers, data
+
+class ReplayTransport:
+    """
+    Risponde dalle fixture senza rete. Con latency='recorded' attende la
+    latenza registrata (scalata da `scale`), con 'zero' risponde subito.
+
+    Le richieste identiche più volte registrate vengono restituite in ordine.
+    Se strict è False, una richiesta senza corrispondenza esatta (ad esempio
+    per un timestamp nel prompt) prende la prossima fixture non ancora usata
+    dello stesso endpoint, nell'ordine di registrazione: ogni caso viene
+    contato (report.fuzzy) e segnalato nel log, perché la risposta può essere
+    quella di un'altra richiesta.
+    """
+
+    rate_limited = False
+
+    def __init__(self, store: FixtureStore, latency: str = 'recorded', scale: float = 1.0,
+                 strict: bool = False, report: TimingReport = timing):
+        if latency not in ('recorded', 'zero'):
+            raise ValueError(f"latency must be 'recorded' or 'zero', not {latency!r}")
+        self.store = store
+        self.latency = latency
+        self.scale = scale
+        self.strict = strict
+        self.report = report
+        self.logger = logging.getLogger('llmReplay')
+        self._lock = threading.Lock()
+        self._used = set()
+        self._queues = {key: deque(entries) for key, entries in store.by_key.items()}
+        self._by_endpoint: Dict[str, deque] = defaultdict(deque)
+        for entry in store.entries:
+            self._by_endpoint[entry['url']].append(entry)
+
+    def _next(self, endpoint: str, key: str) -> Tuple[Optional[Dict[str, Any]], bool]:
+        """(fixture, corrispondenza esatta)."""
+        with self._lock:
+            queue = self._queues.get(key)
+            while queue:
+                entry = queue.popleft()
+                if id(entry) not in self._used:
+                    self._used.add(id(entry))
+                    return entry, True
+            if self.strict:
+                return None, False
+            queue = self._by_endpoint.get(endpoint)
+            while queue:
+                entry = queue.popleft()
+                if id(entry) not in self._used:
+                    self._used.add(id(entry))
+                    return entry, False
+        return None, False
+
+    def request(self, method: str, url: str, body: bytes, headers: Dict[str, str]):
+        start = time.monotonic()
+        endpoint = strip_key(url)
+        entry, exact = self._next(endpoint, fixture_key(endpoint, body))
+        if entry is None:
+            self.report.count('missing')
+            raise FixtureMissing(f"No recorded response for request to {endpoint}")
+        if not exact:
+            self.report.count('fuzzy')
+            self.logger.warning(f"Replay of {endpoint}: no exact fixture, using the next one recorded "
+                                f"at {entry.get('recorded_at', '?')} (set {STRICT_ENV}=1 to refuse)")
+
+        if self.latency == 'recorded':
+            time.sleep(entry['latency'] * self.scale)
+        self.report.add_wait(start, time.monotonic())
+        self.report.count('replayed')
+        return entry['status'], entry.get('headers', {}), entry['response'].encode('utf-8')
+
+def transport_from_env(inner):
+    """
+    Transport scelto da LLM_REPLAY_MODE: None se la modalità è off (si usa
+    `inner` così com'è), altrimenti un RecordingTransport o ReplayTransport
+    sulle fixture di LLM_FIXTURES.
+    """
+    mode = os.environ.get(MODE_ENV, 'off').lower()
+    if mode in ('', 'off'):
+        return None
+    store = FixtureStore(os.environ.get(FIXTURES_ENV, 'llm_fixtures.jsonl'))
+    if mode == 'record':
+        return RecordingTransport(inner, store)
+    if mode == 'replay':
+        return ReplayTransport(store, os.environ.get(LATENCY_ENV, 'recorded'),
+                               strict=os.environ.get(STRICT_ENV) == '1')
+    raise ValueError(f"{MODE_ENV} must be off, record or replay, not {mode!r}")
+
+class RecordReplayCallable:
+    """
+    Stessa cosa per le callback di prompt come ai_prompt_call di
+    includeManager.IncludeResolver: (instruction, prompt) -> dict.
+    In registrazione chiama `func` e salva il risultato, in replay lo restituisce
+    dalle fixture (func può essere None).
+    """
+
+    ENDPOINT = 'callable:'
+
+    def __init__(self, func: Optional[Callable[..., Any]], store: FixtureStore, mode: str = 'replay',
+                 latency: str = 'recorded', scale: float = 1.0, strict: bool = False,
+                 report: TimingReport = timing):
+        self.func = func
+        self.store = store
+        self.mode = mode
+        self.report = report
+        self.endpoint = self.ENDPOINT + getattr(func, '__name__', 'prompt')
+        self._replay = ReplayTransport(store, latency, scale, strict, report) if mode == 'replay' else None
+
+    def __call__(self, *args):
+        body = json.dumps(args, default=str, sort_keys=True).encode('utf-8')
+        if self._replay is not None:
+            _, _, data = self._replay.request('CALL', self.endpoint, body, {})
+            return json.loads(data)
+
+        start = time.monotonic()
+        result = self.func(*args)
+        end = time.monotonic()
+        if self.mode == 'record':
+            self.report.add_wait(start, end)
+            self.report.count('recorded')
+            self.store.append({
+                'key': fixture_key(self.endpoint, body),
+                'url': self.endpoint,
+                'request': body.decode('utf-8'),
+                'status': 200,
+                'headers': {},
+                'response': json.dumps(result, default=str),
+                'latency': end - start,
+                'recorded_at': datetime.now().isoformat(),
+            })
+        return result
+
+def wrap_from_env(func: Callable[..., Any]) -> Callable[..., Any]:
+    """`func` avvolta in un RecordReplayCallable se LLM_REPLAY_MODE lo chiede, altrimenti `func`."""
+    mode = os.environ.get(MODE_ENV, 'off').lower()
+    if mode in ('', 'off'):
+        return func
+    store = FixtureStore(os.environ.get(FIXTURES_ENV, 'llm_fixtures.jsonl'))
+    return RecordReplayCallable(func, store, mode, os.environ.get(LATENCY_ENV, 'recorded'),
+                                strict=os.environ.get(STRICT_ENV) == '1')
+
+def print_fixtures(path: str):
+    store = FixtureStore(path)
+    per_endpoint = defaultdict(lambda: [0, 0.0])
+    for entry in store.entries:
+        per_endpoint[entry['url']][0] += 1
+        per_endpoint[entry['url']][1] += entry['latency']
+    print(f"{len(store.entries)} fixtures, {len(store.by_key)} distinct requests in {path}")
+    for endpoint, (count, latency) in sorted(per_endpoint.items()):
+        print(f"  {count:5d}  {latency:8.2f}s recorded  {endpoint}")
+
+def run_script(mode: str, fixtures: str, latency: str, script: str, args: List[str]):
+    """Esegue uno script Python con la modalità impostata e stampa il report dei tempi."""
+    os.environ[MODE_ENV] = mode
+    os.environ[FIXTURES_ENV] = os.path.abspath(fixtures)
+    os.environ[LATENCY_ENV] = latency
+    sys.argv = [script] + args
+    sys.path.insert(0, os.path.dirname(os.path.abspath(script)))
+    # Eseguito come script questo modulo è __main__: il report usato dai
+    # transport è quello del modulo importato da llmClient
+    import llmReplay
+    report = llmReplay.timing
+    report.start()
+    try:
+        runpy.run_path(script, run_name='__main__')
+    finally:
+        report.stop()
+        report.print()
+
+def main():
+    usage = (f"Usage:\n"
+             f"  {sys.argv[0]} show <fixtures.jsonl>\n"
+             f"  {sys.argv[0]} record <fixtures.jsonl> <script.py> [args...]\n"
+             f"  {sys.argv[0]} replay <fixtures.jsonl> <recorded|zero> <script.py> [args...]")
+    if len(sys.argv) < 3:
+        print(usage)
+        sys.exit(1)
+
+    command, fixtures = sys.argv[1], sys.argv[2]
+    if command == 'show':
+        print_fixtures(fixtures)
+    elif command == 'record' and len(sys.argv) > 3:
+        run_script('record', fixtures, 'recorded', sys.argv[3], sys.argv[4:])
+    elif command == 'replay' and len(sys.argv) > 4:
+        run_script('replay', fixtures, sys.argv[3], sys.argv[4], sys.argv[5:])
+    else:
+        print(usage)
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,181 @@
+import re
+from dataclasses import dataclass, field
+from typing import Callable, Iterator, List, Optional, Sequence
+
+# Un solo passaggio sul testo: ogni alternativa consuma un token intero, così
+# stringhe e commenti non vengono mai scambiati per codice.
+TOKEN_RE = re.compile(r'''
+    (?P<newline>\n)
+  | (?P<ws>(?:[ \t\r\f\v]|\\\r?\n)+)
+  | (?P<comment>//[^\n]*|/\*.*?\*/)
+  | (?P<string>"(?:\\.|[^"\\\n])*")
+  | (?P<char>'(?:\\.|[^'\\\n])*')
+  | (?P<ident>[A-Za-z_]\w*)
+  | (?P<number>\.?\d(?:[eEpP][+-]|[\w.])*)
+  | (?P<punct>\#\#|\.\.\.|->|<<=|>>=|<<|>>|\+\+|--|&&|\|\||[<>=!&|+\-*/%^]=|.)
+''', re.S | re.X)
+
+# Per trovare le direttive non serve tokenizzare tutto il file: basta saltare
+# commenti e stringhe (che possono contenere "#define") e fermarsi sulle righe
+# che iniziano con #define; solo quelle vengono tokenizzate.
+DEFINE_SCAN_RE = re.compile(r'''
+    (?P<skip>/\*.*?\*/|//[^\n]*|"(?:\\.|[^"\\\n])*"|'(?:\\.|[^'\\\n])*')
+  | (?P<define>^[ \t]*\#[ \t]*define\b)
+''', re.S | re.M | re.X)
+
+@dataclass
+class Token:
+    kind: str
+    text: str
+    start: int
+    end: int
+    line: int
+
+def tokenize(content: str, keep_whitespace: bool = False, start: int = 0, line: int = 1) -> Iterator[Token]:
+    """Token C con posizione e numero di riga (contato man mano, senza ricalcoli)."""
+    for match in TOKEN_RE.finditer(content, start):
+        kind = match.lastgroup
+        text = match.group()
+        if kind == 'newline':
+            yield Token(kind, text, match.start(), match.end(), line)
+            line += 1
+            continue
+        if kind == 'ws' or kind == 'comment':
+            if keep_whitespace or kind == 'comment':
+                yield Token(kind, text, match.start(), match.end(), line)
+            line += text.count('\n')
+            continue
+        yield Token(kind, text, match.start(), match.end(), line)
+
+@dataclass
+class DefineSpan:
+    """Un #define con gli offset del testo sorgente che gli appartiene."""
+    name: str
+    params: Optional[List[str]]      # None per le macro senza parametri
+    start: int                       # il '#'
+    end: int                         # fine dell'ultima riga logica (newline escluso)
+    body_start: int
+    body_end: int
+    line: int
+
+    @property
+    def function_like(self) -> bool:
+        return self.params is not None
+
+    @property
+    def variadic(self) -> bool:
+        return bool(self.params) and self.params[-1].endswith('...')
+
+def _parse_define(content: str, tokens: Iterator[Token]) -> Optional[DefineSpan]:
+    """Legge un #define dai token, a partire dal '#'."""
+    hash_token = next(tokens, None)
+    directive = next(tokens, None)
+    name = next(tokens, None)
+    if hash_token is None or directive is None or directive.text != 'define' or name is None or name.kind != 'ident':
+        return None
+
+    params = None
+    body_start = name.end
+    rest = next(tokens, None)
+    # '(' attaccata al nome: macro con parametri
+    if rest is not None and rest.text == '(' and rest.start == name.end:
+        params = []
+        current = []
+        for rest in tokens:
+            if rest.text == ')' or rest.kind == 'newline':
+                break
+            if rest.text == ',':
+                params.append(''.join(current))
+                current = []
+            elif rest.kind != 'comment':
+                current.append(rest.text)
+        if current:
+            params.append(''.join(current))
+        body_start = rest.end
+        rest = next(tokens, None) if rest.kind != 'newline' else rest
+
+    # Il corpo parte dopo gli spazi (una continuazione di riga fa parte del corpo)
+    while body_start < len(content) and content[body_start] in ' \t':
+        body_start += 1
+
+    while rest is not None and rest.kind != 'newline':
+        rest = next(tokens, None)
+    end = rest.start if rest is not None else len(content)
+    return DefineSpan(name.text, params, hash_token.start, end, body_start, max(body_start, end), hash_token.line)
+
+def find_defines(content: str) -> List[DefineSpan]:
+    """
+    Tutti i #define del testo in un solo passaggio: commenti e stringhe sono
+    saltati da DEFINE_SCAN_RE, le righe delle direttive vengono tokenizzate.
+    I numeri di riga sono contati in modo incrementale tra una direttiva e l'altra.
+    """
+    defines = []
+    line = 1
+    counted_to = 0
+    for match in DEFINE_SCAN_RE.finditer(content):
+        if match.lastgroup != 'define':
+            continue
+        start = content.index('#', match.start())
+        line += content.count('\n', counted_to, start)
+        counted_to = start
+        define = _parse_define(content, tokenize(content, start=start, line=line))
+        if define is not None:
+            defines.append(define)
+    return defines
+
+@dataclass(order=True)
+class Edit:
+    start: int
+    end: int
+    replacement: str = field(compare=False)
+
+def apply_edits(content: str, edits: Sequence[Edit]) -> str:
+    """Applica le modifiche in un'unica ricostruzione del testo. Le modifiche non possono sovrapporsi."""
+    out = []
+    pos = 0
+    for edit in sorted(edits):
+        if edit.start < pos:
+            raise ValueError(f"Overlapping edits at offsets {edit.start}-{edit.end}")
+        out.append(content[pos:edit.start])
+        out.append(edit.replacement)
+        pos = edit.end
+    out.append(content[pos:])
+    return ''.join(out)
+
+# (define, corpo attuale) -> nuovo corpo, o None per lasciarlo invariato
+BodyTransform = Callable[[DefineSpan, str], Optional[str]]
+
+class MacroPipeline:
+    """
+    Sequenza di trasformazioni sui corpi delle macro. Ogni trasformazione
+    riceve il corpo prodotto dalla precedente; alla fine ogni #define
+    modificato diventa una sola Edit sul suo span e il file viene ricostruito
+    una volta.
+    """
+
+    def __init__(self, transforms: Sequence[BodyTransform] = (),
+                 select: Optional[Callable[[DefineSpan, str], bool]] = None):
+        self.transforms = list(transforms)
+        self.select = select
+
+    def add(self, transform: BodyTransform) -> 'MacroPipeline':
+        self.transforms.append(transform)
+        return self
+
+    def edits(self, content: str, defines: Optional[List[DefineSpan]] = None) -> List[Edit]:
+        edits = []
+        for define in defines if defines is not None else find_defines(content):
+            original = content[define.body_start:define.body_end]
+            if self.select is not None and not self.select(define, original):
+                continue
+            body = original
+            for transform in self.transforms:
+                result = transform(define, body)
+                if result is not None:
+                    body = result
+            if body != original:
+                edits.append(Edit(define.body_start, define.body_end, body))
+        return edits
+
+    def run(self, content: str, defines: Optional[List[DefineSpan]] = None) -> str:
+        return apply_edits(content, self.edits(content, defines))
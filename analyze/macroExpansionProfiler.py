@@ -0,0 +1,449 @@
+import os
+import re
+import sys
+import argparse
+from collections import Counter
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Dict, FrozenSet, Iterable, List, NamedTuple, Optional, Set
+
+from macroEngine import Token, tokenize
+
+DEFAULT_MARKERS = ('d_m3Op',)
+INCLUDE_DIRECTIVE_RE = re.compile(r'\s*"([^"]+)"')
+# Come gcc, una barra seguita da spazi a fine riga vale come continuazione
+SPACED_CONTINUATION_RE = re.compile(r'\\[ \t]+(?=\r?\n)')
+NUMBER_SUFFIX_RE = re.compile(r'^(0[xX][0-9a-fA-F]+|\d+)[uUlL]*$')
+
+class Tok(NamedTuple):
+    text: str
+    hide: FrozenSet[str]       # macro da non riespandere (hide set)
+    line: int                  # riga del sorgente che ha originato il token
+    origin: Optional[str]      # macro che ha prodotto il token (None: sorgente)
+
+@dataclass
+class Macro:
+    name: str
+    params: Optional[List[str]]
+    body: List[str]
+    variadic: bool = False
+
+@dataclass
+class HandlerProfile:
+    name: str
+    line: int
+    generator: str                   # macro di primo livello che lo genera, o 'direct'
+    tokens: int
+    statements: int
+    lines: int
+    contributors: Counter = field(default_factory=Counter)
+
+class MacroExpander:
+    """
+    Preprocessore minimo: #define/#undef, condizionali (#if/#ifdef/#elif con
+    defined()), #include "..." per raccogliere definizioni, ed espansione
+    ricorsiva con hide set, # e ## (compreso il `, ## __VA_ARGS__` di GNU).
+
+    Le macro marker (d_m3Op) non vengono espanse: servono a riconoscere
+    l'inizio di ogni handler nel flusso espanso.
+    """
+
+    def __init__(self, include_dirs: Iterable[str] = (), defines: Optional[Dict[str, str]] = None,
+                 markers: Iterable[str] = DEFAULT_MARKERS):
+        self.include_dirs = [Path(d) for d in include_dirs]
+        self.markers = set(markers)
+        self.macros: Dict[str, Macro] = {}
+        self.missing_includes: Set[str] = set()
+        self.condition_errors: List[str] = []
+        self._visited: Set[Path] = set()
+        for name, value in (defines or {}).items():
+            self.macros[name] = Macro(name, None, [t.text for t in self._lex(value)])
+
+    @staticmethod
+    def _lex(text: str) -> List[Token]:
+        return [t for t in tokenize(text) if t.kind not in ('newline', 'comment')]
+
+    # --- direttive ---
+
+    def _define(self, tokens: List[Token]):
+        if len(tokens) < 3 or tokens[2].kind != 'ident':
+            return
+        name = tokens[2].text
+        rest = tokens[3:]
+        params = None
+        variadic = False
+        if rest and rest[0].text == '(' and rest[0].start == tokens[2].end:
+            params = []
+            close = 1
+            for close, tok in enumerate(rest[1:], 1):
+                if tok.text == ')':
+                    break
+                if tok.text == '...':
+                    variadic = True
+                    if params and params[-1] is not None and rest[close - 1].kind == 'ident':
+                        continue   # forma "args..."
+                    params.append('__VA_ARGS__')
+                elif tok.kind == 'ident':
+                    params.append(tok.text)
+            rest = rest[close + 1:]
+        self.macros[name] = Macro(name, params, [t.text for t in rest], variadic)
+
+    def _evaluate(self, tokens: List[Token], line: int) -> bool:
+        """Valuta l'espressione di #if/#elif (identificatori sconosciuti valgono 0)."""
+        resolved: List[Tok] = []
+        i = 0
+        while i < len(tokens):
+            tok = tokens[i]
+            if tok.text == 'defined':
+                if i + 1 < len(tokens) and tokens[i + 1].text == '(':
+                    name = tokens[i + 2].text if i + 2 < len(tokens) else ''
+                    i += 4
+                else:
+                    name = tokens[i + 1].text if i + 1 < len(tokens) else ''
+                    i += 2
+                resolved.append(Tok('1' if name in self.macros else '0', frozenset(), line, None))
+                continue
+            resolved.append(Tok(tok.text, frozenset(), line, None))
+            i += 1
+
+        parts = []
+        for tok in self.expand(resolved):
+            text = tok.text
+            number = NUMBER_SUFFIX_RE.match(text)
+            if number:
+                parts.append(str(int(number.group(1), 0)))
+            elif text == '&&':
+                parts.append(' and ')
+            elif text == '||':
+                parts.append(' or ')
+            elif text == '!':
+                parts.append(' not ')
+            elif text == '/':
+                parts.append('//')
+            elif re.match(r'[A-Za-z_]', text):
+                parts.append('0')
+            else:
+                parts.append(text)
+        expression = ''.join(parts)
+        try:
+            return bool(eval(expression, {'__builtins__': {}}, {}))
+        except Exception:
+            self.condition_errors.append(f"line {line}: {expression}")
+            return False
+
+    def _resolve_include(self, name: str, current: Path) -> Optional[Path]:
+        for directory in [current.parent] + self.include_dirs:
+            candidate = directory / name
+            if candidate.is_file():
+                return candidate.resolve()
+        return None
+
+    def process(self, path, collect: bool = True) -> List[Tok]:
+        """
+        Legge un file applicando le direttive. Con collect restituisce i token
+        del codice attivo (fuori dalle direttive), altrimenti raccoglie solo le
+        definizioni.
+        """
+        path = Path(path)
+        self._visited.add(path.resolve())
+        content = SPACED_CONTINUATION_RE.sub('\\\\', path.read_text(encoding='utf-8', errors='replace'))
+        code: List[Tok] = []
+        # Pila dei condizionali: (ramo attivo, un ramo è già stato preso, il blocco padre è attivo)
+        stack = []
+        active = True
+        at_line_start = True
+        directive: Optional[List[Token]] = None
+
+        for tok in tokenize(content):
+            if tok.kind == 'comment':
+                continue
+            if tok.kind == 'newline':
+                if directive is not None:
+                    active = self._directive(directive, stack, active, path, content)
+                    directive = None
+                at_line_start = True
+                continue
+            if directive is not None:
+                directive.append(tok)
+                continue
+            if at_line_start and tok.text == '#':
+                directive = [tok]
+                continue
+            at_line_start = False
+            if active and collect:
+                code.append(Tok(tok.text, frozenset(), tok.line, None))
+
+        if directive is not None:
+            self._directive(directive, stack, active, path, content)
+        return code
+
+    def _directive(self, tokens: List[Token], stack: list, active: bool, path: Path, content: str) -> bool:
+        if len(tokens) < 2:
+            return active
+        keyword = tokens[1].text
+        args = tokens[2:]
+        line = tokens[0].line
+
+        if keyword in ('if', 'ifdef', 'ifndef'):
+            if not active:
+                stack.append((False, True, False))
+                return False
+            if keyword == 'if':
+                taken = self._evaluate(args, line)
+            else:
+                taken = bool(args) and (args[0].text in self.macros) == (keyword == 'ifdef')
+            stack.append((taken, taken, True))
+            return taken
+        if keyword == 'elif':
+            if not stack:
+                return active
+            _, done, parent = stack.pop()
+            taken = parent and not done and self._evaluate(args, line)
+            stack.append((taken, done or taken, parent))
+            return taken
+        if keyword == 'else':
+            if not stack:
+                return active
+            _, done, parent = stack.pop()
+            stack.append((parent and not done, True, parent))
+            return parent and not done
+        if keyword == 'endif':
+            if not stack:
+                return active
+            stack.pop()
+            return stack[-1][0] if stack else True
+
+        if not active:
+            return active
+        if keyword == 'define':
+            self._define(tokens)
+        elif keyword == 'undef' and args:
+            self.macros.pop(args[0].text, None)
+        elif keyword == 'include':
+            match = INCLUDE_DIRECTIVE_RE.match(content[tokens[1].end:content.find('\n', tokens[1].end)])
+            if match:
+                target = self._resolve_include(match.group(1), path)
+                if target is None:
+                    self.missing_includes.add(match.group(1))
+                elif target not in self._visited:
+                    self.process(target, collect=False)
+        return active
+
+    # --- espansione ---
+
+    def _collect_args(self, pending: List[Tok]) -> Optional[List[List[Tok]]]:
+        """Consuma dalla pila '(' argomenti ')' e restituisce gli argomenti."""
+        pending.pop()  # '('
+        args: List[List[Tok]] = [[]]
+        depth = 0
+        while pending:
+            tok = pending.pop()
+            if tok.text == '(':
+                depth += 1
+            elif tok.text == ')':
+                if depth == 0:
+                    return args
+                depth -= 1
+            elif tok.text == ',' and depth == 0:
+                args.append([])
+                continue
+            args[-1].append(tok)
+        return None
+
+    def _substitute(self, macro: Macro, args: List[List[Tok]], hide: FrozenSet[str], line: int) -> List[Tok]:
+        params = macro.params or []
+        if len(args) == 1 and not args[0] and not params:
+            args = []
+        raw: Dict[str, List[Tok]] = {}
+        for i, name in enumerate(params):
+            if macro.variadic and i == len(params) - 1:
+                joined: List[Tok] = []
+                for j, arg in enumerate(args[i:]):
+                    if j:
+                        joined.append(Tok(',', hide, line, macro.name))
+                    joined.extend(arg)
+                raw[name] = joined
+            else:
+                raw[name] = args[i] if i < len(args) else []
+        expanded: Dict[str, List[Tok]] = {}
+
+        def rehide(tokens: List[Tok]) -> List[Tok]:
+            return [Tok(t.text, t.hide | hide, line, t.origin) for t in tokens]
+
+        body = macro.body
+        result: List[Tok] = []
+        i = 0
+        while i < len(body):
+            text = body[i]
+            following = body[i + 1] if i + 1 < len(body) else None
+            if text == '#' and macro.params is not None and following in raw:
+                spelled = ' '.join(t.text for t in raw[following]).replace('\\', '\\\\').replace('"', '\\"')
+                result.append(Tok(f'"{spelled}"', hide, line, macro.name))
+                i += 2
+                continue
+            if text == '##' and result and following is not None:
+                i += 2
+                right = rehide(raw[following]) if following in raw else [Tok(following, hide, line, macro.name)]
+                if macro.variadic and following == params[-1] and result[-1].text == ',':
+                    # GNU: ", ## __VA_ARGS__" non incolla; senza argomenti elimina la virgola
+                    if right:
+                        result.extend(right)
+                    else:
+                        result.pop()
+                    continue
+                if not right:
+                    continue
+                left = result.pop()
+                pasted = left.text + right[0].text
+                result.append(Tok(pasted, hide, line, left.origin or macro.name))
+                result.extend(right[1:])
+                continue
+            if text in raw:
+                if following == '##':
+                    # Operando sinistro di ##: argomento non espanso (placemarker se vuoto)
+                    result.extend(rehide(raw[text]) or [Tok('', hide, line, macro.name)])
+                else:
+                    if text not in expanded:
+                        expanded[text] = self.expand(raw[text])
+                    result.extend(rehide(expanded[text]))
+                i += 1
+                continue
+            result.append(Tok(text, hide, line, macro.name))
+            i += 1
+        return [t for t in result if t.text]
+
+    def expand(self, tokens: List[Tok]) -> List[Tok]:
+        pending = list(reversed(tokens))
+        out: List[Tok] = []
+        while pending:
+            tok = pending.pop()
+            macro = self.macros.get(tok.text)
+            if macro is None or tok.text in tok.hide or tok.text in self.markers:
+                out.append(tok)
+                continue
+            hide = tok.hide | {tok.text}
+            if macro.params is None:
+                pending.extend(reversed(self._substitute(macro, [], hide, tok.line)))
+                continue
+            if not pending or pending[-1].text != '(':
+                out.append(tok)
+                continue
+            args = self._collect_args(pending)
+            if args is None:
+                out.append(tok)
+                continue
+            pending.extend(reversed(self._substitute(macro, args, hide, tok.line)))
+        return out
+
+def _matching(tokens: List[Tok], start: int, open_text: str, close_text: str) -> int:
+    depth = 0
+    for i in range(start, len(tokens)):
+        if tokens[i].text == open_text:
+            depth += 1
+        elif tokens[i].text == close_text:
+            depth -= 1
+            if depth == 0:
+                return i
+    return len(tokens) - 1
+
+def profile_handlers(expanded: List[Tok], source: List[Tok], markers: Iterable[str] = DEFAULT_MARKERS) -> List[HandlerProfile]:
+    """Divide il flusso espanso negli handler `marker(NOME) { ... }` e ne misura il corpo."""
+    markers = set(markers)
+    first_token = {}
+    for tok in source:
+        first_token.setdefault(tok.line, tok.text)
+
+    handlers = []
+    i = 0
+    while i < len(expanded):
+        tok = expanded[i]
+        if tok.text not in markers or i + 1 >= len(expanded) or expanded[i + 1].text != '(':
+            i += 1
+            continue
+        close = _matching(expanded, i + 1, '(', ')')
+        name = ''.join(t.text for t in expanded[i + 2:close])
+        j = close + 1
+        while j < len(expanded) and expanded[j].text not in ('{', ';'):
+            j += 1
+        if j >= len(expanded) or expanded[j].text == ';':
+            i = j + 1   # solo un prototipo
+            continue
+        end = _matching(expanded, j, '{', '}')
+        body = expanded[j + 1:end]
+        generator = tok.origin and first_token.get(tok.line, tok.origin)
+        statements = sum(1 for t in body if t.text == ';')
+        braces = sum(1 for t in body if t.text in ('{', '}'))
+        handlers.append(HandlerProfile(
+            name=name,
+            line=tok.line,
+            generator=generator or 'direct',
+            tokens=len(body),
+            statements=statements,
+            lines=statements + braces // 2 + 2,
+            contributors=Counter(t.origin for t in body if t.origin)
+        ))
+        i = end + 1
+    return handlers
+
+def print_report(handlers: List[HandlerProfile], limit: int = 30, expander: Optional[MacroExpander] = None):
+    ranked = sorted(handlers, key=lambda h: h.tokens, reverse=True)
+    total = sum(h.tokens for h in handlers) or 1
+    print(f"{len(handlers)} op handlers, {total} expanded tokens, "
+          f"{sum(h.lines for h in handlers)} estimated lines\n")
+    print(f"{'rank':>4} {'handler':<40} {'tokens':>7} {'share':>6} {'lines':>6}  {'line':>5}  generator / top macros")
+    for rank, h in enumerate(ranked[:limit], 1):
+        top = ', '.join(f"{name}:{count}" for name, count in h.contributors.most_common(3))
+        print(f"{rank:>4} {h.name:<40} {h.tokens:>7} {h.tokens / total:>6.1%} {h.lines:>6}  {h.line:>5}  "
+              f"{h.generator} [{top}]")
+
+    by_generator = Counter()
+    for h in handlers:
+        by_generator[h.generator] += h.tokens
+    print("\nExpanded tokens by generating macro:")
+    for generator, tokens in by_generator.most_common(15):
+        count = sum(1 for h in handlers if h.generator == generator)
+        print(f"  {tokens:>7} {tokens / total:>6.1%}  {generator} ({count} handlers)")
+
+    contributors = Counter()
+    for h in handlers:
+        contributors.update(h.contributors)
+    print("\nTokens contributed by each macro (inside handler bodies):")
+    for name, tokens in contributors.most_common(15):
+        print(f"  {tokens:>7} {tokens / total:>6.1%}  {name}")
+
+    if expander is not None:
+        if expander.missing_includes:
+            print(f"\nIncludes not found (their macros stay unexpanded): {', '.join(sorted(expander.missing_includes))}")
+        if expander.condition_errors:
+            print(f"Conditions that could not be evaluated (taken as false): {len(expander.condition_errors)}")
+
+def profile_file(path: str, include_dirs: Iterable[str] = (), defines: Optional[Dict[str, str]] = None,
+                 markers: Iterable[str] = DEFAULT_MARKERS):
+    expander = MacroExpander(include_dirs, defines, markers)
+    source = expander.process(path)
+    expanded = expander.expand(source)
+    return profile_handlers(expanded, source, markers), expander
+
+def main():
+    parser = argparse.ArgumentParser(description="Expanded size of the wasm3 op handlers (d_m3Op) in a header")
+    parser.add_argument('header', nargs='?', default="../hello-idf/components/wasm3-helloesp/platforms/embedded/"
+                                                     "esp32-idf-wasi/wasm3/wasm3/m3_exec.h")
+    parser.add_argument('-I', dest='include_dirs', action='append', default=[], help='Include directory')
+    parser.add_argument('-D', dest='defines', action='append', default=[], help='NAME or NAME=VALUE')
+    parser.add_argument('--marker', action='append', help='Macro that opens a handler (default d_m3Op)')
+    parser.add_argument('--limit', type=int, default=30)
+    args = parser.parse_args()
+
+    defines = {}
+    for item in args.defines:
+        name, _, value = item.partition('=')
+        defines[name] = value or '1'
+    if not os.path.exists(args.header):
+        print(f"File not found: {args.header}")
+        sys.exit(1)
+
+    handlers, expander = profile_file(args.header, args.include_dirs, defines, args.marker or DEFAULT_MARKERS)
+    print_report(handlers, args.limit, expander)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,159 @@
+import os
+import re
+import subprocess
+import logging
+from collections import defaultdict, deque
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional, Set
+
+DEPS_HEADER_RE = re.compile(r'^(\S.*?): #deps \d+')
+OBJECT_SUFFIXES = ('.obj', '.o')
+SOURCE_SUFFIXES = ('.c', '.cpp', '.cc', '.S')
+HEADER_SUFFIXES = ('.h', '.hpp')
+
+def source_changes(paths: Iterable, build_dir) -> List[Path]:
+    """
+    Solo i sorgenti e gli header modificati fuori dalla directory di build:
+    i file generati dalla build stessa (sdkconfig.h, oggetti, depfile) non
+    sono correzioni e porterebbero a ricompilare tutto.
+    """
+    build_dir = os.path.realpath(build_dir)
+    changes = []
+    for path in paths:
+        real = os.path.realpath(path)
+        if Path(real).suffix not in SOURCE_SUFFIXES + HEADER_SUFFIXES:
+            continue
+        if real == build_dir or real.startswith(build_dir + os.sep):
+            continue
+        changes.append(Path(path))
+    return changes
+
+class NinjaTargetMapper:
+    """
+    Mappa i file modificati agli oggetti Ninja da ricompilare.
+
+    La fonte principale è `ninja -t deps` (le dipendenze reali registrate dai
+    depfile di gcc, header compresi); per i file che non vi compaiono si usa
+    `ninja -t query`, e per gli header il modello degli include del SymbolIndex.
+    """
+
+    def __init__(self, build_dir, ninja: str = 'ninja', symbol_index=None):
+        self.build_dir = Path(build_dir)
+        self.ninja = ninja
+        self.symbol_index = symbol_index
+        self.logger = logging.getLogger('NinjaTargetMapper')
+        self._dependents: Optional[Dict[str, Set[str]]] = None
+
+    def _run_ninja(self, *args) -> Optional[str]:
+        try:
+            result = subprocess.run(
+                [self.ninja, '-C', str(self.build_dir), *args],
+                capture_output=True, text=True, errors='replace'
+            )
+        except OSError as e:
+            self.logger.error(f"Unable to run ninja: {e}")
+            return None
+        if result.returncode != 0:
+            self.logger.debug(f"ninja {' '.join(args)} failed: {result.stderr.strip()}")
+            return None
+        return result.stdout
+
+    def _normalize(self, path: str) -> str:
+        if not os.path.isabs(path):
+            path = os.path.join(self.build_dir, path)
+        return os.path.realpath(path)
+
+    def load_deps(self) -> Dict[str, Set[str]]:
+        """file -> oggetti che lo usano, da `ninja -t deps` (letto una volta)."""
+        if self._dependents is not None:
+            return self._dependents
+
+        dependents = defaultdict(set)
+        output = self._run_ninja('-t', 'deps') or ''
+        target = None
+        for line in output.splitlines():
+            header = DEPS_HEADER_RE.match(line)
+            if header:
+                target = header.group(1)
+                continue
+            dep = line.strip()
+            if not dep:
+                target = None
+            elif target:
+                dependents[self._normalize(dep)].add(target)
+
+        self._dependents = dependents
+        return dependents
+
+    def invalidate(self):
+        """Da chiamare dopo una build: i depfile possono essere cambiati."""
+        self._dependents = None
+
+    def query_outputs(self, path) -> Set[str]:
+        """Oggetti prodotti direttamente da un sorgente, via `ninja -t query`."""
+        rel = os.path.relpath(os.path.realpath(path), os.path.realpath(self.build_dir))
+        output = self._run_ninja('-t', 'query', rel)
+        if not output:
+            return set()
+        targets = set()
+        in_outputs = False
+        for line in output.splitlines():
+            stripped = line.strip()
+            if stripped == 'outputs:':
+                in_outputs = True
+            elif stripped.endswith(':'):
+                in_outputs = False
+            elif in_outputs and stripped.endswith(OBJECT_SUFFIXES):
+                targets.add(stripped)
+        return targets
+
+    def _including_sources(self, headers: Iterable[Path]) -> Set[Path]:
+        """Sorgenti .c/.cpp che includono (anche indirettamente) gli header dati."""
+        if self.symbol_index is None:
+            return set()
+        reverse = defaultdict(set)
+        for file in self.symbol_index.files():
+            for inc in self.symbol_index.includes_of(file) or []:
+                reverse[os.path.realpath(inc)].add(file)
+
+        sources = set()
+        queue = deque(os.path.realpath(h) for h in headers)
+        seen = set(queue)
+        while queue:
+            current = queue.popleft()
+            for parent in reverse.get(current, ()):
+                real = os.path.realpath(parent)
+                if real in seen:
+                    continue
+                seen.add(real)
+                if Path(real).suffix in ('.c', '.cpp', '.cc'):
+                    sources.add(Path(real))
+                else:
+                    queue.append(real)
+        return sources
+
+    def targets_for(self, changed_files: Iterable) -> Optional[Set[str]]:
+        """
+        Oggetti da ricompilare per i file modificati. None se per qualche file
+        non si trova nessun oggetto: in quel caso serve una build completa.
+        """
+        dependents = self.load_deps()
+        targets = set()
+        for path in changed_files:
+            real = os.path.realpath(path)
+            found = set(dependents.get(real, ()))
+            if not found:
+                suffix = Path(real).suffix
+                if suffix in SOURCE_SUFFIXES:
+                    found = self.query_outputs(real)
+                else:
+                    for source in self._including_sources([Path(real)]):
+                        found |= dependents.get(str(source), set()) or self.query_outputs(source)
+            if not found:
+                self.logger.info(f"No Ninja target found for {path}")
+                return None
+            targets |= found
+        return targets
+
+    def rebuild_command(self, targets: Iterable[str]) -> List[str]:
+        return [self.ninja, '-C', str(self.build_dir), *sorted(targets)]
@@ -0,0 +1,438 @@
+import os
+import re
+import json
+import time
+import shlex
+import sqlite3
+import logging
+import threading
+from collections import defaultdict
+from pathlib import Path
+from typing import Dict, Iterable, Iterator, List, NamedTuple, Optional, Set, Tuple
+from concurrent.futures import ProcessPoolExecutor
+
+from fileModel import LineIndex
+
+SOURCE_EXTENSIONS = {'.c', '.cpp', '.h', '.hpp'}
+INCLUDE_RE = re.compile(r'#include\s*[<"]([^>"]+)[>"]')
+DEFAULT_DB_NAME = '.symbol_index.db'
+# compile_commands.json cercato qui (relativo alla radice) se non indicato
+COMPILE_COMMANDS_CANDIDATES = ('build/compile_commands.json', 'compile_commands.json')
+INCLUDE_DIR_FLAGS = ('-I', '-isystem', '-iquote', '-idirafter')
+
+class IndexedDefinition(NamedTuple):
+    name: str
+    type: str
+    line: int
+    content: str
+    file: Path
+
+# Pattern compilati una volta per processo worker
+_worker_patterns: Dict[Tuple, List[Tuple[str, re.Pattern]]] = {}
+
+def _compiled(patterns: Dict[str, str]) -> List[Tuple[str, re.Pattern]]:
+    key = tuple(sorted(patterns.items()))
+    compiled = _worker_patterns.get(key)
+    if compiled is None:
+        compiled = _worker_patterns[key] = [(kind, re.compile(p)) for kind, p in patterns.items()]
+    return compiled
+
+def scan_file(root: str, rel_path: str, patterns: Dict[str, str]):
+    """
+    Analizza un singolo file (eseguita nei worker): restituisce definizioni e
+    include così come sono scritti (li risolve IncludeResolver). Il contenuto
+    non esce dal worker.
+    """
+    full_path = os.path.join(root, rel_path)
+    try:
+        with open(full_path, 'r', encoding='utf-8') as f:
+            content = f.read()
+    except (OSError, UnicodeDecodeError) as e:
+        return rel_path, None, None, str(e)
+
+    includes = list(dict.fromkeys(match.group(1) for match in INCLUDE_RE.finditer(content)))
+
+    lines = LineIndex(content)
+    definitions = []
+    for kind, pattern in _compiled(patterns):
+        for match in pattern.finditer(content):
+            definitions.append((match.group(1), kind, lines.line_of(match.start()), match.group(0)))
+
+    return rel_path, definitions, includes, None
+
+def include_dirs_from_compile_commands(path, root) -> List[str]:
+    """
+    Directory di -I/-isystem/-iquote/-idirafter di compile_commands.json,
+    relative a root e nell'ordine della prima comparsa. Quelle fuori da root
+    vengono scartate: l'indice non ne contiene i file.
+    """
+    try:
+        with open(path, 'r') as f:
+            commands = json.load(f)
+    except (OSError, ValueError):
+        return []
+
+    root = os.path.realpath(root)
+    dirs: Dict[str, None] = {}
+    for entry in commands:
+        args = entry.get('arguments') or shlex.split(entry.get('command', ''))
+        directory = entry.get('directory', '')
+        for i, arg in enumerate(args):
+            for flag in INCLUDE_DIR_FLAGS:
+                if arg == flag and i + 1 < len(args):
+                    value = args[i + 1]
+                elif arg.startswith(flag) and len(arg) > len(flag) and flag == '-I':
+                    value = arg[len(flag):]
+                else:
+                    continue
+                full = os.path.realpath(os.path.join(directory, value))
+                if full == root or full.startswith(root + os.sep):
+                    dirs.setdefault(os.path.relpath(full, root))
+                break
+    return list(dirs)
+
+class IncludeResolver:
+    """
+    Risolve un #include in un file dell'indice (percorsi relativi alla radice),
+    nell'ordine: directory del file che include, radice, include dir di
+    compile_commands.json e, se nessuna corrisponde, il file con lo stesso
+    nome la cui coda di percorso coincide (il più vicino a chi include).
+    """
+
+    def __init__(self, files: Iterable[str], include_dirs: Iterable[str] = ()):
+        self.files: Set[str] = set(files)
+        self.include_dirs = [d for d in include_dirs if d != '.']
+        self.by_basename: Dict[str, List[str]] = defaultdict(list)
+        for rel_path in sorted(self.files):
+            self.by_basename[os.path.basename(rel_path)].append(rel_path)
+        self._cache: Dict[Tuple[str, str], Optional[str]] = {}
+
+    def resolve(self, including: str, inc: str) -> Optional[str]:
+        directory = os.path.dirname(including)
+        key = (directory, inc)
+        if key in self._cache:
+            return self._cache[key]
+
+        resolved = None
+        for base in (directory, '', *self.include_dirs):
+            candidate = os.path.normpath(os.path.join(base, inc))
+            if candidate in self.files:
+                resolved = candidate
+                break
+        if resolved is None:
+            suffix = os.sep + os.path.normpath(inc)
+            matches = [path for path in self.by_basename.get(os.path.basename(inc), ())
+                       if path == inc or path.endswith(suffix)]
+            if matches:
+                # A parità di coda vince quello con più directory in comune con chi include
+                resolved = max(matches, key=lambda path: len(os.path.commonpath([including, path])))
+        self._cache[key] = resolved
+        return resolved
+
+class SymbolIndex:
+    """
+    Indice persistente (SQLite + FTS5) delle definizioni di un albero di sorgenti.
+
+    update() rianalizza solo i file nuovi o con mtime/size cambiati, in un pool
+    di processi; i file spariti vengono rimossi. Nessun contenuto di file resta
+    in memoria: le ricerche vanno direttamente sul database.
+
+    Gli include sono salvati come scritti nel sorgente e risolti alla lettura
+    (IncludeResolver), così un header aggiunto dopo viene trovato anche da chi
+    non è cambiato. I file illeggibili (non UTF-8) restano nella tabella con
+    l'errore, per non rianalizzarli a ogni update finché non cambiano.
+    """
+
+    def __init__(self, root, patterns: Dict[str, str], db_path: Optional[str] = None,
+                 max_workers: Optional[int] = None, exclude_dirs=('.git', 'build'),
+                 compile_commands: Optional[str] = None):
+        self.root = Path(root)
+        self.patterns = dict(patterns)
+        self.db_path = db_path or str(self.root / DEFAULT_DB_NAME)
+        self.max_workers = max_workers
+        self.exclude_dirs = set(exclude_dirs)
+        self.compile_commands = compile_commands
+        self.logger = logging.getLogger('SymbolIndex')
+        self._resolver: Optional[IncludeResolver] = None
+
+        self._lock = threading.Lock()
+        self.conn = sqlite3.connect(self.db_path, check_same_thread=False)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.has_fts = True
+        self._init_schema()
+
+    def _init_schema(self):
+        with self.conn:
+            self.conn.executescript("""
+                CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT);
+                CREATE TABLE IF NOT EXISTS files (
+                    path TEXT PRIMARY KEY,
+                    mtime REAL,
+                    size INTEGER,
+                    includes TEXT
+                );
+                CREATE TABLE IF NOT EXISTS definitions (
+                    id INTEGER PRIMARY KEY,
+                    name TEXT,
+                    type TEXT,
+                    line INTEGER,
+                    content TEXT,
+                    file TEXT
+                );
+                CREATE INDEX IF NOT EXISTS definitions_name ON definitions(name);
+                CREATE INDEX IF NOT EXISTS definitions_file ON definitions(file);
+            """)
+            columns = {row[1] for row in self.conn.execute("PRAGMA table_info(files)")}
+            if 'error' not in columns:
+                # Database di una versione precedente: i file non leggibili non erano salvati
+                self.conn.execute("ALTER TABLE files ADD COLUMN error TEXT")
+            try:
+                self.conn.executescript("""
+                    CREATE VIRTUAL TABLE IF NOT EXISTS definitions_fts
+                        USING fts5(name, content, content='definitions', content_rowid='id');
+                    CREATE TRIGGER IF NOT EXISTS definitions_ai AFTER INSERT ON definitions BEGIN
+                        INSERT INTO definitions_fts(rowid, name, content) VALUES (new.id, new.name, new.content);
+                    END;
+                    CREATE TRIGGER IF NOT EXISTS definitions_ad AFTER DELETE ON definitions BEGIN
+                        INSERT INTO definitions_fts(definitions_fts, rowid, name, content)
+                        VALUES ('delete', old.id, old.name, old.content);
+                    END;
+                """)
+            except sqlite3.OperationalError:
+                self.logger.warning("SQLite without FTS5: full-text search falls back to LIKE")
+                self.has_fts = False
+
+            # Se cambiano i pattern l'indice va ricostruito da zero
+            signature = json.dumps(self.patterns, sort_keys=True)
+            row = self.conn.execute("SELECT value FROM meta WHERE key = 'patterns'").fetchone()
+            if row is None or row[0] != signature:
+                self.conn.execute("DELETE FROM definitions")
+                self.conn.execute("DELETE FROM files")
+                self.conn.execute("INSERT OR REPLACE INTO meta (key, value) VALUES ('patterns', ?)", (signature,))
+
+    def _walk(self) -> Iterator[Tuple[str, float, int]]:
+        """Una sola visita dell'albero per tutte le estensioni: (percorso relativo, mtime, size)."""
+        root = str(self.root)
+        stack = [root]
+        while stack:
+            directory = stack.pop()
+            try:
+                entries = list(os.scandir(directory))
+            except OSError:
+                continue
+            for entry in entries:
+                if entry.is_dir(follow_symlinks=False):
+                    if entry.name not in self.exclude_dirs:
+                        stack.append(entry.path)
+                elif os.path.splitext(entry.name)[1] in SOURCE_EXTENSIONS:
+                    try:
+                        stat = entry.stat()
+                    except OSError:
+                        continue
+                    yield os.path.relpath(entry.path, root), stat.st_mtime, stat.st_size
+
+    def update(self) -> Dict:
+        """
+        Aggiorna l'indice con i soli file modificati. Restituisce statistiche
+        e l'elenco dei file nuovi/modificati/rimossi ('changed_files').
+        """
+        start = time.time()
+        known = {path: (mtime, size) for path, mtime, size in
+                 self.conn.execute("SELECT path, mtime, size FROM files")}
+
+        changed = {}
+        seen = set()
+        for rel_path, mtime, size in self._walk():
+            seen.add(rel_path)
+            if known.get(rel_path) != (mtime, size):
+                changed[rel_path] = (mtime, size)
+        removed = [path for path in known if path not in seen]
+
+        results = []
+        if changed:
+            root = str(self.root)
+            if len(changed) > 16:
+                with ProcessPoolExecutor(max_workers=self.max_workers) as executor:
+                    results = list(executor.map(
+                        scan_file, [root] * len(changed), list(changed), [self.patterns] * len(changed),
+                        chunksize=32
+                    ))
+            else:
+                results = [scan_file(root, rel_path, self.patterns) for rel_path in changed]
+
+        errors = 0
+        with self._lock, self.conn:
+            for rel_path in removed + list(changed):
+                self.conn.execute("DELETE FROM definitions WHERE file = ?", (rel_path,))
+                self.conn.execute("DELETE FROM files WHERE path = ?", (rel_path,))
+
+            for rel_path, definitions, includes, error in results:
+                mtime, size = changed[rel_path]
+                if error is not None:
+                    self.logger.error(f"Error analyzing {rel_path}: {error}")
+                    errors += 1
+                    self.conn.execute(
+                        "INSERT INTO files (path, mtime, size, includes, error) VALUES (?, ?, ?, '[]', ?)",
+                        (rel_path, mtime, size, error)
+                    )
+                    continue
+                self.conn.execute(
+                    "INSERT INTO files (path, mtime, size, includes) VALUES (?, ?, ?, ?)",
+                    (rel_path, mtime, size, json.dumps(includes))
+                )
+                self.conn.executemany(
+                    "INSERT INTO definitions (name, type, line, content, file) VALUES (?, ?, ?, ?, ?)",
+                    [(name, kind, line, content, rel_path) for name, kind, line, content in definitions]
+                )
+
+        # Anche compile_commands.json può essere cambiato: il risolutore si ricostruisce alla prossima lettura
+        self._resolver = None
+        return {
+            'files': len(seen),
+            'updated': len(changed),
+            'removed': len(removed),
+            'errors': errors,
+            'elapsed': time.time() - start,
+            'changed_files': [self.root / path for path in list(changed) + removed]
+        }
+
+    def _row_to_definition(self, row) -> IndexedDefinition:
+        name, kind, line, content, rel_path = row
+        return IndexedDefinition(name, kind, line, content, self.root / rel_path)
+
+    def has(self, name: str) -> bool:
+        with self._lock:
+            return self.conn.execute(
+                "SELECT 1 FROM definitions WHERE name = ? LIMIT 1", (name,)
+            ).fetchone() is not None
+
+    def lookup(self, name: str) -> List[IndexedDefinition]:
+        with self._lock:
+            rows = self.conn.execute(
+                "SELECT name, type, line, content, file FROM definitions WHERE name = ? ORDER BY id", (name,)
+            ).fetchall()
+        return [self._row_to_definition(row) for row in rows]
+
+    def definitions_in(self, path) -> List[IndexedDefinition]:
+        with self._lock:
+            rows = self.conn.execute(
+                "SELECT name, type, line, content, file FROM definitions WHERE file = ? ORDER BY id",
+                (self._rel(path),)
+            ).fetchall()
+        return [self._row_to_definition(row) for row in rows]
+
+    def _find_compile_commands(self) -> Optional[Path]:
+        if self.compile_commands:
+            return Path(self.compile_commands)
+        for candidate in COMPILE_COMMANDS_CANDIDATES:
+            if (self.root / candidate).exists():
+                return self.root / candidate
+        return None
+
+    def resolver(self) -> IncludeResolver:
+        """Risolutore sui file attuali dell'indice (ricostruito dopo ogni update che cambia qualcosa)."""
+        if self._resolver is None:
+            compile_commands = self._find_compile_commands()
+            include_dirs = include_dirs_from_compile_commands(compile_commands, self.root) if compile_commands else []
+            with self._lock:
+                files = [row[0] for row in self.conn.execute("SELECT path FROM files WHERE error IS NULL")]
+            self._resolver = IncludeResolver(files, include_dirs)
+        return self._resolver
+
+    def raw_includes_of(self, path) -> Optional[List[str]]:
+        """Include come scritti nel file (None se il file non è indicizzato)."""
+        with self._lock:
+            row = self.conn.execute("SELECT includes FROM files WHERE path = ?", (self._rel(path),)).fetchone()
+        if row is None:
+            return None
+        return json.loads(row[0])
+
+    def includes_of(self, path) -> Optional[List[Path]]:
+        """Include risolti di un file (None se il file non è indicizzato); quelli non trovati sono omessi."""
+        raw = self.raw_includes_of(path)
+        if raw is None:
+            return None
+        resolver = self.resolver()
+        rel_path = self._rel(path)
+        resolved = (resolver.resolve(rel_path, inc) for inc in raw)
+        return [self.root / inc for inc in dict.fromkeys(r for r in resolved if r is not None)]
+
+    def include_graph_stats(self) -> Dict[str, int]:
+        """Archi risolti e include non trovati sull'intero indice (per verificare il grafo)."""
+        with self._lock:
+            rows = self.conn.execute("SELECT path, includes FROM files WHERE error IS NULL").fetchall()
+        resolver = self.resolver()
+        edges = unresolved = 0
+        for rel_path, includes in rows:
+            for inc in json.loads(includes):
+                if resolver.resolve(rel_path, inc) is None:
+                    unresolved += 1
+                else:
+                    edges += 1
+        return {'files': len(rows), 'edges': edges, 'unresolved': unresolved}
+
+    def errors(self) -> List[Tuple[Path, str]]:
+        """File che non è stato possibile analizzare, con il motivo."""
+        with self._lock:
+            rows = self.conn.execute("SELECT path, error FROM files WHERE error IS NOT NULL").fetchall()
+        return [(self.root / path, error) for path, error in rows]
+
+    def search(self, text: str, limit: int = 20) -> List[IndexedDefinition]:
+        """Ricerca full-text su nome e contenuto delle definizioni."""
+        with self._lock:
+            if self.has_fts:
+                query = ' OR '.join('"' + token.replace('"', '""') + '"' for token in re.findall(r'\w+', text))
+                if not query:
+                    return []
+                rows = self.conn.execute("""
+                    SELECT d.name, d.type, d.line, d.content, d.file
+                    FROM definitions_fts JOIN definitions d ON d.id = definitions_fts.rowid
+                    WHERE definitions_fts MATCH ? ORDER BY rank LIMIT ?
+                """, (query, limit)).fetchall()
+            else:
+                rows = self.conn.execute(
+                    "SELECT name, type, line, content, file FROM definitions WHERE content LIKE ? LIMIT ?",
+                    (f'%{text}%', limit)
+                ).fetchall()
+        return [self._row_to_definition(row) for row in rows]
+
+    def document_frequency(self, name: str) -> int:
+        """Numero di file distinti che definiscono `name`."""
+        with self._lock:
+            return self.conn.execute(
+                "SELECT COUNT(DISTINCT file) FROM definitions WHERE name = ?", (name,)
+            ).fetchone()[0]
+
+    def file_count(self) -> int:
+        with self._lock:
+            return self.conn.execute("SELECT COUNT(*) FROM files WHERE error IS NULL").fetchone()[0]
+
+    def names(self) -> Iterator[str]:
+        with self._lock:
+            rows = self.conn.execute("SELECT DISTINCT name FROM definitions").fetchall()
+        return (row[0] for row in rows)
+
+    def count_names(self) -> int:
+        with self._lock:
+            return self.conn.execute("SELECT COUNT(DISTINCT name) FROM definitions").fetchone()[0]
+
+    def files(self) -> List[Path]:
+        with self._lock:
+            rows = self.conn.execute("SELECT path FROM files WHERE error IS NULL").fetchall()
+        return [self.root / row[0] for row in rows]
+
+    def has_file(self, path) -> bool:
+        with self._lock:
+            return self.conn.execute(
+                "SELECT 1 FROM files WHERE path = ? AND error IS NULL", (self._rel(path),)
+            ).fetchone() is not None
+
+    def _rel(self, path) -> str:
+        path = Path(path)
+        try:
+            return str(path.relative_to(self.root))
+        except ValueError:
+            return str(path)
+
+    def close(self):
+        self.conn.close()
@@ -1,10 +1,14 @@
 import re
+import sys
+import time
 from dataclasses import dataclass
-from typing import List, Dict, Set, Optional
+from typing import List, Dict, Set, Optional, Sequence
 import ast
 import logging
 from pathlib import Path
 
+from macroEngine import DefineSpan, MacroPipeline, BodyTransform, find_defines
+
 @dataclass
 class MacroDefinition:
     name: str
@@ -12,6 +16,8 @@ class MacroDefinition:
     body: str
     original_text: str
     line_number: int
+    body_start: int = -1
+    body_end: int = -1
 
 @dataclass
 class MacroExpansion:
@@ -21,8 +27,11 @@ class MacroExpansion:
     line_number: int
 
 class WASM3MacroAnalyzer:
-    def __init__(self):
+    def __init__(self, extra_transforms: Sequence[BodyTransform] = ()):
         self.macro_definitions: Dict[str, MacroDefinition] = {}
+        # Tutti gli span trovati (anche le ridefinizioni con lo stesso nome)
+        self.macro_spans: List[DefineSpan] = []
+        self.extra_transforms = list(extra_transforms)
         self.macro_expansions: List[MacroExpansion] = []
         self.return_patterns = {
             'nextOp': r'nextOp\s*\(\)',
@@ -36,22 +45,32 @@ class WASM3MacroAnalyzer:
             'while': r'while\s*\([^{]*\)\s*{',
         }
         
+    @staticmethod
+    def is_multiline_function_macro(define: DefineSpan, body: str) -> bool:
+        """
+        Le macro trattate: con parametri semplici (niente variadiche) e con il
+        corpo che inizia su una nuova riga.
+        """
+        return (define.function_like and not define.variadic
+                and all(re.fullmatch(r'\w*', p) for p in define.params)
+                and body.startswith('\\'))
+
     def parse_macro_definitions(self, content: str) -> None:
-        """Analizza e memorizza tutte le definizioni di macro."""
-        # Pattern per identificare le definizioni di macro
-        macro_def_pattern = r'#define\s+(\w+)\s*\(([\w\s,]*)\)\s*(\\\s*\n(?:.*\\\s*\n)*.*)'
-        
-        for match in re.finditer(macro_def_pattern, content, re.MULTILINE):
-            name = match.group(1)
-            params = [p.strip() for p in match.group(2).split(',') if p.strip()]
-            body = match.group(3)
-            
-            self.macro_definitions[name] = MacroDefinition(
-                name=name,
-                params=params,
+        """Analizza e memorizza tutte le definizioni di macro (un solo passaggio del tokenizer)."""
+        self.macro_spans = []
+        for define in find_defines(content):
+            body = content[define.body_start:define.body_end]
+            if not self.is_multiline_function_macro(define, body):
+                continue
+            self.macro_spans.append(define)
+            self.macro_definitions[define.name] = MacroDefinition(
+                name=define.name,
+                params=[p for p in define.params if p],
                 body=body,
-                original_text=match.group(0),
-                line_number=content[:match.start()].count('\n') + 1
+                original_text=content[define.start:define.end],
+                line_number=define.line,
+                body_start=define.body_start,
+                body_end=define.body_end
             )
 
     def analyze_control_flow(self, macro_body: str) -> List[dict]:
@@ -110,19 +129,29 @@ class WASM3MacroAnalyzer:
                 
         return '\n'.join(lines)
 
+    def build_pipeline(self) -> MacroPipeline:
+        """add_returns seguita dalle trasformazioni aggiuntive, sulle sole macro trattate."""
+        pipeline = MacroPipeline(select=self.is_multiline_function_macro)
+        pipeline.add(lambda define, body: self.add_returns(body))
+        for transform in self.extra_transforms:
+            pipeline.add(transform)
+        return pipeline
+
+    def transform(self, content: str) -> str:
+        """
+        Trasforma il testo: ogni #define viene riscritto sul proprio span e il
+        risultato è costruito una sola volta, senza ricerche del corpo nel file.
+        """
+        self.parse_macro_definitions(content)
+        return self.build_pipeline().run(content, self.macro_spans)
+
     def process_file(self, input_path: str, output_path: str) -> None:
         """Processa il file completo."""
         try:
             with open(input_path, 'r') as f:
                 content = f.read()
                 
-            # Prima analizza tutte le definizioni
-            self.parse_macro_definitions(content)
-            
-            # Poi processa ogni macro
-            for macro in self.macro_definitions.values():
-                fixed_body = self.add_returns(macro.body)
-                content = content.replace(macro.body, fixed_body)
+            content = self.transform(content)
                 
             # Scrivi il risultato
             with open(output_path, 'w') as f:
@@ -134,12 +163,32 @@ class WASM3MacroAnalyzer:
             logging.error(f"Errore durante il processing del file: {str(e)}")
             raise
 
+    def process_files(self, input_paths: Sequence[str], output_dir: str) -> Dict[str, float]:
+        """Processa più header (es. tutto wasm3) scrivendoli in output_dir; restituisce i tempi in ms."""
+        timings = {}
+        Path(output_dir).mkdir(parents=True, exist_ok=True)
+        for input_path in input_paths:
+            start = time.perf_counter()
+            with open(input_path, 'r') as f:
+                content = f.read()
+            content = self.transform(content)
+            with open(Path(output_dir) / Path(input_path).name, 'w') as f:
+                f.write(content)
+            timings[input_path] = (time.perf_counter() - start) * 1000
+        return timings
+
 
 if __name__ == "__main__":
-    input_path = "../hello-idf/components/wasm3-helloesp/platforms/embedded/esp32-idf-wasi/wasm3/wasm3/m3_exec.h"
-    output_path = "m3_exec_transformed.h"
-    
     logging.basicConfig(level=logging.INFO)
     analyzer = WASM3MacroAnalyzer()
-    
-    analyzer.process_file(input_path, output_path)
\ No newline at end of file
+
+    if len(sys.argv) > 2:
+        # transform_exec_macro.py <output_dir> <header> [header...]
+        timings = analyzer.process_files(sys.argv[2:], sys.argv[1])
+        for path, ms in timings.items():
+            print(f"{ms:8.2f} ms  {path}")
+        print(f"{sum(timings.values()):8.2f} ms  total ({len(timings)} files)")
+    else:
+        input_path = "../hello-idf/components/wasm3-helloesp/platforms/embedded/esp32-idf-wasi/wasm3/wasm3/m3_exec.h"
+        output_path = "m3_exec_transformed.h"
+        analyzer.process_file(input_path, output_path)
\ No newline at end of file
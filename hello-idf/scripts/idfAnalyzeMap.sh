@@ -0,0 +1,16 @@
+#!/bin/bash
+
+# Importa la map dell'ultima build e la confronta con la precedente
+# (la prima volta salva solo il riferimento)
+
+NAME=${1:-$(git rev-parse --short HEAD 2>/dev/null || date +%Y%m%d-%H%M%S)}
+
+python3 scripts/mapAnalyzer.py import build/hello-idf.map --name "$NAME"
+
+if [ -n "$PREV_BUILD" ]; then
+    python3 scripts/mapAnalyzer.py diff "$PREV_BUILD" "$NAME"
+else
+    python3 scripts/mapAnalyzer.py report "$NAME"
+    #python3 scripts/mapAnalyzer.py list
+    #PREV_BUILD=<nome> ./scripts/idfAnalyzeMap.sh
+fi
@@ -0,0 +1,9 @@
+#!/bin/bash
+
+source ./espShellEnv.sh
+
+# Occupazione IRAM/DRAM per funzione e componente di tutti gli oggetti in build/
+python3 scripts/objSizeAnalyzer.py build --top 30 "$@"
+
+# Anche da un dump salvato:
+#python3 scripts/objSizeAnalyzer.py memory_analysis.txt
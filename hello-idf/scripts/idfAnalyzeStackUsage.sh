@@ -11,3 +11,6 @@ xtensa-esp32-elf-nm --size-sort -S build/hello-idf.elf
 #Per vedere i simboli ordinati per dimensione:
 # xtensa-esp32-elf-nm --size-sort -S build/your_project.elf
 #Quest'ultimo comando ti mostrerà le variabili globali e gli array più grandi.
+
+# Stack peggiore per task: .su (-fstack-usage, vedi C_FLAGS in espShellEnv.sh) + grafo delle chiamate dall'ELF
+#python3 scripts/stackEstimator.py --su build --elf build/hello-idf.elf
@@ -0,0 +1,361 @@
+#!/usr/bin/env python3
+
+import os
+import re
+import sys
+import time
+import sqlite3
+import argparse
+from dataclasses import dataclass
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+from objSizeAnalyzer import RAM_BUDGET, section_function
+
+DEFAULT_DB = 'build_sizes.db'
+BATCH_SIZE = 5000
+
+# "iram0_0_seg      0x40080000         0x00020000         xr"
+MEMORY_RE = re.compile(r'^(\w+)\s+0x([0-9a-fA-F]+)\s+0x([0-9a-fA-F]+)')
+# "esp-idf/main/libmain.a(main.c.obj)"
+ARCHIVE_MEMBER_RE = re.compile(r'^(.*?)\(([^()]+)\)$')
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS builds (
+    id INTEGER PRIMARY KEY,
+    name TEXT UNIQUE,
+    map_path TEXT,
+    imported_at REAL
+);
+CREATE TABLE IF NOT EXISTS sections (
+    build_id INTEGER,
+    region TEXT,
+    segment TEXT,
+    output_section TEXT,
+    input_section TEXT,
+    archive TEXT,
+    object TEXT,
+    symbol TEXT,
+    address INTEGER,
+    size INTEGER
+);
+CREATE INDEX IF NOT EXISTS idx_sections_build ON sections(build_id, region);
+"""
+
+@dataclass
+class Segment:
+    name: str
+    origin: int
+    length: int
+    region: str
+
+    def contains(self, address: int) -> bool:
+        return self.origin <= address < self.origin + self.length
+
+def region_of_segment(name: str) -> str:
+    """Regione di un segmento della Memory Configuration (iram0_2_seg e drom0_0_seg sono la flash mappata)."""
+    lower = name.lower()
+    if 'rtc' in lower:
+        return 'RTC'
+    if 'iram0_2' in lower or 'irom' in lower or 'drom' in lower or 'flash' in lower:
+        return 'FLASH'
+    if 'iram' in lower:
+        return 'IRAM'
+    if 'dram' in lower:
+        return 'DRAM'
+    if 'extern' in lower or 'psram' in lower:
+        return 'PSRAM'
+    return name
+
+def region_of_output(name: str) -> Optional[str]:
+    """Ripiego senza Memory Configuration: la regione dal nome della sezione di output."""
+    if name.startswith('.iram0'):
+        return 'IRAM'
+    if name.startswith('.dram0'):
+        return 'DRAM'
+    if name.startswith('.flash'):
+        return 'FLASH'
+    if name.startswith('.rtc'):
+        return 'RTC'
+    return None
+
+def split_origin(path: str) -> Tuple[str, str]:
+    """(archivio, oggetto) da "dir/libx.a(file.c.obj)" o da un oggetto linkato direttamente."""
+    match = ARCHIVE_MEMBER_RE.match(path)
+    if match:
+        return os.path.basename(match.group(1)), match.group(2)
+    return '', path
+
+class MapParser:
+    """
+    Parser a flusso delle map di GNU ld: legge una riga alla volta e produce
+    una tupla per ogni sezione di input allocata (regione, segmento, sezione
+    di output, sezione di input, archivio, oggetto, simbolo, indirizzo,
+    dimensione). Le sezioni di debug e quelle a indirizzo 0 sono scartate.
+    """
+
+    def __init__(self):
+        self.segments: List[Segment] = []
+        self._last_segment: Optional[Segment] = None
+
+    def _region(self, address: int, output_section: str) -> Optional[Tuple[str, str]]:
+        segment = self._last_segment
+        if segment is None or not segment.contains(address):
+            segment = next((s for s in self.segments if s.contains(address)), None)
+        if segment is not None:
+            self._last_segment = segment
+            return segment.region, segment.name
+        region = region_of_output(output_section)
+        return (region, '') if region else None
+
+    def parse(self, lines: Iterable[str]) -> Iterator[tuple]:
+        phase = 'preamble'
+        output_section = ''
+        pending_name: Optional[str] = None
+        row: Optional[list] = None      # sezione corrente, emessa quando inizia la successiva
+
+        for line in lines:
+            if phase != 'map':
+                if line.startswith('Memory Configuration'):
+                    phase = 'memory'
+                elif line.startswith('Linker script and memory map'):
+                    phase = 'map'
+                elif phase == 'memory':
+                    match = MEMORY_RE.match(line)
+                    if match and match.group(1) != 'Name' and match.group(1) != '*default*':
+                        name = match.group(1)
+                        self.segments.append(Segment(name, int(match.group(2), 16), int(match.group(3), 16),
+                                                     region_of_segment(name)))
+                continue
+
+            if not line or line[0] == '\n':
+                continue
+            first = line[0]
+            if first == '.':
+                # Sezione di output (a colonna 0)
+                output_section = line.split(None, 1)[0]
+                pending_name = None
+                continue
+            if first != ' ':
+                continue
+
+            if line[1] != ' ':
+                # Sezione di input: " .text.foo 0x400d0020 0x40 archivio(oggetto)" oppure solo il nome
+                if line[1] == '*':
+                    pending_name = None   # *fill* e pattern dello script
+                    continue
+                parts = line.split()
+                if len(parts) == 1:
+                    pending_name = parts[0]
+                    continue
+                pending_name = None
+                if len(parts) < 4 or not parts[1].startswith('0x'):
+                    continue
+                name, address, size, origin = parts[0], parts[1], parts[2], ' '.join(parts[3:])
+            else:
+                parts = line.split()
+                if not parts or not parts[0].startswith('0x'):
+                    continue
+                if pending_name is not None and len(parts) >= 3 and parts[1].startswith('0x'):
+                    # Seguito di una sezione di input dal nome lungo
+                    name, address, size, origin = pending_name, parts[0], parts[1], ' '.join(parts[2:])
+                    pending_name = None
+                else:
+                    # "0x40080400                vTaskSwitchContext": primo simbolo della sezione
+                    if row is not None and row[6] is None and len(parts) == 2:
+                        row[6] = parts[1]
+                    continue
+
+            size_value = int(size, 16)
+            address_value = int(address, 16)
+            if row is not None:
+                yield tuple(row)
+                row = None
+            if size_value == 0 or address_value == 0:
+                continue
+            placement = self._region(address_value, output_section)
+            if placement is None:
+                continue
+            archive, obj = split_origin(origin)
+            row = [placement[0], placement[1], output_section, name, archive, obj,
+                   section_function(name), address_value, size_value]
+
+        if row is not None:
+            yield tuple(row)
+
+class SizeDatabase:
+    """Sezioni di input di più build in SQLite, per report e confronti."""
+
+    def __init__(self, db_path: str = DEFAULT_DB):
+        self.conn = sqlite3.connect(db_path)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.executescript(SCHEMA)
+
+    def import_map(self, map_path: str, name: Optional[str] = None) -> Tuple[int, int]:
+        """Importa una map (sostituendo una build con lo stesso nome). Restituisce (id, righe)."""
+        name = name or map_path
+        with self.conn:
+            old = self.conn.execute("SELECT id FROM builds WHERE name = ?", (name,)).fetchone()
+            if old:
+                self.conn.execute("DELETE FROM sections WHERE build_id = ?", (old[0],))
+                self.conn.execute("DELETE FROM builds WHERE id = ?", (old[0],))
+            build_id = self.conn.execute(
+                "INSERT INTO builds (name, map_path, imported_at) VALUES (?, ?, ?)",
+                (name, os.path.abspath(map_path), time.time())
+            ).lastrowid
+
+            count = 0
+            batch = []
+            with open(map_path, 'r', errors='replace') as f:
+                for row in MapParser().parse(f):
+                    batch.append((build_id,) + row)
+                    if len(batch) >= BATCH_SIZE:
+                        self._insert(batch)
+                        count += len(batch)
+                        batch = []
+            self._insert(batch)
+            count += len(batch)
+        return build_id, count
+
+    def _insert(self, batch: List[tuple]):
+        if batch:
+            self.conn.executemany("INSERT INTO sections VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)", batch)
+
+    def build_id(self, name: str) -> int:
+        row = self.conn.execute("SELECT id FROM builds WHERE name = ?", (name,)).fetchone()
+        if row is None:
+            raise KeyError(f"Build '{name}' non presente nel database")
+        return row[0]
+
+    def builds(self) -> List[tuple]:
+        return self.conn.execute("""
+            SELECT b.name, b.map_path, b.imported_at, COUNT(s.build_id)
+            FROM builds b LEFT JOIN sections s ON s.build_id = b.id
+            GROUP BY b.id ORDER BY b.imported_at
+        """).fetchall()
+
+    def region_totals(self, build_id: int) -> Dict[str, int]:
+        return dict(self.conn.execute(
+            "SELECT region, SUM(size) FROM sections WHERE build_id = ? GROUP BY region", (build_id,)
+        ).fetchall())
+
+    def top(self, build_id: int, region: str, group: str = 'symbol', limit: int = 25) -> List[tuple]:
+        key = self._group_key(group)
+        return self.conn.execute(f"""
+            SELECT {key} AS name, SUM(size) AS total FROM sections
+            WHERE build_id = ? AND region = ? GROUP BY name ORDER BY total DESC LIMIT ?
+        """, (build_id, region, limit)).fetchall()
+
+    @staticmethod
+    def _group_key(group: str) -> str:
+        if group == 'archive':
+            return "CASE archive WHEN '' THEN object ELSE archive END"
+        if group == 'object':
+            return "archive || ':' || object"
+        # Simbolo: il nome della funzione, o in mancanza la sezione di input
+        return "archive || ':' || object || ':' || COALESCE(symbol, input_section)"
+
+    def diff(self, old_id: int, new_id: int, region: str, group: str = 'symbol', limit: int = 25) -> List[tuple]:
+        """(nome, dimensione vecchia, nuova, differenza) ordinati per crescita."""
+        key = self._group_key(group)
+        return self.conn.execute(f"""
+            WITH totals AS (
+                SELECT {key} AS name,
+                       SUM(CASE WHEN build_id = :old THEN size ELSE 0 END) AS old_size,
+                       SUM(CASE WHEN build_id = :new THEN size ELSE 0 END) AS new_size
+                FROM sections
+                WHERE build_id IN (:old, :new) AND region = :region
+                GROUP BY name
+            )
+            SELECT name, old_size, new_size, new_size - old_size AS delta FROM totals
+            WHERE delta != 0 ORDER BY ABS(delta) DESC LIMIT :limit
+        """, {'old': old_id, 'new': new_id, 'region': region, 'limit': limit}).fetchall()
+
+    def close(self):
+        self.conn.close()
+
+def print_regions(totals: Dict[str, int], ram_budget: int = RAM_BUDGET):
+    print('  '.join(f"{region}={size}" for region, size in sorted(totals.items())))
+    ram = totals.get('IRAM', 0) + totals.get('DRAM', 0)
+    print(f"IRAM+DRAM: {ram} bytes, {ram / ram_budget:.1%} of {ram_budget // 1024} KB")
+
+def report(db: SizeDatabase, name: str, regions: List[str], group: str, limit: int):
+    build_id = db.build_id(name)
+    print(f"Build: {name}")
+    print_regions(db.region_totals(build_id))
+    for region in regions:
+        rows = db.top(build_id, region, group, limit)
+        print(f"\n{region} by {group}")
+        for rank, (item, size) in enumerate(rows, 1):
+            print(f"{rank:>4} {size:>8}  {item}")
+
+def report_diff(db: SizeDatabase, old: str, new: str, regions: List[str], group: str, limit: int):
+    old_id, new_id = db.build_id(old), db.build_id(new)
+    old_totals, new_totals = db.region_totals(old_id), db.region_totals(new_id)
+    print(f"{old} -> {new}")
+    print(f"{'region':<8} {'old':>9} {'new':>9} {'delta':>8}")
+    for region in sorted(set(old_totals) | set(new_totals)):
+        before, after = old_totals.get(region, 0), new_totals.get(region, 0)
+        print(f"{region:<8} {before:>9} {after:>9} {after - before:>+8}")
+
+    for region in regions:
+        rows = db.diff(old_id, new_id, region, group, limit)
+        print(f"\n{region} changes by {group} ({len(rows)} shown)")
+        for item, before, after, delta in rows:
+            print(f"{delta:>+8} {before:>8} -> {after:<8} {item}")
+
+def ensure_imported(db: SizeDatabase, item: str) -> str:
+    """Un argomento può essere il nome di una build già importata o il percorso di una map."""
+    if os.path.isfile(item):
+        start = time.perf_counter()
+        _, rows = db.import_map(item)
+        print(f"Imported {item}: {rows} input sections in {time.perf_counter() - start:.2f}s")
+    return item
+
+def main():
+    parser = argparse.ArgumentParser(description="GNU ld map analyzer: size by region and build-to-build diffs")
+    parser.add_argument('--db', default=DEFAULT_DB)
+    sub = parser.add_subparsers(dest='command', required=True)
+
+    p_import = sub.add_parser('import', help="parse a map file into the database")
+    p_import.add_argument('map')
+    p_import.add_argument('--name', help="build name (default: the map path)")
+
+    p_report = sub.add_parser('report', help="largest consumers of a build")
+    p_report.add_argument('build', help="build name or map file")
+
+    p_diff = sub.add_parser('diff', help="compare two builds")
+    p_diff.add_argument('old', help="build name or map file")
+    p_diff.add_argument('new', help="build name or map file")
+
+    sub.add_parser('list', help="imported builds")
+
+    for p in (p_report, p_diff):
+        p.add_argument('--region', action='append', help="regions to detail (default IRAM and DRAM)")
+        p.add_argument('--by', choices=('symbol', 'object', 'archive'), default='symbol')
+        p.add_argument('--limit', type=int, default=25)
+
+    args = parser.parse_args()
+    db = SizeDatabase(args.db)
+    try:
+        if args.command == 'import':
+            start = time.perf_counter()
+            _, rows = db.import_map(args.map, args.name)
+            print(f"Imported {rows} input sections in {time.perf_counter() - start:.2f}s")
+        elif args.command == 'list':
+            for name, path, imported_at, rows in db.builds():
+                print(f"{name:<30} {rows:>7} sections  {time.strftime('%Y-%m-%d %H:%M', time.localtime(imported_at))}  {path}")
+        elif args.command == 'report':
+            report(db, ensure_imported(db, args.build), args.region or ['IRAM', 'DRAM'], args.by, args.limit)
+        elif args.command == 'diff':
+            old, new = ensure_imported(db, args.old), ensure_imported(db, args.new)
+            report_diff(db, old, new, args.region or ['IRAM', 'DRAM'], args.by, args.limit)
+    except (KeyError, FileNotFoundError) as e:
+        print(f"Errore: {e}")
+        sys.exit(1)
+    finally:
+        db.close()
+
+if __name__ == '__main__':
+    main()
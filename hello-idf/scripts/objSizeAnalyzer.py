@@ -0,0 +1,329 @@
+#!/usr/bin/env python3
+
+import os
+import re
+import sys
+import json
+import shutil
+import argparse
+import subprocess
+from collections import defaultdict
+from dataclasses import dataclass, asdict
+from pathlib import Path
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple
+
+TOOL_PREFIX = os.environ.get('IDF_TOOL_PREFIX', 'xtensa-esp32-elf-')
+RAM_BUDGET = 340 * 1024
+OBJECT_SUFFIXES = ('.obj', '.o')
+
+# "path.obj:     file format elf32-xtensa-le"
+FILE_HEADER_RE = re.compile(r'^(?:In archive \S+:\s*)?(\S+?):\s+file format\s+\S+')
+# "  0 .literal.EmitPointer 00000008  00000000  00000000  00000034  2**2"
+SECTION_RE = re.compile(r'^\s*\d+\s+(\S+)\s+([0-9a-fA-F]+)\s+[0-9a-fA-F]+\s+[0-9a-fA-F]+\s+[0-9a-fA-F]+\s+2\*\*\d+')
+# "00000000 g     O .dram1.3	00001a94 c_operations"
+SYMTAB_RE = re.compile(r'^[0-9a-fA-F]+\s+([lgw!u ]{1,7})\s*([FOfd ]?)\s+(\S+)\s+([0-9a-fA-F]+)\s+(.+)$')
+# "00000010 00000008 B nome	file.c:12" (nm -S [-l])
+NM_RE = re.compile(r'^([0-9a-fA-F]+)\s+([0-9a-fA-F]+)\s+([A-Za-z])\s+(\S+)(?:\s+(\S+))?')
+
+# Sezioni senza un nome di funzione: vengono attribuite ai simboli che contengono
+NUMBERED_SECTION_RE = re.compile(r'^\.(iram1|dram1|iram0\.text|rtc\.text|rtc\.data)(\.\d+)?(\.literal)?$')
+
+@dataclass
+class SectionUse:
+    object_path: str
+    component: str
+    section: str
+    region: str          # IRAM, DRAM, FLASH, RTC
+    kind: str            # text, literal, data, bss, rodata
+    function: str
+    size: int
+    placement: str = 'default'   # 'map': regione letta dalla map del linker
+
+def classify_section(name: str) -> Optional[Tuple[str, str]]:
+    """
+    (regione, tipo) in cui finisce una sezione di input secondo le regole di
+    default di ESP-IDF. Non conosce i mapping di ldgen (noflash, i frammenti
+    .lf dei componenti): la regione vera viene da LinkerPlacement.
+    """
+    if name.startswith('.iram1') or name.startswith('.iram0'):
+        return 'IRAM', 'literal' if name.endswith('.literal') else 'text'
+    if name.startswith('.dram1') or name.startswith('.dram0'):
+        return 'DRAM', 'data'
+    if name.startswith('.rtc'):
+        return 'RTC', 'text' if '.text' in name else 'data'
+    if name.startswith('.literal'):
+        return 'FLASH', 'literal'
+    if name.startswith('.text'):
+        return 'FLASH', 'text'
+    if name.startswith('.rodata') or name.startswith('.srodata'):
+        return 'FLASH', 'rodata'
+    if name.startswith('.data') or name.startswith('.sdata'):
+        return 'DRAM', 'data'
+    if name.startswith('.bss') or name.startswith('.sbss') or name == 'COMMON':
+        return 'DRAM', 'bss'
+    return None
+
+def section_function(name: str) -> Optional[str]:
+    """Nome della funzione/variabile codificato nella sezione (-ffunction-sections / -fdata-sections)."""
+    if NUMBERED_SECTION_RE.match(name):
+        return None
+    for prefix in ('.literal.', '.text.', '.rodata.', '.data.', '.bss.', '.sdata.', '.sbss.', '.srodata.'):
+        if name.startswith(prefix):
+            # .rodata.func.str1.4 -> func; .rodata.str1.4 (stringhe unite) resta la sezione
+            symbol = re.sub(r'(^|\.)(str|cst)\d+(\.\d+)?$', '', name[len(prefix):])
+            return symbol or None
+    return None
+
+def component_of(object_path: str) -> str:
+    """Componente IDF dal percorso build/esp-idf/<componente>/CMakeFiles/__idf_<componente>.dir/..."""
+    parts = Path(object_path).parts
+    for part in parts:
+        if part.startswith('__idf_') and part.endswith('.dir'):
+            return part[len('__idf_'):-len('.dir')]
+    if 'esp-idf' in parts:
+        index = parts.index('esp-idf')
+        if index + 1 < len(parts):
+            return parts[index + 1]
+    return Path(object_path).parent.name or '?'
+
+def object_key(object_path: str, archive: str = '') -> Tuple[str, str]:
+    """(componente, nome dell'oggetto): uguale per un .obj della build e per "libx.a(file.c.obj)" della map."""
+    if archive.startswith('lib') and archive.endswith('.a'):
+        return archive[len('lib'):-len('.a')], os.path.basename(object_path)
+    return component_of(object_path), os.path.basename(object_path)
+
+class LinkerPlacement:
+    """
+    Regione effettiva di ogni sezione di input secondo la map del linker, cioè
+    dopo le regole di ldgen (noflash, frammenti .lf) e --gc-sections. Una
+    sezione di un oggetto presente nella map ma assente dalle sue sezioni
+    allocate è stata scartata dal linker.
+    """
+
+    def __init__(self, map_path: str):
+        # mapAnalyzer importa questo modulo: import qui per evitare il ciclo
+        from mapAnalyzer import MapParser
+        self.path = map_path
+        self.regions: Dict[Tuple[str, str, str], str] = {}
+        self.objects = set()
+        with open(map_path, 'r', errors='replace') as f:
+            for region, _, _, input_section, archive, obj, _, _, _ in MapParser().parse(f):
+                key = object_key(obj, archive)
+                self.objects.add(key)
+                self.regions[key + (input_section,)] = region
+
+    def knows(self, object_path: str) -> bool:
+        return object_key(object_path) in self.objects
+
+    def region(self, object_path: str, section: str) -> Optional[str]:
+        return self.regions.get(object_key(object_path) + (section,))
+
+def find_map(build_dir: str) -> Optional[str]:
+    """La map del progetto (<progetto>.map) nella directory di build, se c'è."""
+    try:
+        maps = sorted(name for name in os.listdir(build_dir) if name.endswith('.map'))
+    except OSError:
+        return None
+    return os.path.join(build_dir, maps[0]) if maps else None
+
+class ObjectDump:
+    """Sezioni (objdump -h) e simboli (objdump -t o nm -S) di un file oggetto."""
+
+    def __init__(self, path: str):
+        self.path = path
+        self.sections: Dict[str, Tuple[int, bool]] = {}          # nome -> (dimensione, ALLOC)
+        self.symbols_by_section: Dict[str, List[Tuple[str, int]]] = defaultdict(list)
+        self.nm_symbols: List[Tuple[str, int, str]] = []           # (nome, dimensione, tipo)
+
+    def function_for(self, section: str) -> str:
+        name = section_function(section)
+        if name:
+            return name
+        symbols = self.symbols_by_section.get(section)
+        if symbols:
+            # Il simbolo più grande della sezione (le sezioni .iram1.N contengono una sola funzione)
+            return max(symbols, key=lambda s: s[1])[0]
+        return section
+
+    def uses(self, linker: Optional[LinkerPlacement] = None) -> Iterator[SectionUse]:
+        component = component_of(self.path)
+        mapped = linker is not None and linker.knows(self.path)
+        for section, (size, alloc) in self.sections.items():
+            if not alloc or size == 0:
+                continue
+            placement = classify_section(section)
+            if mapped:
+                region = linker.region(self.path, section)
+                if region is None:
+                    continue   # scartata da --gc-sections
+                kind = placement[1] if placement else 'data'
+                yield SectionUse(self.path, component, section, region, kind, self.function_for(section), size, 'map')
+                continue
+            if placement is None:
+                continue
+            region, kind = placement
+            yield SectionUse(self.path, component, section, region, kind, self.function_for(section), size)
+
+        # Senza tabella delle sezioni (solo nm) si usano i tipi dei simboli
+        if not self.sections:
+            for name, size, symbol_type in self.nm_symbols:
+                placement = {'t': ('FLASH', 'text'), 'd': ('DRAM', 'data'), 'b': ('DRAM', 'bss'),
+                             'r': ('FLASH', 'rodata'), 'c': ('DRAM', 'bss')}.get(symbol_type.lower())
+                if placement:
+                    yield SectionUse(self.path, component, symbol_type, placement[0], placement[1], name, size)
+
+def parse_dump(lines: Iterable[str], default_path: str = '?') -> List[ObjectDump]:
+    """
+    Legge output di objdump -h/-t/-x (anche più file concatenati, come
+    memory_analysis.txt) e di nm -S. Il resto (disassemblato, rilocazioni)
+    viene ignorato.
+    """
+    dumps: List[ObjectDump] = []
+    current: Optional[ObjectDump] = None
+    pending_section: Optional[Tuple[str, int]] = None
+
+    for raw in lines:
+        line = raw.rstrip('\n')
+        if pending_section is not None:
+            name, size = pending_section
+            current.sections[name] = (size, 'ALLOC' in line)
+            pending_section = None
+            continue
+
+        header = FILE_HEADER_RE.match(line)
+        if header:
+            current = ObjectDump(header.group(1))
+            dumps.append(current)
+            continue
+        if current is None:
+            current = ObjectDump(default_path)
+            dumps.append(current)
+
+        section = SECTION_RE.match(line)
+        if section:
+            pending_section = (section.group(1), int(section.group(2), 16))
+            continue
+        symbol = SYMTAB_RE.match(line)
+        if symbol:
+            _, kind, section_name, size, name = symbol.groups()
+            if kind in ('F', 'O'):
+                current.symbols_by_section[section_name].append((name.strip(), int(size, 16)))
+            continue
+        nm = NM_RE.match(line)
+        if nm:
+            _, size, symbol_type, name, _ = nm.groups()
+            current.nm_symbols.append((name, int(size, 16), symbol_type))
+
+    return [dump for dump in dumps if dump.sections or dump.nm_symbols]
+
+def find_objects(build_dir: str) -> List[str]:
+    objects = []
+    for root, _, files in os.walk(build_dir):
+        for name in files:
+            if name.endswith(OBJECT_SUFFIXES):
+                objects.append(os.path.join(root, name))
+    return sorted(objects)
+
+def dump_object(path: str, tool_prefix: str = TOOL_PREFIX) -> ObjectDump:
+    """Esegue objdump -h -t sul file oggetto (il -t dà la sezione di ogni simbolo, nm no)."""
+    result = subprocess.run([f'{tool_prefix}objdump', '-h', '-t', path],
+                            capture_output=True, text=True, check=True)
+    dumps = parse_dump(result.stdout.splitlines(), path)
+    dump = dumps[0] if dumps else ObjectDump(path)
+    dump.path = path
+    return dump
+
+def collect(inputs: List[str], tool_prefix: str = TOOL_PREFIX,
+            linker: Optional[LinkerPlacement] = None) -> List[SectionUse]:
+    uses: List[SectionUse] = []
+    for item in inputs:
+        if os.path.isdir(item):
+            if shutil.which(f'{tool_prefix}objdump') is None:
+                raise FileNotFoundError(f"{tool_prefix}objdump non trovato: eseguire prima espShellEnv.sh")
+            for path in find_objects(item):
+                uses.extend(dump_object(path, tool_prefix).uses(linker))
+        elif item.endswith(OBJECT_SUFFIXES):
+            uses.extend(dump_object(item, tool_prefix).uses(linker))
+        else:
+            with open(item, 'r', errors='replace') as f:
+                for dump in parse_dump(f, item):
+                    uses.extend(dump.uses(linker))
+    return uses
+
+def aggregate(uses: List[SectionUse], region: str, key,
+              kinds: Optional[Iterable[str]] = None) -> List[Tuple[str, int, Dict[str, int]]]:
+    """Somma per chiave (funzione o componente) le sezioni di una regione, ordinate per dimensione."""
+    kinds = set(kinds) if kinds is not None else None
+    totals: Dict[str, Dict[str, int]] = defaultdict(lambda: defaultdict(int))
+    for use in uses:
+        if use.region == region and (kinds is None or use.kind in kinds):
+            totals[key(use)][use.kind] += use.size
+    ranked = [(name, sum(kinds.values()), dict(kinds)) for name, kinds in totals.items()]
+    ranked.sort(key=lambda item: item[1], reverse=True)
+    return ranked
+
+def print_table(title: str, rows: List[Tuple[str, int, Dict[str, int]]], top: int):
+    total = sum(size for _, size, _ in rows) or 1
+    print(f"\n{title} ({len(rows)} entries, {sum(size for _, size, _ in rows)} bytes)")
+    print(f"{'rank':>4} {'bytes':>8} {'share':>6}  {'name':<48} breakdown")
+    for rank, (name, size, kinds) in enumerate(rows[:top], 1):
+        breakdown = ' '.join(f"{kind}={value}" for kind, value in sorted(kinds.items()))
+        print(f"{rank:>4} {size:>8} {size / total:>6.1%}  {name:<48} {breakdown}")
+
+def report(uses: List[SectionUse], top: int = 25, ram_budget: int = RAM_BUDGET,
+           linker: Optional[LinkerPlacement] = None):
+    by_function = lambda use: f"{use.component}:{use.function}"
+    by_component = lambda use: use.component
+
+    region_totals = defaultdict(int)
+    for use in uses:
+        region_totals[use.region] += use.size
+    ram = region_totals['IRAM'] + region_totals['DRAM']
+    objects = {use.object_path for use in uses}
+    estimated = {use.object_path for use in uses if use.placement != 'map'}
+    print(f"Objects: {len(objects)}")
+    if linker is None:
+        print("Placement: ESP-IDF default section rules only. ldgen mappings (noflash, .lf fragments) and "
+              "--gc-sections are not applied; pass --map build/<project>.map for the linked placement")
+    else:
+        print(f"Placement: linker map {linker.path}"
+              + (f" ({len(estimated)} objects not in the map use the default section rules)" if estimated else ""))
+    print('  '.join(f"{region}={size}" for region, size in sorted(region_totals.items())))
+    print(f"IRAM+DRAM: {ram} bytes, {ram / ram_budget:.1%} of {ram_budget // 1024} KB")
+
+    print_table("IRAM consumers by function", aggregate(uses, 'IRAM', by_function), top)
+    print_table("DRAM consumers by symbol", aggregate(uses, 'DRAM', by_function), top)
+    print_table("IRAM by component", aggregate(uses, 'IRAM', by_component), top)
+    print_table("DRAM by component", aggregate(uses, 'DRAM', by_component), top)
+    # Candidati per IRAM_ATTR: le funzioni più grandi rimaste in flash (testo + literal)
+    print_table("Largest flash functions (text + literal)", aggregate(uses, 'FLASH', by_function, ('text', 'literal')), top)
+
+def main():
+    parser = argparse.ArgumentParser(description="IRAM/DRAM usage by function and component from objdump/nm output")
+    parser.add_argument('inputs', nargs='*', default=['build'],
+                        help="build directory, .obj files, or saved objdump -h/-t/-x and nm -S outputs")
+    parser.add_argument('--top', type=int, default=25)
+    parser.add_argument('--ram-budget', type=int, default=RAM_BUDGET, help="RAM budget in bytes")
+    parser.add_argument('--tool-prefix', default=TOOL_PREFIX)
+    parser.add_argument('--map', help="linker map for the real placement (default: the .map in the build directory)")
+    parser.add_argument('--json', help="also write every section use to this file")
+    args = parser.parse_args()
+
+    map_path = args.map or next(filter(None, (find_map(item) for item in args.inputs if os.path.isdir(item))), None)
+    try:
+        linker = LinkerPlacement(map_path) if map_path else None
+        uses = collect(args.inputs, args.tool_prefix, linker)
+    except (FileNotFoundError, subprocess.CalledProcessError) as e:
+        print(f"Errore: {e}")
+        sys.exit(1)
+    if not uses:
+        print("Nessuna sezione trovata")
+        sys.exit(1)
+
+    report(uses, args.top, args.ram_budget, linker)
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump([asdict(use) for use in uses], f, indent=2)
+
+if __name__ == '__main__':
+    main()
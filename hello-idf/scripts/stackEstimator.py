@@ -0,0 +1,356 @@
+#!/usr/bin/env python3
+
+import os
+import re
+import sys
+import glob
+import argparse
+import subprocess
+from collections import defaultdict
+from dataclasses import dataclass, field
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+from objSizeAnalyzer import TOOL_PREFIX
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', '..', 'analyze'))
+from graphCycles import find_cycles
+
+# Margine per il frame salvato dagli interrupt e dal cambio di contesto
+DEFAULT_OVERHEAD = 512
+
+# "he_monitor.c:107:6:taskStatusMonitor	64	static"
+SU_RE = re.compile(r'^(.*?):(\d+):(?:\d+:)?([^\s:]+)\s+(\d+)\s+(\S+)')
+# "400d1234 <taskStatusMonitor>:" / "00000000 <CompileFunction>:"
+FUNCTION_RE = re.compile(r'^[0-9a-fA-F]+ <([^>]+)>:')
+# Chiamate dirette: call8 400d1234 <foo> (xtensa), jal ra,42000100 <foo> (riscv)
+DIRECT_CALL_RE = re.compile(r'\s(?:call(?:0|4|8|12)|jal)\s+(?:ra,\s*)?[0-9a-fA-F]+\s+<([^>+]+)')
+INDIRECT_CALL_RE = re.compile(r'\s(?:callx(?:0|4|8|12)|jalr)\s')
+# Negli oggetti non linkati la destinazione di l32r+callx è nella rilocazione
+ASM_EXPAND_RE = re.compile(r'R_XTENSA_ASM_EXPAND\s+(\S+)')
+TASK_CREATE_RE = re.compile(r'\bxTaskCreate(?:PinnedToCore|Static|StaticPinnedToCore)?\s*\(')
+DEFINE_RE = re.compile(r'^\s*#\s*define\s+(\w+)\s+(.+?)\s*(?://.*|/\*.*)?$', re.M)
+COMMENT_RE = re.compile(r'/\*.*?\*/|//[^\n]*', re.S)
+
+@dataclass
+class FrameInfo:
+    function: str
+    size: int
+    qualifier: str          # static, dynamic, dynamic,bounded
+    location: str
+
+@dataclass
+class TaskEntry:
+    function: str
+    name: str
+    stack_expr: str = ''
+    stack_size: Optional[int] = None
+    location: str = ''
+
+@dataclass
+class StackResult:
+    task: TaskEntry
+    depth: int = 0
+    path: List[str] = field(default_factory=list)
+    recursive: Set[str] = field(default_factory=set)
+    indirect: Set[str] = field(default_factory=set)
+    unknown: Set[str] = field(default_factory=set)
+    dynamic: Set[str] = field(default_factory=set)
+
+def _symbol_name(target: str) -> str:
+    """".text.foo+0x12" o "foo$part$0" -> nome della funzione."""
+    target = target.split('+', 1)[0]
+    for prefix in ('.text.', '.iram1.', '.literal.'):
+        if target.startswith(prefix):
+            target = target[len(prefix):]
+    return target
+
+def load_su_files(paths: Iterable[str]) -> Dict[str, FrameInfo]:
+    """Frame di ogni funzione dai file .su (-fstack-usage); a parità di nome vale il più grande."""
+    frames: Dict[str, FrameInfo] = {}
+    for path in paths:
+        files = glob.glob(os.path.join(path, '**', '*.su'), recursive=True) if os.path.isdir(path) else [path]
+        for su_file in files:
+            with open(su_file, 'r', errors='replace') as f:
+                for line in f:
+                    match = SU_RE.match(line)
+                    if not match:
+                        continue
+                    source, line_no, function, size, qualifier = match.groups()
+                    size = int(size)
+                    if function not in frames or frames[function].size < size:
+                        frames[function] = FrameInfo(function, size, qualifier, f"{os.path.basename(source)}:{line_no}")
+    return frames
+
+class CallGraph:
+    def __init__(self):
+        self.calls: Dict[str, Set[str]] = defaultdict(set)
+        self.indirect: Set[str] = set()       # funzioni con almeno una chiamata indiretta
+
+    def add_call(self, caller: str, callee: str):
+        if callee:
+            self.calls[caller].add(callee)
+
+    def parse_objdump(self, lines: Iterable[str]):
+        """Archi dal disassemblato (objdump -d, con -r per gli oggetti non linkati)."""
+        current = None
+        expanded = False   # l'ultima l32r aveva una rilocazione ASM_EXPAND: la callx è diretta
+        for line in lines:
+            header = FUNCTION_RE.match(line)
+            if header:
+                current = _symbol_name(header.group(1))
+                expanded = False
+                continue
+            if current is None:
+                continue
+            reloc = ASM_EXPAND_RE.search(line)
+            if reloc:
+                self.add_call(current, _symbol_name(reloc.group(1)))
+                expanded = True
+                continue
+            call = DIRECT_CALL_RE.search(line)
+            if call:
+                self.add_call(current, _symbol_name(call.group(1)))
+                continue
+            if INDIRECT_CALL_RE.search(line):
+                if not expanded:
+                    self.indirect.add(current)
+                expanded = False
+
+    def parse_sources(self, sources: List[str], clang_args: List[str]):
+        """Archi dalle CALL_EXPR di libclang (alternativa a objdump, prima della build)."""
+        from clang.cindex import Index, CursorKind
+
+        index = Index.create()
+        function_kinds = (CursorKind.FUNCTION_DECL,)
+        for source in sources:
+            tu = index.parse(source, args=clang_args)
+            stack = [(cursor, None) for cursor in tu.cursor.get_children()]
+            while stack:
+                cursor, current = stack.pop()
+                if cursor.kind in function_kinds and cursor.is_definition():
+                    current = cursor.spelling
+                elif cursor.kind == CursorKind.CALL_EXPR and current:
+                    referenced = cursor.referenced
+                    if referenced is not None and referenced.kind in function_kinds:
+                        self.add_call(current, referenced.spelling)
+                    else:
+                        self.indirect.add(current)
+                stack.extend((child, current) for child in cursor.get_children())
+
+def _split_args(text: str, start: int) -> List[str]:
+    """Argomenti della chiamata che inizia dopo la '(' in posizione start."""
+    args, depth, current = [], 0, []
+    for ch in text[start:]:
+        if ch in '([{':
+            depth += 1
+        elif ch in ')]}':
+            if depth == 0:
+                args.append(''.join(current).strip())
+                return args
+            depth -= 1
+        elif ch == ',' and depth == 0:
+            args.append(''.join(current).strip())
+            current = []
+            continue
+        current.append(ch)
+    return args
+
+def _evaluate(expr: str, symbols: Dict[str, str], depth: int = 0) -> Optional[int]:
+    """Valuta un'espressione intera sostituendo #define e variabili locali note."""
+    if depth > 8:
+        return None
+    def replace(match):
+        name = match.group(0)
+        if name in symbols:
+            value = _evaluate(symbols[name], symbols, depth + 1)
+            if value is not None:
+                return str(value)
+        return name
+    expr = re.sub(r'\b[A-Za-z_]\w*\b', replace, expr)
+    expr = re.sub(r'\b(\d+)[uUlL]+\b', r'\1', expr)
+    if not re.fullmatch(r'[\d\s+\-*/()x]+', expr):
+        return None
+    try:
+        return int(eval(expr.replace('/', '//'), {'__builtins__': {}}, {}))
+    except Exception:
+        return None
+
+def find_task_entries(sources: Iterable[str]) -> List[TaskEntry]:
+    """Funzioni passate a xTaskCreate*, con nome del task e dimensione dello stack quando calcolabile."""
+    contents = {}
+    defines: Dict[str, str] = {}
+    for source in sources:
+        with open(source, 'r', errors='replace') as f:
+            # I commenti diventano solo i loro a capo, così i numeri di riga restano validi
+            contents[source] = COMMENT_RE.sub(lambda m: '\n' * m.group(0).count('\n'), f.read())
+        for name, value in DEFINE_RE.findall(contents[source]):
+            defines[name] = value
+
+    entries = []
+    for source, text in contents.items():
+        if not source.endswith('.c'):
+            continue
+        for match in TASK_CREATE_RE.finditer(text):
+            args = _split_args(text, match.end())
+            if len(args) < 3:
+                continue
+            function = re.sub(r'^\(\w+\)\s*', '', args[0]).lstrip('&').strip()
+            # Variabili locali assegnate prima della chiamata (es. minStackSize = WASM_TASK_SIZE)
+            symbols = dict(defines)
+            for name, value in re.findall(r'\b(\w+)\s*=\s*([^;=]+);', text[:match.start()]):
+                symbols[name] = value
+            line = text.count('\n', 0, match.start()) + 1
+            entries.append(TaskEntry(function, args[1].strip('"'), args[2],
+                                     _evaluate(args[2], symbols), f"{os.path.basename(source)}:{line}"))
+
+    # La stessa funzione può essere creata in più punti (es. con e senza core fisso)
+    unique = {}
+    for entry in entries:
+        unique.setdefault(entry.function, entry)
+    return list(unique.values())
+
+def main_task_entry(sdkconfig: str = 'sdkconfig') -> TaskEntry:
+    """app_main gira nel main task, dimensionato da CONFIG_ESP_MAIN_TASK_STACK_SIZE."""
+    size = None
+    if os.path.exists(sdkconfig):
+        with open(sdkconfig, 'r') as f:
+            match = re.search(r'^CONFIG_ESP_MAIN_TASK_STACK_SIZE=(\d+)', f.read(), re.M)
+            size = int(match.group(1)) if match else None
+    return TaskEntry('app_main', 'main', 'CONFIG_ESP_MAIN_TASK_STACK_SIZE', size, sdkconfig)
+
+class StackEstimator:
+    def __init__(self, frames: Dict[str, FrameInfo], graph: CallGraph):
+        self.frames = frames
+        self.graph = graph
+        self.recursive = self._recursive_functions()
+
+    def _recursive_functions(self) -> Set[str]:
+        """Funzioni in un ciclo del grafo (componenti fortemente connesse cicliche, vedi graphCycles)."""
+        return {member for report in find_cycles(self.graph.calls) for member in report.component}
+
+    def estimate(self, task: TaskEntry) -> StackResult:
+        """
+        Profondità massima dal punto di ingresso: somma dei frame lungo il
+        cammino peggiore. I cicli vengono percorsi una volta sola e segnalati;
+        le funzioni senza .su (librerie precompilate, ROM) contano 0.
+        """
+        result = StackResult(task)
+        memo: Dict[str, Tuple[int, List[str]]] = {}
+        visiting: Set[str] = set()
+
+        # DFS iterativa in post-ordine
+        work = [(task.function, False)]
+        while work:
+            function, done = work.pop()
+            if done:
+                visiting.discard(function)
+                best, best_path = 0, []
+                for callee in self.graph.calls.get(function, ()):
+                    if callee in memo and memo[callee][0] > best:
+                        best, best_path = memo[callee]
+                frame = self.frames.get(function)
+                own = frame.size if frame else 0
+                memo[function] = (own + best, [function] + best_path)
+                continue
+            if function in memo or function in visiting:
+                continue
+            visiting.add(function)
+            if function in self.recursive:
+                result.recursive.add(function)
+            if function in self.graph.indirect:
+                result.indirect.add(function)
+            frame = self.frames.get(function)
+            if frame is None:
+                result.unknown.add(function)
+            elif frame.qualifier.startswith('dynamic'):
+                result.dynamic.add(function)
+            work.append((function, True))
+            for callee in self.graph.calls.get(function, ()):
+                if callee not in memo and callee not in visiting:
+                    work.append((callee, False))
+
+        result.depth, result.path = memo.get(task.function, (0, []))
+        return result
+
+def report(results: List[StackResult], frames: Dict[str, FrameInfo], overhead: int):
+    print(f"{'task':<22} {'entry':<28} {'worst':>7} {'+ovh':>7} {'alloc':>7} {'spare':>7}  flags")
+    reclaim = 0
+    for r in sorted(results, key=lambda r: r.depth, reverse=True):
+        needed = r.depth + overhead
+        alloc = r.task.stack_size
+        spare = alloc - needed if alloc is not None else None
+        flags = []
+        if r.recursive:
+            flags.append(f"recursion({len(r.recursive)})")
+        if r.indirect:
+            flags.append(f"indirect({len(r.indirect)})")
+        if r.dynamic:
+            flags.append(f"dynamic({len(r.dynamic)})")
+        if r.unknown:
+            flags.append(f"no-su({len(r.unknown)})")
+        # Funzioni senza .su valgono 0 byte nel percorso peggiore (tipico di newlib/printf):
+        # lo spare di quei task non è affidabile e resta fuori dal totale
+        if spare is not None and spare > 0 and r.task.function in frames \
+                and not (r.recursive or r.indirect or r.dynamic or r.unknown):
+            reclaim += spare
+        print(f"{r.task.name:<22} {r.task.function:<28} {r.depth:>7} {needed:>7} "
+              f"{alloc if alloc is not None else '?':>7} {spare if spare is not None else '?':>7}  {' '.join(flags)}")
+
+    print(f"\nReclaimable (fully measured tasks only: no recursion/indirect/dynamic/no-su frames): {reclaim} bytes")
+    for r in results:
+        print(f"\n{r.task.name} ({r.task.function}, created at {r.task.location}, stack {r.task.stack_expr})")
+        chain = ' -> '.join(f"{f}[{frames[f].size if f in frames else '?'}]" for f in r.path)
+        print(f"  worst path: {chain}")
+        for label, names in (('recursive', r.recursive), ('indirect calls in', r.indirect), ('dynamic frame', r.dynamic)):
+            if names:
+                print(f"  {label}: {', '.join(sorted(names))}")
+        unknown = sorted(n for n in r.unknown if n not in frames)
+        if unknown:
+            print(f"  without .su: {', '.join(unknown[:15])}{' ...' if len(unknown) > 15 else ''}")
+
+def main():
+    parser = argparse.ArgumentParser(description="Worst-case FreeRTOS task stack from .su files and a call graph")
+    parser.add_argument('--su', action='append', help=".su files or directories (default: build and *.su)")
+    parser.add_argument('--objdump', action='append', default=[], help="saved objdump -d [-r] output")
+    parser.add_argument('--elf', help="run objdump -d on this ELF (e.g. build/hello-idf.elf)")
+    parser.add_argument('--clang', action='store_true', help="build the call graph from the sources with libclang")
+    parser.add_argument('--clang-arg', action='append', default=[], help="extra libclang argument (-I, -D)")
+    parser.add_argument('--sources', default='main', help="directory with the sources creating the tasks")
+    parser.add_argument('--entry', action='append', default=[], help="extra entry point (function[=stack bytes])")
+    parser.add_argument('--overhead', type=int, default=DEFAULT_OVERHEAD,
+                        help="bytes added for interrupt/context frames")
+    parser.add_argument('--sdkconfig', default='sdkconfig')
+    parser.add_argument('--tool-prefix', default=TOOL_PREFIX)
+    args = parser.parse_args()
+
+    frames = load_su_files(args.su or ['build'] + glob.glob('*.su'))
+    if not frames:
+        print("Nessun file .su con dati: compilare con -fstack-usage (vedi espShellEnv.sh)")
+        sys.exit(1)
+
+    sources = sorted(glob.glob(os.path.join(args.sources, '*.[ch]')))
+    graph = CallGraph()
+    for path in args.objdump:
+        with open(path, 'r', errors='replace') as f:
+            graph.parse_objdump(f)
+    if args.elf:
+        result = subprocess.run([f'{args.tool_prefix}objdump', '-d', args.elf], capture_output=True, text=True, check=True)
+        graph.parse_objdump(result.stdout.splitlines())
+    if args.clang:
+        graph.parse_sources([s for s in sources if s.endswith('.c')], args.clang_arg)
+    if not graph.calls:
+        print("Grafo delle chiamate vuoto: usare --elf, --objdump o --clang")
+        sys.exit(1)
+
+    tasks = find_task_entries(sources)
+    if 'app_main' in graph.calls:
+        tasks.append(main_task_entry(args.sdkconfig))
+    for entry in args.entry:
+        function, _, size = entry.partition('=')
+        tasks.append(TaskEntry(function, function, size, int(size) if size else None, 'command line'))
+
+    estimator = StackEstimator(frames, graph)
+    report([estimator.estimate(task) for task in tasks], frames, args.overhead)
+
+if __name__ == '__main__':
+    main()
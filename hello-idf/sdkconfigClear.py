@@ -1,19 +1,37 @@
+from pathlib import Path
+
+from sdkconfigProfile import SdkConfig, ProfileEngine, load_kconfig, strip_prefix, SDKCONFIG_UNSET_RE
+
 if __name__ == '__main__':
     filename = 'sdkconfig'
-    
+
     try:
         # Leggi tutto il contenuto
         with open(filename, 'r') as f:
             lines = f.readlines()
-        
+
+        # Una riga "is not set" si può togliere solo se il default Kconfig è già 'n'
+        # (o se il simbolo è in un choice): altrimenti si riattiverebbe da solo
+        sdkconfig = SdkConfig(filename)
+        tree = load_kconfig(Path.cwd(), target=sdkconfig.target)
+        engine = ProfileEngine(tree, sdkconfig)
+        removed = kept = 0
+
         # Scrivi il contenuto filtrato
         with open(filename, 'w') as f:
             for line in lines:
-                if not (line.startswith('# CONFIG_') and line.endswith('is not set\n')):
-                    f.write(line)
-        
-        print("File sdkconfig pulito con successo")
+                match = SDKCONFIG_UNSET_RE.match(line.rstrip('\n'))
+                if match:
+                    symbol = tree.symbols.get(strip_prefix(match.group(1)))
+                    if symbol is not None and (symbol.choice is not None or
+                                               engine.default_value(symbol, sdkconfig.values) == 'n'):
+                        removed += 1
+                        continue
+                    kept += 1
+                f.write(line)
+
+        print(f"File sdkconfig pulito con successo ({removed} righe rimosse, {kept} mantenute)")
     except FileNotFoundError:
         print(f"Errore: Il file {filename} non è stato trovato")
     except Exception as e:
-        print(f"Si è verificato un errore: {str(e)}")
\ No newline at end of file
+        print(f"Si è verificato un errore: {str(e)}")
@@ -0,0 +1,1336 @@
+#!/usr/bin/env python3
+"""
+Profili di configurazione per sdkconfig basati su Kconfig.
+
+Legge l'albero Kconfig del progetto (kconfigs_projbuild.in, kconfigs.in e i
+Kconfig dei componenti che referenziano) e applica profili nominati (debug,
+perf, size) risolvendo dipendenze, select e gruppi choice come farebbe
+menuconfig. Stato iniziale e finale vengono risolti con le stesse regole, così
+il report contiene solo gli effetti del profilo.
+
+Se ESP-IDF non è raggiungibile (IDF_PATH assente e percorsi di kconfigs.in non
+validi) si usa FALLBACK_KCONFIG, che descrive solo i simboli toccati dai profili.
+"""
+
+import os
+import re
+import sys
+import glob
+import argparse
+from dataclasses import dataclass, field
+from functools import lru_cache
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+PROJECT_DIR = Path(__file__).resolve().parent
+CONFIG_PREFIX = 'CONFIG_'
+DEPRECATED_MARKER = '# Deprecated options for backward compatibility'
+MAX_RESOLVE_PASSES = 32
+MAX_DEPENDENCY_ROUNDS = 4
+BOOL_TYPES = ('bool', 'tristate')
+
+# Valori senza prefisso CONFIG_. Un membro di choice a 'y' deseleziona gli altri.
+PROFILES: Dict[str, Dict[str, str]] = {
+    'debug': {
+        'COMPILER_OPTIMIZATION_DEBUG': 'y',
+        'COMPILER_OPTIMIZATION_ASSERTIONS_ENABLE': 'y',
+        'COMPILER_STACK_CHECK_MODE_STRONG': 'y',
+        'COMPILER_WARN_WRITE_STRINGS': 'n',
+        'ESP_SYSTEM_PANIC_GDBSTUB': 'y',
+        'ESP_TASK_WDT_EN': 'y',
+        'ESP_TASK_WDT_PANIC': 'y',
+        'ESP_TASK_WDT_TIMEOUT_S': '5',
+        'ESP_TASK_WDT_CHECK_IDLE_TASK_CPU0': 'n',
+        'ESP_TASK_WDT_CHECK_IDLE_TASK_CPU1': 'n',
+        'ESP_INT_WDT': 'n',
+        'ESP_SYSTEM_EVENT_QUEUE_SIZE': '32',
+        'ESP_SYSTEM_EVENT_TASK_STACK_SIZE': '4096',
+        'ESP_MAIN_TASK_STACK_SIZE': '8192',
+        'ESP_COREDUMP_ENABLE_TO_FLASH': 'y',
+        'LOG_DEFAULT_LEVEL_DEBUG': 'y',
+        'LOG_COLORS': 'y',
+        'HEAP_POISONING_COMPREHENSIVE': 'y',
+        'HEAP_TRACING_STANDALONE': 'y',
+        'HEAP_ABORT_WHEN_ALLOCATION_FAILS': 'n',
+        'FREERTOS_CHECK_STACKOVERFLOW_CANARY': 'y',
+        'FREERTOS_WATCHPOINT_END_OF_STACK': 'y',
+        # Il gdbstub non convive con la protezione della memoria bloccata
+        'ESP_SYSTEM_MEMPROT_FEATURE': 'n',
+    },
+    'perf': {
+        'COMPILER_OPTIMIZATION_PERF': 'y',
+        'COMPILER_OPTIMIZATION_ASSERTIONS_SILENT': 'y',
+        'COMPILER_STACK_CHECK_MODE_NONE': 'y',
+        'ESP_DEFAULT_CPU_FREQ_MHZ_240': 'y',
+        'HEAP_POISONING_DISABLED': 'y',
+        'HEAP_TRACING_OFF': 'y',
+        'HEAP_TASK_TRACKING': 'n',
+        'APPTRACE_DEST_NONE': 'y',
+        'FREERTOS_USE_TRACE_FACILITY': 'n',
+        'FREERTOS_GENERATE_RUN_TIME_STATS': 'n',
+        'FREERTOS_WATCHPOINT_END_OF_STACK': 'n',
+        'FREERTOS_CHECK_STACKOVERFLOW_PTRVAL': 'y',
+        'FREERTOS_PLACE_FUNCTIONS_INTO_FLASH': 'n',
+        'LOG_DEFAULT_LEVEL_WARN': 'y',
+        # Cache: su ESP32 la dimensione è fissa, conta la frequenza della flash
+        # che la riempie; su S2/S3 si scelgono le cache più grandi.
+        'ESPTOOLPY_FLASHFREQ_80M': 'y',
+        'ESP32S2_INSTRUCTION_CACHE_16KB': 'y',
+        'ESP32S2_DATA_CACHE_16KB': 'y',
+        'ESP32S3_INSTRUCTION_CACHE_32KB': 'y',
+        'ESP32S3_DATA_CACHE_64KB': 'y',
+        'ESP32S3_DATA_CACHE_LINE_64B': 'y',
+    },
+    'size': {
+        'COMPILER_OPTIMIZATION_SIZE': 'y',
+        'COMPILER_OPTIMIZATION_ASSERTIONS_SILENT': 'y',
+        'COMPILER_STACK_CHECK_MODE_NONE': 'y',
+        'HEAP_POISONING_DISABLED': 'y',
+        'HEAP_TRACING_OFF': 'y',
+        'APPTRACE_DEST_NONE': 'y',
+        'FREERTOS_USE_TRACE_FACILITY': 'n',
+        'FREERTOS_PLACE_FUNCTIONS_INTO_FLASH': 'y',
+        'LOG_DEFAULT_LEVEL_ERROR': 'y',
+        'NEWLIB_NANO_FORMAT': 'y',
+        'ESP_ERR_TO_NAME_LOOKUP': 'n',
+    },
+}
+
+PROFILE_DESCRIPTIONS = {
+    'debug': 'Og, heap poisoning completo, stack canary, gdbstub e core dump',
+    'perf': 'O2, 240 MHz, niente poisoning/tracing, cache e flash più veloci',
+    'size': 'Os, log ridotti, newlib nano, codice FreeRTOS in flash',
+}
+
+# Sottoinsieme dei Kconfig di ESP-IDF 5.x usato quando l'albero reale non è disponibile
+FALLBACK_KCONFIG = r'''
+menu "Compiler options"
+    choice COMPILER_OPTIMIZATION
+        prompt "Optimization Level"
+        default COMPILER_OPTIMIZATION_DEBUG
+        config COMPILER_OPTIMIZATION_DEBUG
+            bool "Debug (-Og)"
+        config COMPILER_OPTIMIZATION_SIZE
+            bool "Optimize for size (-Os)"
+        config COMPILER_OPTIMIZATION_PERF
+            bool "Optimize for performance (-O2)"
+        config COMPILER_OPTIMIZATION_NONE
+            bool "Debug without optimization (-O0)"
+    endchoice
+
+    choice COMPILER_OPTIMIZATION_ASSERTION_LEVEL
+        prompt "Assertion level"
+        default COMPILER_OPTIMIZATION_ASSERTIONS_ENABLE
+        config COMPILER_OPTIMIZATION_ASSERTIONS_ENABLE
+            bool "Enabled"
+        config COMPILER_OPTIMIZATION_ASSERTIONS_SILENT
+            bool "Silent (saves code size)"
+        config COMPILER_OPTIMIZATION_ASSERTIONS_DISABLE
+            bool "Disabled (sets -DNDEBUG)"
+    endchoice
+
+    config COMPILER_OPTIMIZATION_ASSERTION_LEVEL
+        int
+        default 0 if COMPILER_OPTIMIZATION_ASSERTIONS_DISABLE
+        default 1 if COMPILER_OPTIMIZATION_ASSERTIONS_SILENT
+        default 2 if COMPILER_OPTIMIZATION_ASSERTIONS_ENABLE
+
+    choice COMPILER_STACK_CHECK_MODE
+        prompt "Stack smashing protection mode"
+        default COMPILER_STACK_CHECK_MODE_NONE
+        config COMPILER_STACK_CHECK_MODE_NONE
+            bool "None"
+        config COMPILER_STACK_CHECK_MODE_NORM
+            bool "Normal"
+        config COMPILER_STACK_CHECK_MODE_STRONG
+            bool "Strong"
+        config COMPILER_STACK_CHECK_MODE_ALL
+            bool "Overall"
+    endchoice
+
+    config COMPILER_WARN_WRITE_STRINGS
+        bool "Enable -Wwrite-strings warning flag"
+endmenu
+
+menu "Application Level Tracing"
+    choice APPTRACE_DESTINATION1
+        prompt "Data Destination 1"
+        default APPTRACE_DEST_NONE
+        config APPTRACE_DEST_JTAG
+            bool "JTAG"
+            select APPTRACE_ENABLE
+        config APPTRACE_DEST_NONE
+            bool "None"
+    endchoice
+
+    config APPTRACE_ENABLE
+        bool
+        default n
+endmenu
+
+menu "Serial flasher config"
+    choice ESPTOOLPY_FLASHFREQ
+        prompt "Flash SPI speed"
+        default ESPTOOLPY_FLASHFREQ_40M
+        config ESPTOOLPY_FLASHFREQ_80M
+            bool "80 MHz"
+            depends on SOC_MEMSPI_SRC_FREQ_80M_SUPPORTED
+        config ESPTOOLPY_FLASHFREQ_40M
+            bool "40 MHz"
+        config ESPTOOLPY_FLASHFREQ_26M
+            bool "26 MHz"
+        config ESPTOOLPY_FLASHFREQ_20M
+            bool "20 MHz"
+    endchoice
+
+    config ESPTOOLPY_FLASHFREQ
+        string
+        default "80m" if ESPTOOLPY_FLASHFREQ_80M
+        default "40m" if ESPTOOLPY_FLASHFREQ_40M
+        default "26m" if ESPTOOLPY_FLASHFREQ_26M
+        default "20m" if ESPTOOLPY_FLASHFREQ_20M
+endmenu
+
+menu "ESP System Settings"
+    choice ESP_DEFAULT_CPU_FREQ_MHZ
+        prompt "CPU frequency"
+        default ESP_DEFAULT_CPU_FREQ_MHZ_160
+        config ESP_DEFAULT_CPU_FREQ_MHZ_80
+            bool "80 MHz"
+        config ESP_DEFAULT_CPU_FREQ_MHZ_160
+            bool "160 MHz"
+        config ESP_DEFAULT_CPU_FREQ_MHZ_240
+            bool "240 MHz"
+            depends on IDF_TARGET_ESP32 || IDF_TARGET_ESP32S2 || IDF_TARGET_ESP32S3
+    endchoice
+
+    config ESP_DEFAULT_CPU_FREQ_MHZ
+        int
+        default 80 if ESP_DEFAULT_CPU_FREQ_MHZ_80
+        default 160 if ESP_DEFAULT_CPU_FREQ_MHZ_160
+        default 240 if ESP_DEFAULT_CPU_FREQ_MHZ_240
+
+    choice ESP_SYSTEM_PANIC
+        prompt "Panic handler behaviour"
+        default ESP_SYSTEM_PANIC_PRINT_REBOOT
+        config ESP_SYSTEM_PANIC_PRINT_HALT
+            bool "Print registers and halt"
+        config ESP_SYSTEM_PANIC_PRINT_REBOOT
+            bool "Print registers and reboot"
+        config ESP_SYSTEM_PANIC_SILENT_REBOOT
+            bool "Silent reboot"
+        config ESP_SYSTEM_PANIC_GDBSTUB
+            bool "GDBStub on panic"
+    endchoice
+
+    config ESP_SYSTEM_MEMPROT_FEATURE
+        bool "Enable memory protection"
+        depends on SOC_MEMPROT_SUPPORTED
+        default y
+
+    config ESP_INT_WDT
+        bool "Interrupt watchdog"
+        default y
+    config ESP_INT_WDT_TIMEOUT_MS
+        int "Interrupt watchdog timeout (ms)"
+        depends on ESP_INT_WDT
+        range 10 10000
+        default 300
+    config ESP_INT_WDT_CHECK_CPU1
+        bool "Also watch CPU1 tick interrupt"
+        depends on ESP_INT_WDT && !FREERTOS_UNICORE
+        default y
+
+    config ESP_TASK_WDT_EN
+        bool "Enable Task Watchdog Timer"
+        default y
+    config ESP_TASK_WDT_INIT
+        bool "Initialize Task Watchdog Timer on startup"
+        depends on ESP_TASK_WDT_EN
+        default y
+    config ESP_TASK_WDT_PANIC
+        bool "Invoke panic handler on Task Watchdog timeout"
+        depends on ESP_TASK_WDT_INIT
+    config ESP_TASK_WDT_TIMEOUT_S
+        int "Task Watchdog timeout period (seconds)"
+        depends on ESP_TASK_WDT_EN
+        range 1 60
+        default 5
+    config ESP_TASK_WDT_CHECK_IDLE_TASK_CPU0
+        bool "Watch CPU0 Idle Task"
+        depends on ESP_TASK_WDT_INIT
+        default y
+    config ESP_TASK_WDT_CHECK_IDLE_TASK_CPU1
+        bool "Watch CPU1 Idle Task"
+        depends on ESP_TASK_WDT_INIT && !FREERTOS_UNICORE
+        default y
+endmenu
+
+if IDF_TARGET_ESP32S2
+    choice ESP32S2_INSTRUCTION_CACHE_SIZE
+        prompt "Instruction cache size"
+        default ESP32S2_INSTRUCTION_CACHE_8KB
+        config ESP32S2_INSTRUCTION_CACHE_8KB
+            bool "8KB"
+        config ESP32S2_INSTRUCTION_CACHE_16KB
+            bool "16KB"
+    endchoice
+    choice ESP32S2_DATA_CACHE_SIZE
+        prompt "Data cache size"
+        default ESP32S2_DATA_CACHE_0KB
+        config ESP32S2_DATA_CACHE_0KB
+            bool "No DATA CACHE"
+        config ESP32S2_DATA_CACHE_8KB
+            bool "8KB"
+        config ESP32S2_DATA_CACHE_16KB
+            bool "16KB"
+    endchoice
+endif
+
+if IDF_TARGET_ESP32S3
+    choice ESP32S3_INSTRUCTION_CACHE_SIZE
+        prompt "Instruction cache size"
+        default ESP32S3_INSTRUCTION_CACHE_16KB
+        config ESP32S3_INSTRUCTION_CACHE_16KB
+            bool "16KB"
+        config ESP32S3_INSTRUCTION_CACHE_32KB
+            bool "32KB"
+    endchoice
+    config ESP32S3_INSTRUCTION_CACHE_SIZE
+        hex
+        default 0x4000 if ESP32S3_INSTRUCTION_CACHE_16KB
+        default 0x8000 if ESP32S3_INSTRUCTION_CACHE_32KB
+    choice ESP32S3_DATA_CACHE_SIZE
+        prompt "Data cache size"
+        default ESP32S3_DATA_CACHE_32KB
+        config ESP32S3_DATA_CACHE_16KB
+            bool "16KB"
+        config ESP32S3_DATA_CACHE_32KB
+            bool "32KB"
+        config ESP32S3_DATA_CACHE_64KB
+            bool "64KB"
+    endchoice
+    config ESP32S3_DATA_CACHE_SIZE
+        hex
+        default 0x4000 if ESP32S3_DATA_CACHE_16KB
+        default 0x8000 if ESP32S3_DATA_CACHE_32KB
+        default 0x10000 if ESP32S3_DATA_CACHE_64KB
+    choice ESP32S3_DATA_CACHE_LINE_SIZE
+        prompt "Data cache line size"
+        default ESP32S3_DATA_CACHE_LINE_32B
+        config ESP32S3_DATA_CACHE_LINE_16B
+            bool "16 Bytes"
+            depends on ESP32S3_DATA_CACHE_16KB || ESP32S3_DATA_CACHE_32KB
+        config ESP32S3_DATA_CACHE_LINE_32B
+            bool "32 Bytes"
+        config ESP32S3_DATA_CACHE_LINE_64B
+            bool "64 Bytes"
+    endchoice
+endif
+
+menu "Core dump"
+    choice ESP_COREDUMP_TO_FLASH_OR_UART
+        prompt "Data destination"
+        default ESP_COREDUMP_ENABLE_TO_NONE
+        config ESP_COREDUMP_ENABLE_TO_FLASH
+            bool "Flash"
+            select ESP_COREDUMP_ENABLE
+        config ESP_COREDUMP_ENABLE_TO_UART
+            bool "UART"
+            select ESP_COREDUMP_ENABLE
+        config ESP_COREDUMP_ENABLE_TO_NONE
+            bool "None"
+    endchoice
+
+    config ESP_COREDUMP_ENABLE
+        bool
+        default n
+
+    choice ESP_COREDUMP_DATA_FORMAT
+        prompt "Core dump data format"
+        depends on !ESP_COREDUMP_ENABLE_TO_NONE
+        default ESP_COREDUMP_DATA_FORMAT_ELF
+        config ESP_COREDUMP_DATA_FORMAT_BIN
+            bool "Binary format"
+        config ESP_COREDUMP_DATA_FORMAT_ELF
+            bool "ELF format"
+    endchoice
+
+    config ESP_COREDUMP_CHECK_BOOT
+        bool "Check core dump data integrity on boot"
+        depends on ESP_COREDUMP_ENABLE_TO_FLASH
+        default y
+    config ESP_COREDUMP_MAX_TASKS_NUM
+        int "Maximum number of tasks"
+        depends on ESP_COREDUMP_ENABLE
+        default 64
+endmenu
+
+menu "FreeRTOS"
+    choice FREERTOS_CHECK_STACKOVERFLOW
+        prompt "Check for stack overflow"
+        default FREERTOS_CHECK_STACKOVERFLOW_CANARY
+        config FREERTOS_CHECK_STACKOVERFLOW_NONE
+            bool "No checking"
+        config FREERTOS_CHECK_STACKOVERFLOW_PTRVAL
+            bool "Check by stack pointer value (Method 1)"
+        config FREERTOS_CHECK_STACKOVERFLOW_CANARY
+            bool "Check using canary bytes (Method 2)"
+    endchoice
+
+    config FREERTOS_USE_TRACE_FACILITY
+        bool "Enable FreeRTOS trace facility"
+    config FREERTOS_USE_STATS_FORMATTING_FUNCTIONS
+        bool "Enable FreeRTOS stats formatting functions"
+        depends on FREERTOS_USE_TRACE_FACILITY
+    config FREERTOS_GENERATE_RUN_TIME_STATS
+        bool "Enable FreeRTOS to collect run time stats"
+    config FREERTOS_WATCHPOINT_END_OF_STACK
+        bool "Set a debug watchpoint as a stack overflow check"
+    config FREERTOS_PLACE_FUNCTIONS_INTO_FLASH
+        bool "Place FreeRTOS functions into Flash"
+endmenu
+
+menu "Heap memory debugging"
+    choice HEAP_CORRUPTION_DETECTION
+        prompt "Heap corruption detection"
+        default HEAP_POISONING_DISABLED
+        config HEAP_POISONING_DISABLED
+            bool "Basic (no poisoning)"
+        config HEAP_POISONING_LIGHT
+            bool "Light impact"
+        config HEAP_POISONING_COMPREHENSIVE
+            bool "Comprehensive"
+    endchoice
+
+    choice HEAP_TRACING_DEST
+        prompt "Heap tracing"
+        default HEAP_TRACING_OFF
+        config HEAP_TRACING_OFF
+            bool "Disabled"
+        config HEAP_TRACING_STANDALONE
+            bool "Standalone"
+        config HEAP_TRACING_TOHOST
+            bool "Host-based"
+            depends on APPTRACE_ENABLE
+    endchoice
+
+    config HEAP_TRACING
+        bool
+        default y if HEAP_TRACING_STANDALONE || HEAP_TRACING_TOHOST
+    config HEAP_TRACING_STACK_DEPTH
+        int "Heap tracing stack depth"
+        range 0 32
+        default 2
+        depends on HEAP_TRACING
+    config HEAP_TASK_TRACKING
+        bool "Enable heap task tracking"
+        depends on !HEAP_POISONING_DISABLED
+    config HEAP_ABORT_WHEN_ALLOCATION_FAILS
+        bool "Abort if memory allocation fails"
+endmenu
+
+menu "Log output"
+    choice LOG_DEFAULT_LEVEL
+        prompt "Default log verbosity"
+        default LOG_DEFAULT_LEVEL_INFO
+        config LOG_DEFAULT_LEVEL_NONE
+            bool "No output"
+        config LOG_DEFAULT_LEVEL_ERROR
+            bool "Error"
+        config LOG_DEFAULT_LEVEL_WARN
+            bool "Warning"
+        config LOG_DEFAULT_LEVEL_INFO
+            bool "Info"
+        config LOG_DEFAULT_LEVEL_DEBUG
+            bool "Debug"
+        config LOG_DEFAULT_LEVEL_VERBOSE
+            bool "Verbose"
+    endchoice
+
+    config LOG_DEFAULT_LEVEL
+        int
+        default 0 if LOG_DEFAULT_LEVEL_NONE
+        default 1 if LOG_DEFAULT_LEVEL_ERROR
+        default 2 if LOG_DEFAULT_LEVEL_WARN
+        default 3 if LOG_DEFAULT_LEVEL_INFO
+        default 4 if LOG_DEFAULT_LEVEL_DEBUG
+        default 5 if LOG_DEFAULT_LEVEL_VERBOSE
+
+    choice LOG_MAXIMUM_LEVEL
+        prompt "Maximum log verbosity"
+        default LOG_MAXIMUM_EQUALS_DEFAULT
+        config LOG_MAXIMUM_EQUALS_DEFAULT
+            bool "Same as default"
+        config LOG_MAXIMUM_LEVEL_ERROR
+            bool "Error"
+            depends on LOG_DEFAULT_LEVEL < 1
+        config LOG_MAXIMUM_LEVEL_WARN
+            bool "Warning"
+            depends on LOG_DEFAULT_LEVEL < 2
+        config LOG_MAXIMUM_LEVEL_INFO
+            bool "Info"
+            depends on LOG_DEFAULT_LEVEL < 3
+        config LOG_MAXIMUM_LEVEL_DEBUG
+            bool "Debug"
+            depends on LOG_DEFAULT_LEVEL < 4
+        config LOG_MAXIMUM_LEVEL_VERBOSE
+            bool "Verbose"
+            depends on LOG_DEFAULT_LEVEL < 5
+    endchoice
+
+    config LOG_MAXIMUM_LEVEL
+        int
+        default LOG_DEFAULT_LEVEL if LOG_MAXIMUM_EQUALS_DEFAULT
+        default 1 if LOG_MAXIMUM_LEVEL_ERROR
+        default 2 if LOG_MAXIMUM_LEVEL_WARN
+        default 3 if LOG_MAXIMUM_LEVEL_INFO
+        default 4 if LOG_MAXIMUM_LEVEL_DEBUG
+        default 5 if LOG_MAXIMUM_LEVEL_VERBOSE
+
+    config LOG_COLORS
+        bool "Use ANSI terminal colors in log output"
+endmenu
+
+menu "Newlib"
+    config NEWLIB_NANO_FORMAT
+        bool "Enable 'nano' formatting options for printf/scanf family"
+endmenu
+
+config ESP_ERR_TO_NAME_LOOKUP
+    bool "Enable lookup of error code strings"
+    default y
+'''
+
+# Stesso formato dei file sdkconfig.rename di ESP-IDF (vecchio nuovo, '!' = invertito)
+FALLBACK_RENAMES = '''
+CONFIG_OPTIMIZATION_LEVEL_DEBUG              CONFIG_COMPILER_OPTIMIZATION_DEBUG
+CONFIG_COMPILER_OPTIMIZATION_LEVEL_DEBUG     CONFIG_COMPILER_OPTIMIZATION_DEBUG
+CONFIG_COMPILER_OPTIMIZATION_DEFAULT         CONFIG_COMPILER_OPTIMIZATION_DEBUG
+CONFIG_OPTIMIZATION_LEVEL_RELEASE            CONFIG_COMPILER_OPTIMIZATION_SIZE
+CONFIG_COMPILER_OPTIMIZATION_LEVEL_RELEASE   CONFIG_COMPILER_OPTIMIZATION_SIZE
+CONFIG_OPTIMIZATION_ASSERTIONS_ENABLED       CONFIG_COMPILER_OPTIMIZATION_ASSERTIONS_ENABLE
+CONFIG_OPTIMIZATION_ASSERTIONS_SILENT        CONFIG_COMPILER_OPTIMIZATION_ASSERTIONS_SILENT
+CONFIG_OPTIMIZATION_ASSERTIONS_DISABLED      CONFIG_COMPILER_OPTIMIZATION_ASSERTIONS_DISABLE
+CONFIG_OPTIMIZATION_ASSERTION_LEVEL          CONFIG_COMPILER_OPTIMIZATION_ASSERTION_LEVEL
+CONFIG_STACK_CHECK_NONE                      CONFIG_COMPILER_STACK_CHECK_MODE_NONE
+CONFIG_STACK_CHECK_NORM                      CONFIG_COMPILER_STACK_CHECK_MODE_NORM
+CONFIG_STACK_CHECK_STRONG                    CONFIG_COMPILER_STACK_CHECK_MODE_STRONG
+CONFIG_STACK_CHECK_ALL                       CONFIG_COMPILER_STACK_CHECK_MODE_ALL
+CONFIG_ESP32_APPTRACE_DEST_TRAX              CONFIG_APPTRACE_DEST_JTAG
+CONFIG_ESP32_APPTRACE_DEST_NONE              CONFIG_APPTRACE_DEST_NONE
+CONFIG_ESP32_APPTRACE_ENABLE                 CONFIG_APPTRACE_ENABLE
+CONFIG_ESP32_DEFAULT_CPU_FREQ_80             CONFIG_ESP_DEFAULT_CPU_FREQ_MHZ_80
+CONFIG_ESP32_DEFAULT_CPU_FREQ_160            CONFIG_ESP_DEFAULT_CPU_FREQ_MHZ_160
+CONFIG_ESP32_DEFAULT_CPU_FREQ_240            CONFIG_ESP_DEFAULT_CPU_FREQ_MHZ_240
+CONFIG_ESP32_DEFAULT_CPU_FREQ_MHZ            CONFIG_ESP_DEFAULT_CPU_FREQ_MHZ
+CONFIG_ESP32_PANIC_PRINT_HALT                CONFIG_ESP_SYSTEM_PANIC_PRINT_HALT
+CONFIG_ESP32_PANIC_PRINT_REBOOT              CONFIG_ESP_SYSTEM_PANIC_PRINT_REBOOT
+CONFIG_ESP32_PANIC_SILENT_REBOOT             CONFIG_ESP_SYSTEM_PANIC_SILENT_REBOOT
+CONFIG_ESP32_PANIC_GDBSTUB                   CONFIG_ESP_SYSTEM_PANIC_GDBSTUB
+CONFIG_ESP32_ENABLE_COREDUMP_TO_FLASH        CONFIG_ESP_COREDUMP_ENABLE_TO_FLASH
+CONFIG_ESP32_ENABLE_COREDUMP_TO_UART         CONFIG_ESP_COREDUMP_ENABLE_TO_UART
+CONFIG_ESP32_ENABLE_COREDUMP_TO_NONE         CONFIG_ESP_COREDUMP_ENABLE_TO_NONE
+CONFIG_SYSTEM_EVENT_QUEUE_SIZE               CONFIG_ESP_SYSTEM_EVENT_QUEUE_SIZE
+CONFIG_SYSTEM_EVENT_TASK_STACK_SIZE          CONFIG_ESP_SYSTEM_EVENT_TASK_STACK_SIZE
+CONFIG_MAIN_TASK_STACK_SIZE                  CONFIG_ESP_MAIN_TASK_STACK_SIZE
+CONFIG_INT_WDT                               CONFIG_ESP_INT_WDT
+CONFIG_INT_WDT_TIMEOUT_MS                    CONFIG_ESP_INT_WDT_TIMEOUT_MS
+CONFIG_INT_WDT_CHECK_CPU1                    CONFIG_ESP_INT_WDT_CHECK_CPU1
+CONFIG_TASK_WDT                              CONFIG_ESP_TASK_WDT_INIT
+CONFIG_ESP_TASK_WDT                          CONFIG_ESP_TASK_WDT_INIT
+CONFIG_TASK_WDT_PANIC                        CONFIG_ESP_TASK_WDT_PANIC
+CONFIG_TASK_WDT_TIMEOUT_S                    CONFIG_ESP_TASK_WDT_TIMEOUT_S
+CONFIG_TASK_WDT_CHECK_IDLE_TASK_CPU0         CONFIG_ESP_TASK_WDT_CHECK_IDLE_TASK_CPU0
+CONFIG_TASK_WDT_CHECK_IDLE_TASK_CPU1         CONFIG_ESP_TASK_WDT_CHECK_IDLE_TASK_CPU1
+'''
+
+TOKEN_RE = re.compile(r'\s*(&&|\|\||!=|<=|>=|[!=()<>]|"(?:[^"\\]|\\.)*"|\'[^\']*\'|[^\s!=()<>&|"\']+)')
+ENV_RE = re.compile(r'\$\(?(\w+)\)?')
+SDKCONFIG_SET_RE = re.compile(r'^(CONFIG_\w+)=(.*)$')
+SDKCONFIG_UNSET_RE = re.compile(r'^# (CONFIG_\w+) is not set$')
+SOURCE_KEYWORDS = {'source': (False, False), 'rsource': (True, False),
+                   'osource': (False, True), 'orsource': (True, True)}
+
+
+@dataclass
+class Symbol:
+    """Un simbolo Kconfig; le definizioni multiple vengono fuse come fa kconfiglib."""
+    name: str
+    type: str = 'unknown'
+    # Una lista di dipendenze per ogni definizione: visibile se una è soddisfatta
+    conditions: List[List[str]] = field(default_factory=list)
+    prompts: List[Optional[str]] = field(default_factory=list)
+    defaults: List[Tuple[str, Optional[str]]] = field(default_factory=list)
+    ranges: List[Tuple[str, str, Optional[str]]] = field(default_factory=list)
+    choice: Optional['Choice'] = None
+
+
+@dataclass
+class Choice:
+    name: str
+    depends: List[str] = field(default_factory=list)
+    defaults: List[Tuple[str, Optional[str]]] = field(default_factory=list)
+    members: List[str] = field(default_factory=list)
+
+
+@dataclass
+class Change:
+    name: str
+    before: Optional[str]
+    after: Optional[str]
+    reason: str
+
+
+def strip_prefix(name: str) -> str:
+    return name[len(CONFIG_PREFIX):] if name.startswith(CONFIG_PREFIX) else name
+
+
+def unquote(value: str) -> str:
+    if len(value) >= 2 and value[0] == value[-1] and value[0] in '"\'':
+        return value[1:-1]
+    return value
+
+
+def split_condition(text: str) -> Tuple[str, Optional[str]]:
+    """Separa 'valore if condizione' ignorando gli 'if' dentro le stringhe."""
+    in_quote = None
+    for i, char in enumerate(text):
+        if in_quote:
+            in_quote = None if char == in_quote else in_quote
+        elif char in '"\'':
+            in_quote = char
+        elif text.startswith(' if ', i):
+            return text[:i].strip(), text[i + 4:].strip()
+    return text.strip(), None
+
+
+def strip_comment(line: str) -> str:
+    in_quote = None
+    for i, char in enumerate(line):
+        if in_quote:
+            in_quote = None if char == in_quote else in_quote
+        elif char in '"\'':
+            in_quote = char
+        elif char == '#':
+            return line[:i]
+    return line
+
+
+@lru_cache(maxsize=None)
+def parse_expression(text: str):
+    """
+    Albero di un'espressione Kconfig: ('sym', nome), ('not', e), ('and', a, b),
+    ('or', a, b), ('cmp', op, a, b). Precedenza: || < && < ! < confronti.
+    """
+    tokens = TOKEN_RE.findall(text)
+    pos = 0
+
+    def peek():
+        return tokens[pos] if pos < len(tokens) else None
+
+    def take():
+        nonlocal pos
+        pos += 1
+        return tokens[pos - 1]
+
+    def parse_or():
+        node = parse_and()
+        while peek() == '||':
+            take()
+            node = ('or', node, parse_and())
+        return node
+
+    def parse_and():
+        node = parse_not()
+        while peek() == '&&':
+            take()
+            node = ('and', node, parse_not())
+        return node
+
+    def parse_not():
+        if peek() == '!':
+            take()
+            return ('not', parse_not())
+        return parse_comparison()
+
+    def parse_comparison():
+        node = parse_primary()
+        if peek() in ('=', '!=', '<', '>', '<=', '>='):
+            op = take()
+            node = ('cmp', op, node, parse_primary())
+        return node
+
+    def parse_primary():
+        token = take() if peek() is not None else 'n'
+        if token == '(':
+            node = parse_or()
+            if peek() == ')':
+                take()
+            return node
+        return ('sym', token)
+
+    return parse_or()
+
+
+class KconfigTree:
+    """Simboli e choice letti da un albero di file Kconfig."""
+
+    def __init__(self, env: Dict[str, str], roots: List[Path]):
+        self.env = env
+        self.roots = roots
+        self.symbols: Dict[str, Symbol] = {}
+        self.choices: List[Choice] = []
+        self.selected_by: Dict[str, List[Tuple[str, Optional[str]]]] = {}
+        self.files: List[Path] = []
+        self.missing: List[str] = []
+        self.fallback = False
+
+    def merge_missing(self, other: 'KconfigTree'):
+        """Aggiunge simboli e choice di other non definiti qui (un choice entra solo per intero)."""
+        added = set()
+        for choice in other.choices:
+            if not any(member in self.symbols for member in choice.members):
+                self.choices.append(choice)
+                added.update(choice.members)
+        for name, symbol in other.symbols.items():
+            if name not in self.symbols and (symbol.choice is None or name in added):
+                self.symbols[name] = symbol
+                added.add(name)
+        for target, selectors in other.selected_by.items():
+            for selector, condition in selectors:
+                if selector in added:
+                    self.selected_by.setdefault(target, []).append((selector, condition))
+        self.fallback = self.fallback or bool(added)
+
+    def _symbol(self, name: str) -> Symbol:
+        if name not in self.symbols:
+            self.symbols[name] = Symbol(name)
+        return self.symbols[name]
+
+    def _expand(self, text: str) -> str:
+        return ENV_RE.sub(lambda m: self.env.get(m.group(1), ''), text)
+
+    def _remap(self, path: str) -> Optional[Path]:
+        """Percorsi assoluti di un'altra macchina (kconfigs.in) rimappati su IDF_PATH o sul progetto."""
+        parts = Path(path).parts
+        if 'components' not in parts:
+            return None
+        tail = parts[parts.index('components'):]
+        for root in self.roots:
+            candidate = root.joinpath(*tail)
+            if candidate.exists():
+                return candidate
+        return None
+
+    def _sources(self, raw: str, current: Path, relative: bool, optional: bool) -> List[Path]:
+        path = self._expand(unquote(raw))
+        if relative:
+            path = str(current.parent / path)
+        matches = [Path(p) for p in sorted(glob.glob(path))]
+        if matches:
+            return matches
+        remapped = self._remap(path)
+        if remapped is not None:
+            return [remapped]
+        if not optional:
+            self.missing.append(path)
+        return []
+
+    def parse_file(self, path: Path, inherited: Optional[List[str]] = None):
+        path = Path(path)
+        try:
+            text = path.read_text(encoding='utf-8', errors='replace')
+        except OSError:
+            self.missing.append(str(path))
+            return
+        self.files.append(path)
+        self.parse_text(text, path, inherited)
+
+    def parse_text(self, text: str, path: Path, inherited: Optional[List[str]] = None):
+        # Ogni livello dello stack è la lista delle dipendenze del blocco (if/menu/choice)
+        stack: List[Tuple[str, List[str], Optional[Choice]]] = [('file', list(inherited or []), None)]
+        current = None
+        current_deps: List[str] = []
+        help_indent = None
+        help_base = 0
+
+        lines = text.replace('\\\n', ' ').splitlines()
+        for raw_line in lines:
+            expanded = raw_line.expandtabs(8)
+            indent = len(expanded) - len(expanded.lstrip())
+            if help_indent is not None:
+                if not expanded.strip():
+                    continue
+                if help_indent == -1:
+                    help_indent = indent if indent > help_base else None
+                if help_indent is not None and indent >= help_indent:
+                    continue
+                help_indent = None
+
+            line = strip_comment(raw_line).strip()
+            if not line:
+                continue
+            keyword, _, rest = line.partition(' ')
+            rest = rest.strip()
+
+            if keyword in ('config', 'menuconfig'):
+                current = self._symbol(rest)
+                current_deps = [dep for _, deps, _ in stack for dep in deps]
+                current.conditions.append(current_deps)
+                choice = stack[-1][2]
+                if choice is not None and current.name not in choice.members:
+                    choice.members.append(current.name)
+                    current.choice = choice
+            elif keyword == 'choice':
+                current = Choice(rest or f'<choice {len(self.choices)}>',
+                                 depends=[dep for _, deps, _ in stack for dep in deps])
+                self.choices.append(current)
+                current_deps = []
+                stack.append(('choice', current_deps, current))
+            elif keyword == 'endchoice':
+                while stack and stack[-1][0] != 'choice':
+                    stack.pop()
+                if len(stack) > 1:
+                    stack.pop()
+                current = None
+            elif keyword in ('menu', 'if'):
+                current_deps = [rest] if keyword == 'if' else []
+                stack.append((keyword, current_deps, None))
+                current = 'menu' if keyword == 'menu' else None
+            elif keyword in ('endmenu', 'endif'):
+                opening = 'menu' if keyword == 'endmenu' else 'if'
+                while len(stack) > 1 and stack[-1][0] != opening:
+                    stack.pop()
+                if len(stack) > 1:
+                    stack.pop()
+                current = None
+            elif keyword == 'comment':
+                current = 'comment'
+                current_deps = []
+            elif keyword in SOURCE_KEYWORDS:
+                relative, optional = SOURCE_KEYWORDS[keyword]
+                inherited_deps = [dep for _, deps, _ in stack for dep in deps]
+                for source in self._sources(rest, Path(path), relative, optional):
+                    self.parse_file(source, inherited_deps)
+                current = None
+            elif keyword in ('help', '---help---'):
+                help_indent = -1
+                help_base = indent
+            elif keyword == 'depends' and rest.startswith('on '):
+                dependency = rest[3:].strip()
+                current_deps.append(dependency)
+                if isinstance(current, Choice):
+                    current.depends.append(dependency)
+            elif isinstance(current, Symbol):
+                self._symbol_attribute(current, keyword, rest)
+            elif isinstance(current, Choice) and keyword == 'default':
+                current.defaults.append(split_condition(rest))
+
+    def _symbol_attribute(self, symbol: Symbol, keyword: str, rest: str):
+        if keyword in ('bool', 'tristate', 'int', 'hex', 'string'):
+            symbol.type = keyword
+            if rest:
+                symbol.prompts.append(split_condition(rest)[1])
+        elif keyword in ('def_bool', 'def_tristate'):
+            symbol.type = keyword[4:]
+            symbol.defaults.append(split_condition(rest))
+        elif keyword == 'prompt':
+            symbol.prompts.append(split_condition(rest)[1])
+        elif keyword == 'default':
+            symbol.defaults.append(split_condition(rest))
+        elif keyword == 'select':
+            target, condition = split_condition(rest)
+            self.selected_by.setdefault(target, []).append((symbol.name, condition))
+        elif keyword == 'range':
+            bounds, condition = split_condition(rest)
+            low, _, high = bounds.partition(' ')
+            symbol.ranges.append((low.strip(), high.strip(), condition))
+
+
+class SdkConfig:
+    """Un file sdkconfig: valori correnti (senza prefisso) e righe originali."""
+
+    def __init__(self, path):
+        self.path = Path(path)
+        self.lines: List[str] = []
+        self.values: Dict[str, str] = {}
+        if self.path.exists():
+            with open(self.path, 'r') as f:
+                self.lines = f.read().splitlines()
+        for line in self.lines:
+            if line.startswith(DEPRECATED_MARKER):
+                break
+            name, value = self._parse_line(line)
+            if name:
+                self.values[name] = value
+
+    @staticmethod
+    def _parse_line(line: str) -> Tuple[Optional[str], Optional[str]]:
+        match = SDKCONFIG_SET_RE.match(line)
+        if match:
+            return strip_prefix(match.group(1)), match.group(2)
+        match = SDKCONFIG_UNSET_RE.match(line)
+        if match:
+            return strip_prefix(match.group(1)), 'n'
+        return None, None
+
+    @staticmethod
+    def format_line(name: str, value: str) -> str:
+        if value == 'n':
+            return f'# {CONFIG_PREFIX}{name} is not set'
+        return f'{CONFIG_PREFIX}{name}={value}'
+
+    @property
+    def target(self) -> str:
+        return unquote(self.values.get('IDF_TARGET', '"esp32"'))
+
+    def render(self, updates: Dict[str, Optional[str]],
+               renames: Dict[str, Tuple[str, bool]]) -> List[str]:
+        """
+        Righe aggiornate. I simboli nuovi vanno in fondo alla sezione principale
+        (menuconfig riordina al prossimo build); gli alias deprecati seguono il
+        nuovo nome, altrimenti al caricamento sovrascriverebbero il profilo.
+        """
+        output = []
+        seen = set()
+        in_deprecated = False
+        additions = [self.format_line(name, value) for name, value in updates.items()
+                     if value is not None and name not in self.values]
+
+        for line in self.lines:
+            if line.startswith(DEPRECATED_MARKER):
+                in_deprecated = True
+                insert_at = len(output) - 1 if output and not output[-1].strip() else len(output)
+                output[insert_at:insert_at] = additions
+                additions = []
+            name, _ = self._parse_line(line)
+            if name and not in_deprecated and name in updates:
+                seen.add(name)
+                if updates[name] is None:
+                    continue
+                line = self.format_line(name, updates[name])
+            elif name and in_deprecated and name in renames and renames[name][0] in updates:
+                new_name, inverted = renames[name]
+                value = updates[new_name]
+                if value is None:
+                    continue
+                if inverted and value in ('y', 'n'):
+                    value = 'n' if value == 'y' else 'y'
+                line = self.format_line(name, value)
+            output.append(line)
+        output.extend(additions)
+        return output
+
+    def write(self, updates: Dict[str, Optional[str]], renames: Dict[str, Tuple[str, bool]]):
+        lines = self.render(updates, renames)
+        with open(self.path, 'w') as f:
+            f.write('\n'.join(lines) + '\n')
+
+
+def load_kconfig(project_dir: Path = PROJECT_DIR, idf_path: Optional[str] = None,
+                 target: str = 'esp32') -> KconfigTree:
+    """
+    Albero Kconfig del progetto. Con ESP-IDF disponibile parte dal Kconfig
+    radice (che include kconfigs.in tramite le variabili d'ambiente del build),
+    altrimenti dai soli kconfigs*.in; se nulla è leggibile usa FALLBACK_KCONFIG.
+    """
+    project_dir = Path(project_dir)
+    idf_path = idf_path or os.environ.get('IDF_PATH')
+    env = dict(os.environ)
+    env.update({
+        'IDF_TARGET': target,
+        'IDF_PATH': idf_path or '',
+        'COMPONENT_KCONFIGS_SOURCE_FILE': str(project_dir / 'kconfigs.in'),
+        'COMPONENT_KCONFIGS_PROJBUILD_SOURCE_FILE': str(project_dir / 'kconfigs_projbuild.in'),
+    })
+    roots = [Path(idf_path)] if idf_path else []
+    roots.append(project_dir)
+    tree = KconfigTree(env, roots)
+
+    root_kconfig = Path(idf_path) / 'Kconfig' if idf_path else None
+    if root_kconfig is not None and root_kconfig.exists():
+        tree.parse_file(root_kconfig)
+    else:
+        for name in ('kconfigs_projbuild.in', 'kconfigs.in'):
+            if (project_dir / name).exists():
+                tree.parse_file(project_dir / name)
+
+    if not tree.symbols or tree.missing:
+        fallback = KconfigTree(env, roots)
+        fallback.parse_text(FALLBACK_KCONFIG, Path('<fallback>'))
+        tree.merge_missing(fallback)
+    return tree
+
+
+def parse_renames(text: str) -> Dict[str, Tuple[str, bool]]:
+    renames = {}
+    for line in text.splitlines():
+        line = line.split('#', 1)[0].split()
+        if len(line) != 2:
+            continue
+        old, new = line
+        inverted = new.startswith('!')
+        renames[strip_prefix(old)] = (strip_prefix(new.lstrip('!')), inverted)
+    return renames
+
+
+def load_renames(tree: KconfigTree, target: str) -> Dict[str, Tuple[str, bool]]:
+    """Alias deprecati dai sdkconfig.rename accanto ai Kconfig letti (o FALLBACK_RENAMES)."""
+    renames: Dict[str, Tuple[str, bool]] = {}
+    directories = {path.parent for path in tree.files}
+    for directory in sorted(directories):
+        for name in ('sdkconfig.rename', f'sdkconfig.rename.{target}'):
+            rename_file = directory / name
+            if rename_file.exists():
+                renames.update(parse_renames(rename_file.read_text()))
+    if not renames:
+        renames = parse_renames(FALLBACK_RENAMES)
+    return renames
+
+
+class ProfileEngine:
+    """
+    Applica assegnazioni di profilo a un sdkconfig: propaga choice, select,
+    dipendenze e valori derivati fino a un punto fisso, poi confronta con lo
+    stato iniziale risolto nello stesso modo.
+    """
+
+    def __init__(self, tree: KconfigTree, sdkconfig: SdkConfig):
+        self.tree = tree
+        self.sdkconfig = sdkconfig
+        self.base = dict(sdkconfig.values)
+        self.warnings: List[str] = []
+
+    # --- valutazione -------------------------------------------------------
+
+    def _raw(self, name: str, values: Dict[str, Optional[str]]) -> str:
+        if name in values:
+            value = values[name]
+            if value is None:
+                symbol = self.tree.symbols.get(name)
+                return '' if symbol and symbol.type == 'string' else 'n'
+            return unquote(value)
+        if name in self.tree.symbols:
+            return '' if self.tree.symbols[name].type == 'string' else 'n'
+        # Simbolo costante: y, n, numeri, stringhe tra virgolette
+        return unquote(self.tree._expand(name))
+
+    def _value(self, node, values) -> str:
+        if node[0] == 'sym':
+            return self._raw(node[1], values)
+        return 'y' if self._truth(node, values) else 'n'
+
+    def _truth(self, node, values) -> bool:
+        kind = node[0]
+        if kind == 'sym':
+            return self._raw(node[1], values) in ('y', 'm')
+        if kind == 'not':
+            return not self._truth(node[1], values)
+        if kind == 'and':
+            return self._truth(node[1], values) and self._truth(node[2], values)
+        if kind == 'or':
+            return self._truth(node[1], values) or self._truth(node[2], values)
+        op, left, right = node[1], self._value(node[2], values), self._value(node[3], values)
+        try:
+            left, right = int(left, 0), int(right, 0)
+        except ValueError:
+            pass
+        if op == '=':
+            return left == right
+        if op == '!=':
+            return left != right
+        try:
+            return {'<': left < right, '>': left > right,
+                    '<=': left <= right, '>=': left >= right}[op]
+        except TypeError:
+            return False
+
+    def evaluate(self, expression: Optional[str], values) -> bool:
+        return expression is None or self._truth(parse_expression(expression), values)
+
+    def visible(self, symbol: Symbol, values) -> bool:
+        if symbol.choice is not None and not all(self.evaluate(dep, values) for dep in symbol.choice.depends):
+            return False
+        if not symbol.conditions:
+            return True
+        return any(all(self.evaluate(dep, values) for dep in deps) for deps in symbol.conditions)
+
+    def has_prompt(self, symbol: Symbol, values) -> bool:
+        return any(self.evaluate(condition, values) for condition in symbol.prompts)
+
+    def default_value(self, symbol: Symbol, values) -> Optional[str]:
+        for expression, condition in symbol.defaults:
+            if not self.evaluate(condition, values):
+                continue
+            if symbol.type in BOOL_TYPES:
+                return 'y' if self.evaluate(unquote(expression), values) else 'n'
+            if expression in self.tree.symbols or expression in values:
+                return values.get(expression)
+            value = self.tree._expand(unquote(expression))
+            return f'"{value}"' if symbol.type == 'string' else value
+        return 'n' if symbol.type in BOOL_TYPES else None
+
+    # --- risoluzione ---------------------------------------------------------
+
+    def _resolve_symbol(self, symbol: Symbol, values) -> Tuple[Optional[str], str]:
+        for selector, condition in self.tree.selected_by.get(symbol.name, ()):
+            if values.get(selector) == 'y' and self.evaluate(condition, values):
+                return 'y', f'selected by {selector}'
+        if not self.visible(symbol, values):
+            return None, 'dependencies not met'
+        current = values.get(symbol.name)
+        if symbol.choice is not None:
+            return (current or 'n'), f'choice {symbol.choice.name}'
+        if current is not None and self.has_prompt(symbol, values):
+            return current, 'kept'
+        return self.default_value(symbol, values), 'default'
+
+    def _choice_default(self, choice: Choice, members: List[str], values, requested) -> str:
+        for target, condition in choice.defaults:
+            if target in members and requested.get(target) != 'n' and self.evaluate(condition, values):
+                return target
+        return next((m for m in members if requested.get(m) != 'n'), members[0])
+
+    def _resolve_choices(self, values, requested, reasons) -> bool:
+        changed = False
+        for choice in self.tree.choices:
+            members = [m for m in choice.members if values.get(m) is not None]
+            if not members:
+                continue
+            selected = [m for m in members if values[m] == 'y']
+            if len(selected) == 1:
+                continue
+            wanted = [m for m in selected if requested.get(m) == 'y']
+            pick = wanted[-1] if wanted else (selected[0] if selected else
+                                              self._choice_default(choice, members, values, requested))
+            for member in members:
+                value = 'y' if member == pick else 'n'
+                if values[member] != value:
+                    values[member] = value
+                    reasons[member] = f'choice {choice.name}'
+                    changed = True
+        return changed
+
+    def resolve(self, requested: Dict[str, str], reasons: Dict[str, str]) -> Dict[str, Optional[str]]:
+        values: Dict[str, Optional[str]] = dict(self.base)
+        values.update(requested)
+        for _ in range(MAX_RESOLVE_PASSES):
+            changed = False
+            for name, symbol in self.tree.symbols.items():
+                value, reason = self._resolve_symbol(symbol, values)
+                if value != values.get(name):
+                    values[name] = value
+                    reasons[name] = reason
+                    changed = True
+            changed |= self._resolve_choices(values, requested, reasons)
+            if not changed:
+                break
+        return values
+
+    def _unmet_symbols(self, symbol: Symbol, values) -> Optional[List[str]]:
+        """
+        Simboli bool con prompt da abilitare perché symbol diventi visibile, o
+        None se le dipendenze mancanti non sono una semplice congiunzione.
+        """
+        conditions = list(symbol.conditions[:1])
+        if symbol.choice is not None:
+            conditions.append(symbol.choice.depends)
+        needed = []
+        for deps in conditions:
+            for dep in deps:
+                if self.evaluate(dep, values):
+                    continue
+                stack = [parse_expression(dep)]
+                while stack:
+                    node = stack.pop()
+                    if node[0] == 'and':
+                        stack.extend(node[1:])
+                    elif node[0] == 'sym' and node[1] in self.tree.symbols:
+                        target = self.tree.symbols[node[1]]
+                        if target.type not in BOOL_TYPES or not target.prompts:
+                            return None
+                        if not self._truth(node, values):
+                            needed.append(node[1])
+                    else:
+                        return None
+        return needed
+
+    def _request(self, assignments: Dict[str, Tuple[str, str]]) -> Dict[str, str]:
+        """Valori richiesti, con i fratelli di choice deselezionati."""
+        requested: Dict[str, str] = {}
+        for name, (value, origin) in assignments.items():
+            symbol = self.tree.symbols.get(name)
+            if symbol is None:
+                # Con un albero incompleto i simboli presenti in sdkconfig si scrivono senza verifiche
+                if not (self.tree.fallback or self.tree.missing) or name not in self.base:
+                    self.warnings.append(f'{name}: not defined in Kconfig (target {self.sdkconfig.target}), '
+                                         f'skipped ({origin})')
+                    continue
+            elif symbol.type not in BOOL_TYPES and value in ('y', 'n'):
+                self.warnings.append(f'{name}: {symbol.type} symbol cannot be set to {value}, skipped ({origin})')
+                continue
+            elif symbol.type in ('int', 'hex'):
+                for low, high, condition in symbol.ranges:
+                    try:
+                        in_range = int(low, 0) <= int(value, 0) <= int(high, 0)
+                    except ValueError:
+                        continue
+                    if self.evaluate(condition, self.base) and not in_range:
+                        self.warnings.append(f'{name}={value} outside range [{low}, {high}] ({origin})')
+                        break
+            requested[name] = value
+            # Nello stesso choice vince l'ultimo membro assegnato a 'y'
+            if symbol is not None and symbol.choice is not None and value == 'y':
+                for member in symbol.choice.members:
+                    if member != name:
+                        requested[member] = 'n'
+        return requested
+
+    def _enable_dependencies(self, requested: Dict[str, str],
+                             origins: Dict[str, str]) -> Tuple[Dict[str, Optional[str]], Dict[str, str]]:
+        """
+        Aggiunge a requested i simboli bool che rendono visibili quelli richiesti,
+        al più MAX_DEPENDENCY_ROUNDS volte. Restituisce valori risolti e motivi.
+        """
+        for _ in range(MAX_DEPENDENCY_ROUNDS):
+            reasons: Dict[str, str] = {}
+            values = self.resolve(requested, reasons)
+            added = []
+            for name, value in list(requested.items()):
+                symbol = self.tree.symbols.get(name)
+                if symbol is None or values.get(name) == value or value == 'n':
+                    continue
+                needed = self._unmet_symbols(symbol, values) if not self.visible(symbol, values) else None
+                for dependency in needed or ():
+                    if dependency not in requested:
+                        requested[dependency] = 'y'
+                        origins[dependency] = f'required by {name}'
+                        added.append(dependency)
+            if not added:
+                return values, reasons
+
+        # Le dipendenze dell'ultimo giro vanno comunque risolte prima del diff
+        reasons = {}
+        values = self.resolve(requested, reasons)
+        self.warnings.append(f'dependency chain not settled after {MAX_DEPENDENCY_ROUNDS} rounds, '
+                             f'last enabled: {", ".join(added)}')
+        return values, reasons
+
+    def apply(self, assignments: Dict[str, Tuple[str, str]]) -> List[Change]:
+        """assignments: nome -> (valore, origine). Restituisce il diff effettivo."""
+        baseline = self.resolve({}, {})
+        requested = self._request(assignments)
+        origins = {}
+        for name in requested:
+            symbol = self.tree.symbols.get(name)
+            if name not in assignments and symbol is not None and symbol.choice is not None:
+                origins[name] = f'choice {symbol.choice.name}'
+
+        values, reasons = self._enable_dependencies(requested, origins)
+
+        changes = []
+        for name in sorted(set(values) | set(baseline)):
+            after = values.get(name)
+            if after == self.base.get(name):
+                continue
+            if after == baseline.get(name) and name not in assignments:
+                continue
+            symbol = self.tree.symbols.get(name)
+            if name in assignments and after == assignments[name][0]:
+                reason = assignments[name][1]
+            elif name in requested and after == requested[name]:
+                reason = origins.get(name) or f'choice {symbol.choice.name}'
+            else:
+                reason = reasons.get(name, 'default')
+            changes.append(Change(name, self.base.get(name), after, reason))
+
+        for name, value in requested.items():
+            if name in assignments and (values.get(name) or 'n') != value:
+                symbol = self.tree.symbols.get(name)
+                unmet = [dep for deps in (symbol.conditions[:1] if symbol else []) for dep in deps
+                         if not self.evaluate(dep, values)]
+                detail = f'depends on {" && ".join(unmet)}' if unmet else 'overridden by resolution'
+                self.warnings.append(f'{name}: requested {value}, got {values.get(name) or "(absent)"} ({detail})')
+        return changes
+
+
+def profile_assignments(profiles: List[str]) -> Dict[str, Tuple[str, str]]:
+    """Unione ordinata dei profili; 'NOME=valore' aggiunge un'assegnazione singola."""
+    assignments: Dict[str, Tuple[str, str]] = {}
+    for profile in profiles:
+        if '=' in profile:
+            name, value = profile.split('=', 1)
+            assignments.pop(strip_prefix(name), None)
+            assignments[strip_prefix(name)] = (value, 'command line')
+            continue
+        if profile not in PROFILES:
+            raise ValueError(f"Profilo sconosciuto: {profile} (disponibili: {', '.join(PROFILES)})")
+        for name, value in PROFILES[profile].items():
+            assignments.pop(name, None)
+            assignments[name] = (value, f'profile {profile}')
+    return assignments
+
+
+def apply_profiles(sdkconfig_path, profiles: List[str], idf_path: Optional[str] = None,
+                   dry_run: bool = False) -> Tuple[List[Change], ProfileEngine]:
+    sdkconfig = SdkConfig(sdkconfig_path)
+    tree = load_kconfig(Path(sdkconfig_path).resolve().parent, idf_path, sdkconfig.target)
+    engine = ProfileEngine(tree, sdkconfig)
+    changes = engine.apply(profile_assignments(profiles))
+    if not dry_run and changes:
+        sdkconfig.write({change.name: change.after for change in changes}, load_renames(tree, sdkconfig.target))
+    return changes, engine
+
+
+def print_report(changes: List[Change], engine: ProfileEngine):
+    tree = engine.tree
+    source = f'{len(tree.files)} Kconfig files' + (' + fallback subset' if tree.fallback else '')
+    print(f"\nKconfig: {len(tree.symbols)} symbols, {len(tree.choices)} choices ({source})")
+    if tree.missing:
+        print(f"  {len(tree.missing)} sources not found, e.g. {tree.missing[0]}")
+
+    if not changes:
+        print("\nNo effective changes")
+    else:
+        width = max(len(c.name) for c in changes) + len(CONFIG_PREFIX)
+        print(f"\n{'Symbol':<{width}}  {'Before':>12}  {'After':>12}  Reason")
+        print("-" * (width + 50))
+        for change in changes:
+            before = change.before if change.before is not None else '(absent)'
+            after = change.after if change.after is not None else '(absent)'
+            print(f"{CONFIG_PREFIX + change.name:<{width}}  {before:>12}  {after:>12}  {change.reason}")
+
+    if engine.warnings:
+        print("\nWarnings:")
+        for warning in engine.warnings:
+            print(f"  {warning}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Apply Kconfig-aware profiles to an ESP-IDF sdkconfig')
+    parser.add_argument('profiles', nargs='*',
+                        help='profile names (applied in order) or NAME=value assignments')
+    parser.add_argument('--sdkconfig', default=str(PROJECT_DIR / 'sdkconfig'), help='sdkconfig to update')
+    parser.add_argument('--idf-path', help='ESP-IDF root (default: $IDF_PATH)')
+    parser.add_argument('--dry-run', action='store_true', help='report the diff without writing')
+    parser.add_argument('--list', action='store_true', help='list available profiles')
+    args = parser.parse_args()
+
+    if args.list or not args.profiles:
+        for name, description in PROFILE_DESCRIPTIONS.items():
+            print(f"{name:<8} {description}")
+        return
+
+    try:
+        changes, engine = apply_profiles(args.sdkconfig, args.profiles, args.idf_path, args.dry_run)
+    except ValueError as e:
+        print(e)
+        sys.exit(1)
+    print_report(changes, engine)
+    if changes:
+        print(f"\n{'Anteprima' if args.dry_run else 'Aggiornato'}: {args.sdkconfig} ({len(changes)} modifiche)")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,31 +1,58 @@
 import subprocess
-from clang.cindex import Index, CursorKind, TokenKind, Config
+from clang.cindex import Index, CursorKind, TypeKind, TranslationUnit, Config
 import sys
 import os
+import glob
+import time
 from dataclasses import dataclass
-from typing import List, Dict, Set, Tuple
+from typing import List, Dict, Optional, Set, Tuple
+
+LOOP_KINDS = (CursorKind.FOR_STMT, CursorKind.WHILE_STMT, CursorKind.DO_STMT)
+FUNCTION_KINDS = (CursorKind.FUNCTION_DECL,)
+# Peso stimato di un accesso: ogni livello di loop vale ~10 iterazioni,
+# un handler wasm3 viene eseguito a ogni istruzione wasm
+LOOP_WEIGHT = 10
+OP_HANDLER_WEIGHT = 100
+# Gli unici nodi che possono essere operazioni sui puntatori
+CANDIDATE_KINDS = (CursorKind.VAR_DECL, CursorKind.BINARY_OPERATOR, CursorKind.UNARY_OPERATOR,
+                   CursorKind.MEMBER_REF_EXPR, CursorKind.ARRAY_SUBSCRIPT_EXPR)
+ARRAY_TYPE_KINDS = (TypeKind.CONSTANTARRAY, TypeKind.INCOMPLETEARRAY)
+# Nomi degli operatori esposti dalle binding recenti (clang >= 17)
+OPERATOR_NAMES = {'Assign': '=', 'Deref': '*'}
+
+def _default_libclang() -> bool:
+    """La libclang che le binding trovano da sole (quella inclusa nel pacchetto pip libclang, o di sistema)."""
+    try:
+        Index.create()
+        return True
+    except Exception:
+        return False
+
 
 def setup_libclang() -> bool:
-    """Configura il percorso di libclang per macOS"""
+    """Configura il percorso di libclang per macOS; altrove usa quella delle binding"""
     try:
         brew_prefix = subprocess.check_output(['brew', '--prefix']).decode().strip()
-        possible_paths = [
-            os.path.join(brew_prefix, 'opt/llvm/lib/libclang.dylib'),
-            '/Library/Developer/CommandLineTools/usr/lib/libclang.dylib',
-            '/Applications/Xcode.app/Contents/Developer/Toolchains/XcodeDefault.xctoolchain/usr/lib/libclang.dylib'
-        ]
-        
-        for path in possible_paths:
-            if os.path.exists(path):
-                Config.set_library_file(path)
-                return True
-        
-        print("ERRORE: libclang non trovato. Installa LLVM:")
-        print("brew install llvm")
-        return False
-    except subprocess.CalledProcessError:
-        print("ERRORE: Homebrew non trovato. Installa Homebrew da https://brew.sh")
-        return False
+    except (subprocess.CalledProcessError, FileNotFoundError):
+        brew_prefix = None
+
+    possible_paths = [
+        '/Library/Developer/CommandLineTools/usr/lib/libclang.dylib',
+        '/Applications/Xcode.app/Contents/Developer/Toolchains/XcodeDefault.xctoolchain/usr/lib/libclang.dylib'
+    ]
+    if brew_prefix:
+        possible_paths.insert(0, os.path.join(brew_prefix, 'opt/llvm/lib/libclang.dylib'))
+
+    for path in possible_paths:
+        if os.path.exists(path):
+            Config.set_library_file(path)
+            return True
+
+    if _default_libclang():
+        return True
+
+    print("ERRORE: libclang non trovato. Installa LLVM (brew install llvm) o il pacchetto pip libclang")
+    return False
 
 
 @dataclass
@@ -35,6 +62,15 @@ class PointerOperation:
     name: str
     is_assignment: bool
     source_file: str
+    function: str = ''
+    loop_depth: int = 0
+    in_op_handler: bool = False
+    target: str = ''
+
+    @property
+    def hotness(self) -> int:
+        weight = LOOP_WEIGHT ** self.loop_depth
+        return weight * OP_HANDLER_WEIGHT if self.in_op_handler else weight
 
 
 class SourceFile:
@@ -51,114 +87,212 @@ class SourceFile:
 
 
 class PointerAnalyzer:
-    def __init__(self, print_debug: bool = False):
+    def __init__(self, print_debug: bool = False, clang_args: Optional[List[str]] = None):
         self.print_debug = print_debug
+        self.clang_args = clang_args or ['-x', 'c']
         self.files: Dict[str, SourceFile] = {}
         self.index = Index.create()
+        self.nodes_visited = 0
+        self._completed_files: Set[str] = set()
+        self._sources: Dict[str, bytes] = {}
 
     def debug_print(self, message: str):
         if self.print_debug:
             print(f"[DEBUG] {message}")
 
+    def _source(self, filename: str) -> bytes:
+        if filename not in self._sources:
+            try:
+                with open(filename, 'rb') as f:
+                    self._sources[filename] = f.read()
+            except OSError:
+                self._sources[filename] = b''
+        return self._sources[filename]
+
+    def operator_spelling(self, node) -> str:
+        """
+        Operatore di un UNARY_OPERATOR/BINARY_OPERATOR senza rieseguire il lexer:
+        le binding recenti lo espongono (unary_operator/binary_operator), altrimenti
+        si legge il testo tra gli operandi usando gli offset dell'extent.
+        """
+        attribute = 'binary_operator' if node.kind == CursorKind.BINARY_OPERATOR else 'unary_operator'
+        operator = getattr(node, attribute, None)
+        if operator is not None and getattr(operator, 'name', None):
+            return OPERATOR_NAMES.get(operator.name, operator.name)
+
+        children = list(node.get_children())
+        extent = node.extent
+        if not children or extent.start.file is None:
+            return ''
+        source = self._source(extent.start.file.name)
+        if node.kind == CursorKind.BINARY_OPERATOR and len(children) == 2:
+            start, end = children[0].extent.end.offset, children[1].extent.start.offset
+        else:
+            start, end = extent.start.offset, children[0].extent.start.offset
+            if start == end:   # postfisso: p++ / p--
+                start, end = children[0].extent.end.offset, extent.end.offset
+        return source[start:end].decode('utf-8', errors='replace').strip()
+
+    @staticmethod
+    def is_pointer_type(type_) -> bool:
+        return type_.get_canonical().kind == TypeKind.POINTER
+
     def is_pointer_assignment(self, node) -> bool:
-        try:
-            # Check for pointer declaration with assignment
-            if node.kind == CursorKind.VAR_DECL:
-                type_str = node.type.spelling
-                return '*' in type_str and any(c.kind == CursorKind.INIT_LIST_EXPR for c in node.get_children())
-
-            # Check for direct pointer assignment
-            if node.kind == CursorKind.BINARY_OPERATOR:
-                tokens = list(node.get_tokens())
-                return (len(tokens) >= 3 and
-                        tokens[1].spelling == '=' and
-                        any('*' in t.spelling for t in tokens))
+        # Pointer declaration with an initializer
+        if node.kind == CursorKind.VAR_DECL:
+            return self.is_pointer_type(node.type) and any(c.kind.is_expression() for c in node.get_children())
 
-            return False
-        except Exception as e:
-            self.debug_print(f"Pointer assignment check error: {str(e)}")
-            return False
+        # Assignment to a pointer lvalue
+        if node.kind == CursorKind.BINARY_OPERATOR:
+            return self.is_pointer_type(node.type) and self.operator_spelling(node) == '='
+
+        return False
 
     def is_pointer_dereference(self, node) -> bool:
-        try:
-            if node.kind == CursorKind.UNARY_OPERATOR:
-                tokens = list(node.get_tokens())
-                return (len(tokens) > 0 and
-                        tokens[0].spelling == '*' and
-                        not any(p.kind == CursorKind.DECLARATION for p in node.get_children()))
+        if node.kind == CursorKind.UNARY_OPERATOR:
+            # *p: l'operando è un puntatore e il risultato ha il tipo puntato
+            operand = next(node.get_children(), None)
+            if operand is None or not self.is_pointer_type(operand.type):
+                return False
+            if node.type.get_canonical().spelling != operand.type.get_canonical().get_pointee().spelling:
+                return False
+            return self.operator_spelling(node) == '*'
+
+        # p->field: base di tipo puntatore
+        if node.kind == CursorKind.MEMBER_REF_EXPR:
+            base = next(node.get_children(), None)
+            return base is not None and self.is_pointer_type(base.type)
+
+        # p[i] su un puntatore (non su un array): la base di a[i] è un
+        # UNEXPOSED_EXPR (decadimento array -> puntatore) che ha già tipo
+        # puntatore, quindi si guarda il riferimento che c'è sotto
+        if node.kind == CursorKind.ARRAY_SUBSCRIPT_EXPR:
+            base = next(node.get_children(), None)
+            while base is not None and base.kind == CursorKind.UNEXPOSED_EXPR:
+                base = next(base.get_children(), None)
+            if base is None:
+                return False
+            if base.kind in (CursorKind.DECL_REF_EXPR, CursorKind.MEMBER_REF_EXPR) \
+                    and base.type.get_canonical().kind in ARRAY_TYPE_KINDS:
+                return False
+            return self.is_pointer_type(base.type)
 
-            # Check for arrow operator
-            if node.kind == CursorKind.MEMBER_REF_EXPR:
-                tokens = list(node.get_tokens())
-                return len(tokens) >= 2 and '->' in [t.spelling for t in tokens]
+        return False
 
+    @staticmethod
+    def is_op_handler(node) -> bool:
+        """Funzioni generate da d_m3Op: op_<nome> con la firma d_m3OpSig (_pc, _sp, _mem, _r0)."""
+        if not node.spelling.startswith('op_'):
             return False
-        except Exception as e:
-            self.debug_print(f"Pointer dereference check error: {str(e)}")
-            return False
-
-    def process_node(self, node, source_file: SourceFile):
-        try:
-            if node.location.file and node.location.file.name == source_file.filepath:
-                if self.is_pointer_assignment(node):
-                    op = PointerOperation(
-                        line=node.location.line,
-                        column=node.location.column,
-                        name=node.spelling or "anonymous",
-                        is_assignment=True,
-                        source_file=source_file.filepath
-                    )
-                    source_file.add_operation(op)
-                    self.debug_print(f"Found pointer assignment: {op}")
-
-                elif self.is_pointer_dereference(node):
-                    op = PointerOperation(
-                        line=node.location.line,
-                        column=node.location.column,
-                        name=node.spelling or "anonymous",
-                        is_assignment=False,
-                        source_file=source_file.filepath
-                    )
-                    source_file.add_operation(op)
-                    self.debug_print(f"Found pointer dereference: {op}")
-
-                # Check for includes
-                if node.kind == CursorKind.INCLUSION_DIRECTIVE:
+        return any(arg.spelling == '_pc' for arg in node.get_arguments())
+
+    @staticmethod
+    def access_target(node) -> str:
+        """Nome della variabile o del campo a cui si accede."""
+        if node.kind == CursorKind.MEMBER_REF_EXPR and node.spelling:
+            return node.spelling
+        for child in node.walk_preorder():
+            if child.kind in (CursorKind.DECL_REF_EXPR, CursorKind.MEMBER_REF_EXPR) and child.spelling:
+                return child.spelling
+        return ''
+
+    def source_file_for(self, filename: str) -> SourceFile:
+        if filename not in self.files:
+            self.files[filename] = SourceFile(filename)
+        return self.files[filename]
+
+    def process_translation_unit(self, translation_unit) -> int:
+        """
+        Visita iterativa dell'intero TU, compresi gli header inclusi: ogni
+        operazione va al SourceFile del file in cui si trova. Le dichiarazioni
+        di primo livello degli header di sistema e dei file già analizzati in un
+        TU precedente vengono saltate per intero. Restituisce i nodi visitati.
+        """
+        seen_files = set()
+        visited = 0
+        stack = []
+        for node in reversed(list(translation_unit.cursor.get_children())):
+            location = node.location
+            # is_in_system_header prima di file: la maggior parte delle dichiarazioni
+            # di primo livello viene dalla libc e leggere il nome del file costa di più
+            if getattr(location, 'is_in_system_header', False):
+                continue
+            file = location.file
+            if file is None or file.name in self._completed_files:
+                continue
+            seen_files.add(file.name)
+            stack.append((node, None, 0, False))
+
+        while stack:
+            node, function, loop_depth, in_op_handler = stack.pop()
+            visited += 1
+            kind = node.kind
+
+            if kind in FUNCTION_KINDS and node.is_definition():
+                function = node.spelling
+                loop_depth = 0
+                in_op_handler = self.is_op_handler(node)
+            elif kind in LOOP_KINDS:
+                loop_depth += 1
+
+            if kind in CANDIDATE_KINDS:
+                try:
+                    is_assignment = self.is_pointer_assignment(node)
+                    if is_assignment or self.is_pointer_dereference(node):
+                        location = node.location
+                        filename = location.file.name if location.file else translation_unit.spelling
+                        op = PointerOperation(
+                            line=location.line,
+                            column=location.column,
+                            name=node.spelling or "anonymous",
+                            is_assignment=is_assignment,
+                            source_file=filename,
+                            function=function or '',
+                            loop_depth=loop_depth,
+                            in_op_handler=in_op_handler,
+                            target='' if is_assignment else self.access_target(node)
+                        )
+                        self.source_file_for(filename).add_operation(op)
+                        self.debug_print(f"Found pointer {'assignment' if is_assignment else 'dereference'}: {op}")
+                except Exception as e:
+                    self.debug_print(f"Error processing node: {str(e)}")
+
+            elif kind == CursorKind.INCLUSION_DIRECTIVE:
+                try:
                     included_file = node.get_included_file()
-                    if included_file:
-                        source_file.add_include(included_file.name)
-                        self.debug_print(f"Found include: {included_file.name}")
+                except AssertionError:
+                    # Include non trovato: le binding rifiutano il File nullo
+                    included_file = None
+                if included_file and node.location.file:
+                    self.source_file_for(node.location.file.name).add_include(included_file.name)
+                    self.debug_print(f"Found include: {included_file.name}")
 
-            # Recurse through children
-            for child in node.get_children():
-                self.process_node(child, source_file)
+            children = list(node.get_children())
+            for child in reversed(children):
+                stack.append((child, function, loop_depth, in_op_handler))
 
-        except Exception as e:
-            self.debug_print(f"Error processing node: {str(e)}")
+        self._completed_files.update(seen_files)
+        return visited
 
     def analyze_file(self, filepath: str) -> SourceFile:
-        if filepath in self.files:
-            return self.files[filepath]
-
-        source_file = SourceFile(filepath)
-        self.files[filepath] = source_file
+        if filepath in self._completed_files:
+            # Un header visto in un TU precedente ha una voce solo se vi si è trovato qualcosa
+            return self.source_file_for(filepath)
 
+        source_file = self.source_file_for(filepath)
         try:
             translation_unit = self.index.parse(
                 filepath,
-                args=['-x', 'c'],
-                options=(1 << 2)  # DetailedPreprocessingRecord
+                args=self.clang_args,
+                options=TranslationUnit.PARSE_DETAILED_PROCESSING_RECORD
             )
 
             if not translation_unit:
                 raise RuntimeError(f"Failed to parse {filepath}")
 
-            self.process_node(translation_unit.cursor, source_file)
-
-            # Analyze included files
-            for include_path in source_file.includes:
-                if os.path.exists(include_path) and include_path not in self.files:
-                    self.analyze_file(include_path)
+            self.nodes_visited += self.process_translation_unit(translation_unit)
+            # Gli header inclusi sono già stati analizzati all'interno di questo TU
+            self._completed_files.add(filepath)
 
         except Exception as e:
             self.debug_print(f"Error analyzing file {filepath}: {str(e)}")
@@ -190,6 +324,49 @@ class PointerAnalyzer:
             'total_operations': total_assignments + total_dereferences
         }
 
+    def get_hot_dereferences(self, limit: int = 30) -> Tuple[List[PointerOperation], List[dict]]:
+        """
+        Dereferenziazioni ordinate per peso stimato (profondità dei loop e
+        appartenenza a un handler wasm3), e lo stesso peso sommato per funzione:
+        i punti dove la traduzione della memoria segmentata costa davvero.
+        """
+        dereferences = [op for source_file in self.files.values()
+                        for op in source_file.pointer_ops if not op.is_assignment]
+        dereferences.sort(key=lambda op: (op.hotness, op.loop_depth), reverse=True)
+
+        functions: Dict[Tuple[str, str], dict] = {}
+        for op in dereferences:
+            key = (op.source_file, op.function)
+            entry = functions.setdefault(key, {
+                'source_file': op.source_file,
+                'function': op.function or '<global>',
+                'in_op_handler': op.in_op_handler,
+                'dereferences': 0,
+                'max_loop_depth': 0,
+                'score': 0
+            })
+            entry['dereferences'] += 1
+            entry['max_loop_depth'] = max(entry['max_loop_depth'], op.loop_depth)
+            entry['score'] += op.hotness
+        ranked_functions = sorted(functions.values(), key=lambda e: e['score'], reverse=True)
+        return dereferences[:limit], ranked_functions[:limit]
+
+    def print_hot_report(self, limit: int = 30):
+        sites, functions = self.get_hot_dereferences(limit)
+        print("\nHot dereferences:")
+        print(f"{'score':>8} {'loops':>5} {'op':>3}  {'location':<40} {'function':<32} target")
+        for op in sites:
+            location = f"{os.path.basename(op.source_file)}:{op.line}:{op.column}"
+            print(f"{op.hotness:>8} {op.loop_depth:>5} {'yes' if op.in_op_handler else '':>3}  "
+                  f"{location:<40} {op.function or '<global>':<32} {op.target}")
+
+        print("\nHot functions:")
+        print(f"{'score':>8} {'derefs':>6} {'loops':>5} {'op':>3}  function")
+        for entry in functions:
+            print(f"{entry['score']:>8} {entry['dereferences']:>6} {entry['max_loop_depth']:>5} "
+                  f"{'yes' if entry['in_op_handler'] else '':>3}  "
+                  f"{os.path.basename(entry['source_file'])}:{entry['function']}")
+
 
 # Example usage:
 def analyze_pointers(input_file: str, print_debug: bool = False):
@@ -206,10 +383,50 @@ def analyze_pointers(input_file: str, print_debug: bool = False):
         print(f"Total pointer operations: {stats['total_operations']}")
         print(f"- Assignments: {stats['total_assignments']}")
         print(f"- Dereferences: {stats['total_dereferences']}")
+        analyzer.print_hot_report()
 
     return analyzer
 
+BENCHMARK_FILES = sorted(glob.glob("../hello-idf/main/*.c")) + ["../analyze/m3_exec_transformed.h"]
+
+def benchmark(paths: List[str], clang_args: Optional[List[str]] = None):
+    """Tempo di parse e di visita per file, con un analyzer condiviso come nell'uso normale."""
+    if not setup_libclang():
+        raise RuntimeError("Impossibile inizializzare libclang")
+
+    analyzer = PointerAnalyzer(clang_args=clang_args)
+    totals = {'parse': 0.0, 'visit': 0.0, 'nodes': 0, 'ops': 0}
+    print(f"{'file':<40} {'parse ms':>9} {'visit ms':>9} {'nodes':>8} {'nodes/s':>10} {'ops':>6}")
+    for path in paths:
+        start = time.perf_counter()
+        translation_unit = analyzer.index.parse(path, args=analyzer.clang_args,
+                                                options=TranslationUnit.PARSE_DETAILED_PROCESSING_RECORD)
+        parsed = time.perf_counter()
+        ops_before = sum(len(f.pointer_ops) for f in analyzer.files.values())
+        nodes = analyzer.process_translation_unit(translation_unit)
+        analyzer._completed_files.add(path)
+        visited = time.perf_counter()
+        ops = sum(len(f.pointer_ops) for f in analyzer.files.values()) - ops_before
+
+        totals['parse'] += parsed - start
+        totals['visit'] += visited - parsed
+        totals['nodes'] += nodes
+        totals['ops'] += ops
+        rate = nodes / (visited - parsed) if visited > parsed else 0
+        print(f"{os.path.basename(path):<40} {(parsed - start) * 1000:>9.1f} {(visited - parsed) * 1000:>9.1f} "
+              f"{nodes:>8} {rate:>10.0f} {ops:>6}")
+
+    rate = totals['nodes'] / totals['visit'] if totals['visit'] else 0
+    print(f"{'total':<40} {totals['parse'] * 1000:>9.1f} {totals['visit'] * 1000:>9.1f} "
+          f"{totals['nodes']:>8} {rate:>10.0f} {totals['ops']:>6}")
+    print(f"Files with operations (headers included): {sum(1 for f in analyzer.files.values() if f.pointer_ops)}")
+    return totals
+
 if __name__ == '__main__':
+    if len(sys.argv) > 1 and sys.argv[1] == '--benchmark':
+        benchmark(sys.argv[2:] or BENCHMARK_FILES)
+        sys.exit(0)
+
     analyze = "../hello-idf/main/wasm.h"
     if len(sys.argv) > 1:
         analyze = sys.argv[1]
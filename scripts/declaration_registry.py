@@ -0,0 +1,270 @@
+#!/usr/bin/env python3
+import os
+import re
+import sys
+import json
+import hashlib
+from pathlib import Path
+from typing import Dict, List, Optional, Set
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / 'analyze'))
+from graphCycles import find_cycles
+
+REGISTRY_NAME = '.declaration_registry.json'
+# 2: ogni dichiarazione registra anche gli header che la includono dal proprietario
+REGISTRY_VERSION = 2
+# Identità degli header generati senza un percorso su disco (advCalcInclusion senza output_path)
+GENERATED_PREFIX = 'generated:'
+
+COMMENT_RE = re.compile(r'/\*.*?\*/|//[^\n]*', re.S)
+PUNCTUATION_SPACE_RE = re.compile(r'\s*([{}()\[\];,*=:<>&|+\-/])\s*')
+WHITESPACE_RE = re.compile(r'\s+')
+
+
+def project_registry_path(start=None) -> Path:
+    """Registro unico del progetto: nella prima directory sopra start che contiene .git."""
+    current = Path(start or os.getcwd()).resolve()
+    for candidate in (current, *current.parents):
+        if (candidate / '.git').exists():
+            return candidate / REGISTRY_NAME
+    return current / REGISTRY_NAME
+
+
+def normalize_declaration(text: str) -> str:
+    """Forma canonica di una dichiarazione: senza commenti, spazi ridotti e tolti attorno alla punteggiatura."""
+    text = COMMENT_RE.sub(' ', text)
+    text = WHITESPACE_RE.sub(' ', text)
+    return PUNCTUATION_SPACE_RE.sub(r'\1', text).strip()
+
+
+def declaration_hash(text: str) -> str:
+    return hashlib.sha256(normalize_declaration(text).encode()).hexdigest()[:20]
+
+
+def generated_header_id(name: str) -> str:
+    """Identità esplicita di un header generato che non ha ancora un percorso."""
+    return GENERATED_PREFIX + name
+
+
+def include_directive(owner: str, including_header: str) -> str:
+    """#include dell'header proprietario, relativo alla directory dell'header che lo include."""
+    if owner.startswith(GENERATED_PREFIX):
+        path = owner[len(GENERATED_PREFIX):]
+    elif os.path.isabs(owner) and os.path.isabs(including_header):
+        path = os.path.relpath(owner, os.path.dirname(including_header))
+    else:
+        path = owner
+    return f'#include "{path}"'
+
+
+class DeclarationRegistry:
+    """
+    Registro delle dichiarazioni emesse negli header generati, condiviso da
+    generate_h, generate_h_libclang e advCalcInclusion. Ogni dichiarazione
+    (identificata dall'hash della forma normalizzata) appartiene a un solo
+    header: il primo che la rivendica. Gli altri header includono il proprietario
+    invece di ripeterla e vengono registrati come suoi dipendenti ('users'):
+    se il proprietario rigenerato non emette più la dichiarazione, i dipendenti
+    restano con un #include che non la fornisce e finiscono in `stale`
+    finché non vengono rigenerati anche loro.
+
+    Un header non include mai un proprietario che (anche indirettamente)
+    include già lui: in quel caso la dichiarazione resta locale, così il
+    grafo degli include generati non ha cicli.
+    """
+
+    def __init__(self, path=None):
+        self.path = Path(path) if path else project_registry_path()
+        self.entries: Dict[str, dict] = {}
+        # Header dipendenti da rigenerare: il loro proprietario ha perso una dichiarazione
+        self.stale: Set[str] = set()
+        self.changed = False
+        # Header che hanno rivendicato qualcosa in questa esecuzione (magari non ancora scritti)
+        self._session_headers = set()
+        # Dichiarazioni liberate da release() e non ancora rivendicate di nuovo:
+        # hash -> (vecchio proprietario, dipendenti)
+        self._orphans: Dict[str, tuple] = {}
+        if self.path.exists():
+            try:
+                with open(self.path, 'r') as f:
+                    data = json.load(f)
+                # Un registro v1 non ha i dipendenti: le dichiarazioni restano valide
+                if data.get('version') in (1, REGISTRY_VERSION):
+                    self.entries = data.get('declarations', {})
+                    self.stale = {self._header_id(header) for header in data.get('stale', [])}
+            except (OSError, ValueError):
+                self.entries = {}
+        # Registri precedenti potevano contenere nomi nudi come 'x.h': stessa identità di oggi
+        for entry in self.entries.values():
+            entry['header'] = self._header_id(entry['header'])
+            entry['users'] = sorted({self._header_id(user) for user in entry.get('users', [])})
+
+    @staticmethod
+    def _header_id(header) -> str:
+        """Percorso assoluto dell'header, o l'identità esplicita di un header generato senza percorso."""
+        header = str(header)
+        return header if header.startswith(GENERATED_PREFIX) else os.path.abspath(header)
+
+    @staticmethod
+    def _same_file(owner: str, header: str) -> bool:
+        if owner == header:
+            return True
+        try:
+            return os.path.samefile(owner, header)
+        except OSError:
+            return False
+
+    def _reaches(self, start: str, target: str) -> bool:
+        """True se start include già target, anche indirettamente, tramite gli header generati."""
+        graph = self.include_graph()
+        seen = {start}
+        pending = [start]
+        while pending:
+            node = pending.pop()
+            if node == target:
+                return True
+            for succ in graph.get(node, ()):
+                if succ not in seen:
+                    seen.add(succ)
+                    pending.append(succ)
+        return False
+
+    def owner_of(self, declaration: str) -> Optional[str]:
+        entry = self.entries.get(declaration_hash(declaration))
+        return entry['header'] if entry else None
+
+    def claim(self, declaration: str, header, name: str = '') -> str:
+        """
+        Rivendica la dichiarazione per header. Restituisce l'header proprietario:
+        header stesso se la dichiarazione è libera o già sua, altrimenti quello
+        da includere.
+        """
+        key = declaration_hash(declaration)
+        header = self._header_id(header)
+        self._session_headers.add(header)
+        entry = self.entries.get(key)
+        if entry is not None:
+            owner = entry['header']
+            if owner != header and self._same_file(owner, header):
+                # Lo stesso file con un'altra identità (link simbolico): non è un proprietario estraneo
+                entry['header'] = owner = header
+                self.changed = True
+            # Un proprietario sparito (header cancellato) cede la dichiarazione
+            if owner in self._session_headers or not os.path.isabs(owner) or os.path.exists(owner):
+                if owner != header and self._reaches(owner, header):
+                    # Includere owner chiuderebbe un ciclo: la dichiarazione resta anche qui
+                    return header
+                if owner != header:
+                    users = entry.setdefault('users', [])
+                    if header not in users:
+                        users.append(header)
+                        users.sort()
+                        self.changed = True
+                return owner
+            self._orphans[key] = (owner, entry.get('users', []))
+        users = []
+        orphan = self._orphans.get(key)
+        if orphan is not None and orphan[0] == header:
+            # Lo stesso proprietario la emette ancora: i dipendenti restano validi
+            users = [user for user in self._orphans.pop(key)[1] if user != header]
+        self.entries[key] = {'header': header, 'name': name, 'users': users}
+        self.changed = True
+        return header
+
+    def release(self, header):
+        """
+        Libera le dichiarazioni di un header che sta per essere rigenerato da zero.
+        I suoi dipendenti vengono ricordati: se la dichiarazione non torna a
+        questo header, stale_dependents() li segnala.
+        """
+        header = self._header_id(header)
+        if header in self.stale:
+            self.stale.discard(header)
+            self.changed = True
+        # L'header rigenerato ricalcola da zero i propri include
+        for entry in self.entries.values():
+            if header in entry.get('users', ()):
+                entry['users'].remove(header)
+                self.changed = True
+        for key, (owner, users) in list(self._orphans.items()):
+            if header in users:
+                self._orphans[key] = (owner, [user for user in users if user != header])
+        released = [key for key, entry in self.entries.items() if entry['header'] == header]
+        for key in released:
+            self._orphans[key] = (header, self.entries.pop(key).get('users', []))
+        self.changed = self.changed or bool(released)
+
+    def stale_dependents(self) -> List[str]:
+        """
+        Header che includono un proprietario per una dichiarazione che non
+        emette più. Va chiamato a fine esecuzione, quando ogni header
+        rigenerato ha già rivendicato le sue dichiarazioni.
+        """
+        for owner, users in self._orphans.values():
+            fresh = set(users) - self.stale
+            if fresh:
+                self.stale.update(fresh)
+                self.changed = True
+        self._orphans.clear()
+        return sorted(self.stale)
+
+    def include_graph(self) -> Dict[str, Set[str]]:
+        """Archi dipendente -> proprietario creati dalla deduplicazione."""
+        graph: Dict[str, Set[str]] = {}
+        for entry in self.entries.values():
+            for user in entry.get('users', ()):
+                graph.setdefault(user, set()).add(entry['header'])
+        return graph
+
+    def include_cycles(self) -> List[List[str]]:
+        """
+        Cicli A -> B -> A tra header generati. claim() non ne crea; possono
+        arrivare solo da un registro scritto da versioni precedenti.
+        """
+        return [report.witness for report in find_cycles(self.include_graph())]
+
+    def in_cycle(self, header) -> bool:
+        """
+        True se header è in un ciclo di include: con le guardie una delle
+        dichiarazioni del ciclo mancherebbe, quindi l'header non va scritto.
+        """
+        header = self._header_id(header)
+        return any(header in report.component for report in find_cycles(self.include_graph()))
+
+    def warnings(self) -> List[str]:
+        """Dipendenti da rigenerare e cicli di include, da stampare a fine esecuzione."""
+        messages = [f"Da rigenerare (il proprietario non emette più una dichiarazione inclusa): {header}"
+                    for header in self.stale_dependents()]
+        messages.extend(f"Ciclo di include tra header generati: {' -> '.join(cycle)}"
+                        for cycle in self.include_cycles())
+        return messages
+
+    def headers(self) -> Dict[str, int]:
+        """Numero di dichiarazioni possedute da ogni header."""
+        counts: Dict[str, int] = {}
+        for entry in self.entries.values():
+            counts[entry['header']] = counts.get(entry['header'], 0) + 1
+        return counts
+
+    def save(self):
+        self.stale_dependents()
+        if not self.changed and self.path.exists():
+            return
+        content = json.dumps({'version': REGISTRY_VERSION, 'declarations': self.entries,
+                              'stale': sorted(self.stale)}, indent=2, sort_keys=True)
+        with open(self.path, 'w') as f:
+            f.write(content + '\n')
+        self.changed = False
+
+
+def main():
+    registry = DeclarationRegistry(sys.argv[1] if len(sys.argv) > 1 else None)
+    print(f"Registro: {registry.path} ({len(registry.entries)} dichiarazioni)")
+    for header, count in sorted(registry.headers().items(), key=lambda item: item[1], reverse=True):
+        print(f"{count:>6}  {header}")
+    for message in registry.warnings():
+        print(message)
+
+
+if __name__ == "__main__":
+    main()
@@ -3,6 +3,8 @@ import re
 import sys
 import os
 
+from declaration_registry import DeclarationRegistry, include_directive
+
 
 def extract_function_info(header_content):
     """Estrae sia le dichiarazioni che le definizioni complete di funzione dal file header."""
@@ -119,10 +121,40 @@ def generate_source_file(header_path, implementations, includes):
     return '\n'.join(source_content)
 
 
-def update_header_file(header_content, declarations, includes, guards, types):
-    """Aggiorna il file header mantenendo solo le dichiarazioni."""
+def declaration_name(declaration):
+    """Nome dichiarato: la funzione prima di '(' o l'ultimo identificatore prima di ';'."""
+    match = re.search(r'(\w+)\s*\(', declaration) or re.search(r'(\w+)\s*;\s*$', declaration)
+    return match.group(1) if match else ''
+
+
+def deduplicate_with_registry(registry, header_path, items, includes):
+    """Tiene le dichiarazioni possedute da questo header; per le altre aggiunge l'include del proprietario."""
+    kept = []
+    for item in items:
+        owner = registry.claim(item, header_path, declaration_name(item))
+        if owner == registry._header_id(header_path):
+            kept.append(item)
+        else:
+            directive = include_directive(owner, os.path.abspath(header_path))
+            if directive not in includes:
+                includes.append(directive)
+    return kept
+
+
+def update_header_file(header_content, declarations, includes, guards, types, registry=None, header_path=None):
+    """
+    Aggiorna il file header mantenendo solo le dichiarazioni. Con un registro
+    di progetto i tipi e le dichiarazioni già posseduti da un altro header
+    generato diventano un #include di quell'header.
+    """
     new_header = []
 
+    if registry is not None and header_path is not None:
+        includes = list(includes)
+        registry.release(header_path)
+        types = deduplicate_with_registry(registry, header_path, types, includes)
+        declarations = deduplicate_with_registry(registry, header_path, declarations, includes)
+
     # Aggiungi le guardie di apertura
     if guards and '#ifndef' in guards[0]:
         new_header.extend(guards[:2])
@@ -146,7 +178,7 @@ def update_header_file(header_content, declarations, includes, guards, types):
     return '\n'.join(new_header)
 
 
-def process_header_file(header_path):
+def process_header_file(header_path, registry=None):
     """Processa il file header e genera il corrispondente file sorgente."""
     try:
         # Leggi il contenuto del file header
@@ -160,7 +192,7 @@ def process_header_file(header_path):
 
         # Genera il nuovo contenuto del header
         new_header_content = update_header_file(
-            header_content, declarations, includes, guards, types
+            header_content, declarations, includes, guards, types, registry, header_path
         )
 
         # Genera il contenuto del file sorgente
@@ -168,6 +200,13 @@ def process_header_file(header_path):
             header_path, implementations, includes
         )
 
+        if registry is not None and registry.in_cycle(header_path):
+            for message in registry.warnings():
+                print(f"ATTENZIONE {message}")
+            registry.save()
+            print(f"ERRORE: {header_path} è in un ciclo di include tra header generati, non scritto")
+            sys.exit(1)
+
         # Scrivi i file
         source_path = header_path.replace('.h', '.c')
 
@@ -177,6 +216,11 @@ def process_header_file(header_path):
         with open(source_path, 'w') as f:
             f.write(source_content)
 
+        if registry is not None:
+            for message in registry.warnings():
+                print(f"ATTENZIONE {message}")
+            registry.save()
+
         print(f"File header aggiornato: {header_path}")
         print(f"File sorgente generato: {source_path}")
 
@@ -186,15 +230,24 @@ def process_header_file(header_path):
 
 def main():
     header_file = '../' + 'hello-idf/main/he_io.h'
+    args = sys.argv[1:]
+
+    # --registry [percorso]: deduplica con il registro di progetto
+    registry = None
+    if '--registry' in args:
+        position = args.index('--registry')
+        path = args[position + 1] if position + 1 < len(args) and args[position + 1].endswith('.json') else None
+        registry = DeclarationRegistry(path)
+        del args[position:position + (2 if path else 1)]
 
-    if len(sys.argv) > 1:
-        header_file = sys.argv[1]
+    if args:
+        header_file = args[0]
 
     if not header_file.endswith('.h'):
         print("Il file deve essere un header file .h")
         sys.exit(1)
 
-    process_header_file(header_file)
+    process_header_file(header_file, registry)
 
 
 if __name__ == "__main__":
@@ -5,6 +5,23 @@ from clang.cindex import Index, CursorKind, TranslationUnit, Config
 import re
 import os
 import sys
+import json
+import hashlib
+import argparse
+from multiprocessing import Pool
+from typing import Dict, List, Optional, Tuple
+
+from declaration_registry import DeclarationRegistry, include_directive
+
+MANIFEST_NAME = '.generate_h_manifest.json'
+# Passate extra per rigenerare i dipendenti rimasti senza dichiarazione
+MAX_STALE_ROUNDS = 3
+# Da incrementare quando cambia il formato degli header generati o del manifest
+# (2: il manifest registra anche gli hash dei file inclusi dalla TU)
+GENERATOR_VERSION = 2
+
+# (guardie e include, [(nome, dichiarazione)], chiusura della guardia)
+HeaderParts = Tuple[List[str], List[Tuple[str, str]], str]
 
 def setup_libclang() -> bool:
     """Configura il percorso di libclang per macOS"""
@@ -24,7 +41,7 @@ def setup_libclang() -> bool:
         print("ERRORE: libclang non trovato. Installa LLVM:")
         print("brew install llvm")
         return False
-    except subprocess.CalledProcessError:
+    except (subprocess.CalledProcessError, FileNotFoundError):
         print("ERRORE: Homebrew non trovato. Installa Homebrew da https://brew.sh")
         return False
 
@@ -34,6 +51,8 @@ class HeaderGenerator:
         self.processed_declarations = set()
         self.processed_includes = set()
         self.type_declarations = {}
+        # File inclusi dall'ultima TU analizzata (per il manifest)
+        self.included_files: List[str] = []
 
     def clean_type_name(self, name: str) -> str:
         """Pulisce il nome del tipo rimuovendo riferimenti non necessari."""
@@ -113,9 +132,10 @@ class HeaderGenerator:
 
         return f"{cursor.result_type.spelling} {cursor.spelling}({', '.join(args)});\n"
 
-    def generate_header(self, source_file: str) -> str:
-        """Genera il contenuto del file header."""
-        index = Index.create()
+    def collect_header_parts(self, source_file: str, index: Optional[Index] = None) -> HeaderParts:
+        """Guardie, include e dichiarazioni (nome, testo) del futuro header, con l'Index dato o uno nuovo."""
+        if index is None:
+            index = Index.create()
 
         with open(source_file, 'r') as f:
             source_content = f.read()
@@ -124,6 +144,8 @@ class HeaderGenerator:
 
         # Parsing del file
         tu = index.parse(source_file)
+        # Le dichiarazioni arrivano da tutta la TU: anche gli header inclusi decidono l'output
+        self.included_files = sorted({os.path.abspath(inc.include.name) for inc in tu.get_includes()})
 
         # Organizza il contenuto dell'header
         header_content = []
@@ -140,7 +162,6 @@ class HeaderGenerator:
 
         # Aggiungi gli include deduplicati
         header_content.extend(sorted(includes))
-        header_content.append("")
 
         # Raccogli tutte le dichiarazioni
         declarations = []
@@ -149,23 +170,53 @@ class HeaderGenerator:
             if cursor.kind == CursorKind.STRUCT_DECL:
                 decl = self.get_struct_declaration(cursor)
                 if decl:
-                    declarations.append(decl)
+                    declarations.append((cursor.spelling, decl))
             elif cursor.kind == CursorKind.FUNCTION_DECL and not cursor.is_definition():
                 decl = self.get_function_declaration(cursor)
                 if decl:
-                    declarations.append(decl)
-
-        # Aggiungi le dichiarazioni deduplicate
-        header_content.extend(declarations)
+                    declarations.append((cursor.spelling, decl))
 
         # Chiudi le guardie dell'header
-        if guards:
-            header_content.append(guards[-1])
+        closing = guards[-1] if guards else "#endif"
+
+        return header_content, declarations, closing
+
+    def assemble_header(self, source_file: str, parts: HeaderParts,
+                        registry: Optional[DeclarationRegistry] = None) -> str:
+        """
+        Compone l'header. Con un registro di progetto ogni dichiarazione già
+        posseduta da un altro header generato viene sostituita dal suo #include.
+        """
+        prelude, declarations, closing = parts
+        header_content = list(prelude)
+        kept = []
+
+        if registry is not None:
+            header_file = os.path.abspath(source_file[:-2] + '.h')
+            registry.release(header_file)
+            owner_includes = set()
+            for name, decl in declarations:
+                owner = registry.claim(decl, header_file, name)
+                if owner == header_file:
+                    kept.append(decl)
+                else:
+                    owner_includes.add(include_directive(owner, header_file))
+            header_content.extend(sorted(owner_includes - set(prelude)))
         else:
-            header_content.append("#endif")
+            kept = [decl for _, decl in declarations]
+
+        header_content.append("")
+        # Aggiungi le dichiarazioni deduplicate
+        header_content.extend(kept)
+        header_content.append(closing)
 
         return "\n".join(header_content)
 
+    def generate_header(self, source_file: str, index: Optional[Index] = None,
+                        registry: Optional[DeclarationRegistry] = None) -> str:
+        """Genera il contenuto del file header (con l'Index dato, o uno nuovo)."""
+        return self.assemble_header(source_file, self.collect_header_parts(source_file, index), registry)
+
     def update_source_file(self, source_file: str) -> None:
         """Aggiorna il file sorgente."""
         header_name = os.path.basename(source_file).replace('.c', '.h')
@@ -182,15 +233,212 @@ class HeaderGenerator:
         if include_statement not in content:
             content = include_statement + content
 
-        with open(source_file, 'w') as f:
-            f.write(content)
+        write_if_changed(source_file, content)
+
+
+def file_hash(path: str) -> str:
+    with open(path, 'rb') as f:
+        return hashlib.sha256(f.read()).hexdigest()
+
+
+def write_if_changed(path: str, content: str) -> bool:
+    """Scrive il file solo se il contenuto è diverso: la data non cambia e Ninja non ricompila."""
+    if os.path.exists(path):
+        with open(path, 'r') as f:
+            if f.read() == content:
+                return False
+    with open(path, 'w') as f:
+        f.write(content)
+    return True
+
+
+class Manifest:
+    """Hash dei sorgenti e degli header generati nell'ultima esecuzione."""
+
+    def __init__(self, path: str):
+        self.path = path
+        self.entries: Dict[str, dict] = {}
+        self._hashes: Dict[str, Optional[str]] = {}
+        if os.path.exists(path):
+            try:
+                with open(path, 'r') as f:
+                    data = json.load(f)
+                if data.get('version') == GENERATOR_VERSION:
+                    self.entries = data.get('sources', {})
+            except (OSError, ValueError):
+                self.entries = {}
+
+    def _hash(self, path: str) -> Optional[str]:
+        # Gli stessi header sono inclusi da molte TU: un hash per file per esecuzione
+        if path not in self._hashes:
+            try:
+                self._hashes[path] = file_hash(path)
+            except OSError:
+                self._hashes[path] = None
+        return self._hashes[path]
+
+    def is_current(self, source_file: str, source_hash: str, header_file: str) -> bool:
+        entry = self.entries.get(os.path.abspath(source_file))
+        if entry is None or entry['source_hash'] != source_hash:
+            return False
+        if not os.path.exists(header_file) or file_hash(header_file) != entry['header_hash']:
+            return False
+        return all(self._hash(path) == digest for path, digest in entry.get('includes', {}).items())
+
+    def record(self, source_file: str, header_file: str, included_files: List[str] = ()):
+        self.entries[os.path.abspath(source_file)] = {
+            'source_hash': file_hash(source_file),
+            'header_hash': file_hash(header_file),
+            'header': os.path.abspath(header_file),
+            'includes': {path: self._hash(path) for path in included_files}
+        }
+
+    def save(self):
+        content = json.dumps({'version': GENERATOR_VERSION, 'sources': self.entries}, indent=2, sort_keys=True)
+        write_if_changed(self.path, content + '\n')
+
+
+# Un Index per processo worker, creato una volta dall'initializer del pool
+_worker_index = None
+_worker_error = None
+
+
+def _init_worker():
+    # Un initializer che solleva fa ricreare i worker all'infinito: l'errore
+    # viene invece restituito per ogni file
+    global _worker_index, _worker_error
+    try:
+        if not setup_libclang():
+            raise RuntimeError("Impossibile inizializzare libclang")
+        _worker_index = Index.create()
+    except Exception as e:
+        _worker_error = str(e)
 
 
-def main():
-    source_file = '../'+ 'hello-idf/main/he_mgt_string.c'
+def _generate_worker(source_file: str) -> Tuple[str, Optional[HeaderParts], List[str], Optional[str]]:
+    """
+    (sorgente, parti dell'header, file inclusi dalla TU, errore). Un generatore
+    nuovo per file, come nell'uso singolo.
+    """
+    if _worker_error is not None:
+        return source_file, None, [], _worker_error
+    try:
+        generator = HeaderGenerator()
+        parts = generator.collect_header_parts(source_file, _worker_index)
+        return source_file, parts, generator.included_files, None
+    except Exception as e:
+        return source_file, None, [], str(e)
+
+
+def generate_directory(directory: str, jobs: Optional[int] = None, manifest_path: Optional[str] = None,
+                       update_sources: bool = False, force: bool = False,
+                       registry: Optional[DeclarationRegistry] = None) -> Dict[str, List[str]]:
+    """
+    Genera gli header di tutti i .c della directory con un pool di worker.
+    I sorgenti con lo stesso hash dell'ultima esecuzione, gli stessi header
+    inclusi e l'header generato intatto vengono saltati; gli header vengono scritti solo se il contenuto cambia.
+    Il registro viene applicato nel processo principale, in ordine di percorso,
+    così l'assegnazione delle dichiarazioni non dipende dai worker. Gli header
+    che includevano una dichiarazione persa dal suo proprietario vengono
+    rigenerati anche se il loro sorgente non è cambiato.
+    """
+    manifest = Manifest(manifest_path or os.path.join(directory, MANIFEST_NAME))
+    sources = sorted(
+        os.path.join(root, name)
+        for root, _, files in os.walk(directory)
+        for name in files if name.endswith('.c')
+    )
+
+    result = {'skipped': [], 'written': [], 'unchanged': [], 'failed': [], 'warnings': []}
+    stale = set(registry.stale) if registry is not None else set()
+    pending = []
+    for source_file in sources:
+        header_file = source_file[:-2] + '.h'
+        if not force and os.path.abspath(header_file) not in stale \
+                and manifest.is_current(source_file, file_hash(source_file), header_file):
+            result['skipped'].append(source_file)
+        else:
+            pending.append(source_file)
+
+    if pending:
+        # libclang si verifica una volta qui, prima di avviare i worker
+        if not setup_libclang():
+            raise RuntimeError("Impossibile inizializzare libclang")
+
+    for _ in range(1 + MAX_STALE_ROUNDS):
+        if not pending:
+            break
+        with Pool(processes=jobs, initializer=_init_worker) as pool:
+            generated = sorted(pool.imap_unordered(_generate_worker, pending))
+
+        for source_file, parts, included_files, error in generated:
+            if error is not None:
+                result['failed'].append(f"{source_file}: {error}")
+                continue
+            header_file = source_file[:-2] + '.h'
+            header_content = HeaderGenerator().assemble_header(source_file, parts, registry)
+            if registry is not None and registry.in_cycle(header_file):
+                result['failed'].append(f"{header_file}: in un ciclo di include tra header generati, non scritto")
+                continue
+            if write_if_changed(header_file, header_content):
+                result['written'].append(header_file)
+            else:
+                result['unchanged'].append(header_file)
+            if update_sources:
+                HeaderGenerator().update_source_file(source_file)
+            manifest.record(source_file, header_file, included_files)
+
+        if registry is None:
+            break
+        # Dipendenti saltati dal manifest ma rimasti senza una dichiarazione inclusa
+        stale = set(registry.stale_dependents())
+        pending = [source_file for source_file in sources if os.path.abspath(source_file[:-2] + '.h') in stale]
+        for source_file in pending:
+            if source_file in result['skipped']:
+                result['skipped'].remove(source_file)
+
+    manifest.save()
+    if registry is not None:
+        result['warnings'] = registry.warnings()
+        registry.save()
+    return result
 
-    if len(sys.argv) > 1:
-        source_file = sys.argv[1]
+
+def main():
+    parser = argparse.ArgumentParser(description="Genera gli header .h dai sorgenti .c con libclang")
+    parser.add_argument('source', nargs='?', default='../' + 'hello-idf/main/he_mgt_string.c',
+                        help="sorgente .c (o directory con --batch)")
+    parser.add_argument('--batch', action='store_true', help="tutti i .c della directory, in parallelo")
+    parser.add_argument('--jobs', type=int, help="worker del pool (default: numero di CPU)")
+    parser.add_argument('--manifest', help=f"manifest degli hash (default: <directory>/{MANIFEST_NAME})")
+    parser.add_argument('--update-sources', action='store_true', help="in batch, aggiorna anche i sorgenti")
+    parser.add_argument('--force', action='store_true', help="ignora il manifest")
+    parser.add_argument('--registry', nargs='?', const='', metavar='PATH',
+                        help="deduplica le dichiarazioni con il registro di progetto (default: nella radice git)")
+    args = parser.parse_args()
+    registry = DeclarationRegistry(args.registry or None) if args.registry is not None else None
+
+    if args.batch:
+        if not os.path.isdir(args.source):
+            print("Con --batch serve una directory")
+            sys.exit(1)
+        try:
+            result = generate_directory(args.source, args.jobs, args.manifest, args.update_sources,
+                                        args.force, registry)
+        except RuntimeError as e:
+            print(f"ERRORE: {e}")
+            sys.exit(1)
+        print(f"Header scritti: {len(result['written'])}, invariati: {len(result['unchanged'])}, "
+              f"sorgenti saltati: {len(result['skipped'])}, errori: {len(result['failed'])}")
+        for header_file in result['written']:
+            print(f"  {header_file}")
+        for failure in result['failed']:
+            print(f"  ERRORE {failure}")
+        for message in result['warnings']:
+            print(f"  ATTENZIONE {message}")
+        sys.exit(1 if result['failed'] else 0)
+
+    source_file = args.source
 
     if not source_file.endswith('.c'):
         print("Il file deve essere un file sorgente .c")
@@ -206,16 +454,22 @@ def main():
         generator = HeaderGenerator()
 
         # Genera il contenuto dell'header
-        header_content = generator.generate_header(source_file)
-
-        # Scrivi il file header
-        with open(header_file, 'w') as f:
-            f.write(header_content)
+        header_content = generator.generate_header(source_file, registry=registry)
+        if registry is not None:
+            for message in registry.warnings():
+                print(f"ATTENZIONE {message}")
+            registry.save()
+            if registry.in_cycle(header_file):
+                print(f"ERRORE: {header_file} è in un ciclo di include tra header generati, non scritto")
+                sys.exit(1)
+
+        # Scrivi il file header (solo se cambia)
+        written = write_if_changed(header_file, header_content)
 
         # Aggiorna il file sorgente
         generator.update_source_file(source_file)
 
-        print(f"File header generato: {header_file}")
+        print(f"File header {'generato' if written else 'invariato'}: {header_file}")
         print(f"File sorgente aggiornato: {source_file}")
 
     except Exception as e:
@@ -224,4 +478,4 @@ def main():
 
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    main()